@@ -1,145 +1,90 @@
 # Built-in library modules
-from sqlite3 import *
-import datetime
 from tkinter import ttk
+import datetime
 import re
-import os
-import os.path as path
+import time
 import tkinter as tk
 
 # custom modules
-from download_util import *
-from broswer_util import *
-from db_util import *
+from broswer_util import open_html_file
+import metrics_util
+from index_util import format_timestamp
+from task_util import TaskRunner
+from table_util import VirtualTable
+from animation_util import CompositeCache, PhotoImageCache, RadarLoop
+from mosaic_util import MosaicGrid
+from radar_core import RadarCatalog, RadarCore, frame_name, radar_range_km
+from radar_core.frame_events import FramePrefetcher, FrameWebhook
+from radar_core.thumbnails import FramePipeline, ThumbnailSubscriber, latest_thumbnail
+from radar_core.settings import (FRAME_WEBHOOK_URL, METRICS_JSON_FILE_NAME, METRICS_TEXT_FILE_NAME, 
+                                 RAIN_THRESHOLD, THUMBNAIL_DIR)
 
 # Authorship
 STUDENT_NAME = 'Kevin Trinh'
 STUDENT_NUMBER = 'n12034762'
 
-# links and database
-DATABASE_NAME = "radar_app.db"
-RADAR_URL = "ftp://ftp.bom.gov.au/anon/gen/radar/"
-BACKGROUND_URL = 'ftp://ftp.bom.gov.au/anon/gen/radar_transparencies/'
-
-# file constants 
-INDEX_FILE_NAME = "radar_index.txt"
-RADAR_FILE_NAME = "image_index.txt"
-LOG_FILE_NAME = "event_log.html"
-
 # image adjustments and time
 RADAR_IMAGE_WIDTH = 520
 RADAR_IMAGE_HEIGHT = 560
-MAX_SECONDS = 60
+REFRESH_POLL_MS = 500
+METRICS_POLL_MS = 1000
 
-# SQL queries 
-SELECT_RADAR_INFO = "SELECT RadarId, RadarName FROM Radars"
-SELECT_LOG_INFO = "SELECT EventType, DateTime, Details FROM Log"
-INSERT_LOG_INFO = "INSERT INTO Log VALUES(?, ?, ?)"
+# radar loop animation: number of recent frames played and frames per second
+LOOP_FRAMES = 10
+LOOP_FPS = 5
 
+# station mosaic: tile size in pixels and downloads running at the same time
+MOSAIC_TILE_SIZE = 170
+MOSAIC_WORKERS = 8
 
-#<----------------------------------------------------------------------------------------------------------------------------------------------------------------------
-def download_radar_url() -> None:
-    '''
-    Downloads the radar index file if it does not exist or is older than 60 seconds.
-    
-    '''
-    if path.exists(INDEX_FILE_NAME):
-        # get the last modified time of the file
-        last_modified_time = path.getmtime(INDEX_FILE_NAME)
-        current_time = datetime.datetime.now().timestamp()
+# radar whose frames are listed in the radar image table
+selected_radar_id = None
 
-        # check if the file is older than 60 seconds
-        if current_time - last_modified_time <= MAX_SECONDS:
-            print(f"{INDEX_FILE_NAME} is up to date at {current_time}")
-            return
+# (start, end) timestamps of the frame history listed in the radar image
+# table, or None while it lists the frames in the current radar listing
+history_range = None
 
-    # If the file does not exist or is older than 60 seconds, download a new copy
-    download_file(RADAR_URL, INDEX_FILE_NAME)
-    print(f"{path.getsize(INDEX_FILE_NAME)} bytes saved to {INDEX_FILE_NAME}")
+# keeps the radar index file up to date once the listings are loaded
+radar_refresher = None
 
-def download_radar_transparencies_url() -> None:
-    '''
-    Downloads the image index file if it does not exist or is older than 60 seconds.
-    '''
-    if path.exists(RADAR_FILE_NAME):
-        # get the last modified time of the file
-        last_modified_time = path.getmtime(RADAR_FILE_NAME)
-        current_time = datetime.datetime.now().timestamp()
-
-        # check if the file is older than 60 seconds 
-        if current_time - last_modified_time <= MAX_SECONDS:
-            print(f"{RADAR_FILE_NAME} is up to date at {current_time}")
-            return
-    download_file(BACKGROUND_URL, RADAR_FILE_NAME)
-    print(f"{path.getsize(RADAR_FILE_NAME)} bytes saved to {RADAR_FILE_NAME}")
+# debug panel showing the metrics, toggled with F12, and its pending refresh
+metrics_window = None
+metrics_refresh_job = None
 
-def log_event_db(event: str, details: str) -> None:
-    '''
-    Logs an event to the radar_app database or specifically
+# station mosaic window, its grid of tiles and the task runner loading them
+mosaic_window = None
+mosaic_grid = None
+mosaic_runner = None
 
-    Parameters:
-    event_type: Type of the event
-    details: Details of the event
-
-    returns: 
-    none: logs the event from an activity in the interface
 
+#<----------------------------------------------------------------------------------------------------------------------------------------------------------------------
+def display_weather_report() -> print:
     '''
-    connection = connect(DATABASE_NAME)
-    cursor = connection.cursor()
-    time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute(INSERT_LOG_INFO, (event, time, details))
-    connection.commit()
-    connection.close()
-
-def generate_weather_report():
-    ''''
-    Generates an HTML report of event log information.
-
-    Reads event log data from the database and writes it into an HTML file.
-
+    Generates the event log report in the background, then displays it in a
+    web browser.
     '''
-    # Connect to the database
-    connection = connect(DATABASE_NAME)
-    cursor = connection.cursor()
-
-    # Execute SQL query to fetch event log information
-    cursor.execute(SELECT_LOG_INFO)
-    log_info = cursor.fetchall()
-
-    # Open the HTML report file in write mode
-    with open(LOG_FILE_NAME, 'w') as report_file:
-        # Write HTML header and title
-        report_file.write("<html>\n")
-        report_file.write("<head><title>Weather Log Report</title></head>\n")
-        report_file.write("<body>\n")
-        report_file.write("<h1>Weather Log Report</h1>\n")
-
-        # Write table header
-        report_file.write("<table border='1'>\n")
-        report_file.write("<tr><th>Event Type</th><th>Date and Time</th><th>Details</th></tr>\n")
+    task_runner.submit("weather_report", core.generate_report, on_done=open_weather_report)
 
-        # Write event log data to the table
-        for event in log_info:
-            report_file.write(f"<tr><td>{event[0]}</td><td>{event[1]}</td><td>{event[2]}</td></tr>\n")
-
-        # Close the table and body tags
-        report_file.write("</table>\n")
-        report_file.write("</body>\n")
-        report_file.write("</html>")
-    
-    # Print success message
-    print(f"Event log report generated - {LOG_FILE_NAME}")
-
-
-def display_weather_report() -> print:
+def open_weather_report(report_name: str) -> None:
     '''
-    Displays the generated event log report in a web browser.
+    Called on the Tk thread once the event log report has been generated.
     '''
-    generate_weather_report()
-    open_html_file(LOG_FILE_NAME)
+    open_html_file(report_name)
     print("Successfully opened event log report")
 
+def search_radar_stations(*_) -> None:
+    """
+    Lists the radar stations matching the search box as the user types: 
+    words match the start of a radar ID, such as "IDR02" or "023", or of a
+    word of its name, such as "melb 128". A blank search lists every station.
+    """
+    query = station_search.get()
+    with metrics_util.timer("station_search_seconds"):
+        matches = radar_catalog.search(query)
+        station_rows.set_keys(matches)
+        station_rows.yview("moveto", 0)
+    search_label.config(text=f"{len(matches)} of {len(radar_catalog)} stations")
+
 def radar_station_select(event:str) -> None:
     '''
     Handles the event of selecting a radar station from the radar station list.
@@ -147,14 +92,15 @@ def radar_station_select(event:str) -> None:
     Parameters:
     event: The event object triggered by the selection. When first treeview clicked
            display the radar weather image list from the radar_index file
-           it will find the matching radar ID from the radar_app db and radar_index file
-           if match, it will find the rest of the data by using forloop method and
-           using the capturing group method for re to match.
+           it will look up the frames of the selected radar ID in the parsed
+           radar index, which is only re-read when the file is refreshed.
 
     returns: 
-    none: logs the event and find matching re to display in treeview
+    none: logs the event and displays the frame timestamps in treeview
 
     '''
+    global selected_radar_id, history_range
+
     # Retrieve the selected item from the radar list
     selected_radar_station = event.widget.selection()
     if selected_radar_station:
@@ -162,37 +108,128 @@ def radar_station_select(event:str) -> None:
         # Extract radar ID and name from the selected item
         item_values = event.widget.item(selected_radar_station)['values']
         radar_id, radar_name = item_values
+        previous_radar_id, selected_radar_id = selected_radar_id, radar_id
+        history_range = None
+        stop_radar_loop()
+
+        # New frames of this radar are downloaded as soon as they are listed
+        frame_prefetcher.watch([radar_id])
 
         # Log the radar selection event
-        log_event_db("SelectRadar", f"Selected {radar_id}:{radar_name}")
-        # Read the contents of the radar index file
-        with open(INDEX_FILE_NAME, 'r') as index_file:
-            Index_file_data = index_file.read()
-            
-            # regular expression to extract required info from index data
-            # example extraction: IDR012.T.202405161124.png
-            image_pattern = r'(IDR\d{3})\.T\.(\d{12})\.png'
-            png_matches = re.findall(image_pattern, Index_file_data)
+        core.log_event("SelectRadar", f"Selected {radar_id}:{radar_name}")
+
+        with metrics_util.timer("station_select_seconds"):
+            # Look up the frames of this radar in the parsed radar index and list
+            # them in the table, which only creates the rows in view. Rows are
+            # keyed by timestamp, so the rows of another radar are removed first
+            if radar_id != previous_radar_id:
+                frame_rows.clear()
+            frame_rows.set_keys(core.radar_index().frames(radar_id))
+
+        # Show how far back the Frames table goes for this radar
+        history_label.config(text="")
+        task_runner.submit("frame_span", core.frame_span, radar_id, 
+                           on_done=lambda span: show_frame_span(radar_id, span))
+
+def show_frame_span(radar_id: str, span: tuple) -> None:
+    '''
+    Called on the Tk thread with the (oldest, newest) timestamp recorded for
+    a radar; shows the dates under the date range picker.
+    '''
+    oldest, newest = span
+    if radar_id == selected_radar_id and oldest is not None:
+        history_label.config(text=f"Recorded {format_timestamp(oldest)[0]} to {format_timestamp(newest)[0]}")
 
-            # clear existing entries in the radar image timestamps table
-            table2.delete(*table2.get_children())
+def parse_history_date(text: str) -> datetime.date:
+    '''
+    Reads a date typed as YYYY-MM-DD in the date range picker, or None if the
+    entry is blank. Raises ValueError for anything else.
+    '''
+    text = text.strip()
+    return datetime.datetime.strptime(text, "%Y-%m-%d").date() if text else None
 
-            # Iterate through png_matches and insert timestamp data into the table
-            for match in png_matches:
+def show_frame_history() -> None:
+    '''
+    Lists the frames of the selected radar recorded in the Frames table 
+    between the From and To dates, both included, in the radar image table. 
+    With both dates blank, lists the frames in the current radar listing.
+    '''
+    global history_range
+
+    if selected_radar_id is None:
+        print("Select a radar station before showing its frame history")
+        return
+    try:
+        from_date = parse_history_date(history_from.get())
+        to_date = parse_history_date(history_to.get())
+    except ValueError:
+        print("Enter the dates as YYYY-MM-DD")
+        return
+
+    if from_date is None and to_date is None:
+        history_range = None
+        frame_rows.set_keys(core.radar_index().frames(selected_radar_id))
+        return
+
+    # The To date is included, so the range ends at the start of the next day
+    start = from_date.strftime("%Y%m%d") if from_date else None
+    end = (to_date + datetime.timedelta(days=1)).strftime("%Y%m%d") if to_date else None
+    radar_id = selected_radar_id
+    core.log_event("FrameHistory", f"Listed {radar_id} frames from {start or 'the start'} to {end or 'now'}")
+    task_runner.submit("frame_history", core.frame_history, radar_id, start, end,
+                       on_done=lambda timestamps: list_frame_history(radar_id, (start, end), timestamps),
+                       on_error=lambda error: print(f"Unable to read the frame history: {error}"))
+
+def list_frame_history(radar_id: str, time_range: tuple, timestamps: list) -> None:
+    '''
+    Called on the Tk thread once RadarCore.frame_history has finished: lists 
+    the frames of the history in the radar image table.
+    '''
+    global history_range
 
-                # first group of the image_pattern to equal radar_ID from radar station
-                # example - (IDR\d{3})
-                if match[0] == radar_id:
+    if radar_id != selected_radar_id:
+        return
+    history_range = time_range
+    frame_rows.set_keys(timestamps)
 
-                    # extract timestamp and format date and time using the second group of image_pattern
-                    # example - (\d{12})
-                    timestamp_str = match[1]
-                    timestamp = datetime.datetime.strptime(timestamp_str, "%Y%m%d%H%M")
-                    date = timestamp.date().isoformat()
-                    time_formatted = timestamp.time().strftime("%H:%M")
+def in_history_range(timestamp_str: str) -> bool:
+    '''
+    Returns True if a frame belongs in the radar image table: any frame while
+    it lists the radar listing, otherwise only frames in the history range.
+    '''
+    if history_range is None:
+        return True
+    start, end = history_range
+    return (start is None or timestamp_str >= start) and (end is None or timestamp_str < end)
+
+def poll_radar_refresh() -> None:
+    '''
+    Picks up radar listings downloaded by the background refresher, then 
+    the new frames they list, and adds only the new frames of the selected
+    radar to the radar image table. Checks again every REFRESH_POLL_MS 
+    milliseconds.
+    '''
+    # Only the latest queued listing matters
+    refreshed_index = None
+    while not radar_refresher.updates.empty():
+        refreshed_index = radar_refresher.updates.get_nowait()
 
-                    # Insert timestamp data into the table
-                    table2.insert("", tk.END, values=(radar_id, date, time_formatted))
+    # Comparing it with the current listing publishes its new frames
+    if refreshed_index is not None:
+        core.set_radar_index(refreshed_index)
+
+    new_frames = new_frame_events.pending()
+    if new_frames:
+        # Only new frames in the history range being shown are added
+        if selected_radar_id is not None:
+            frame_rows.add_keys([timestamp_str for radar_id, timestamp_str in new_frames
+                                 if radar_id == selected_radar_id and in_history_range(timestamp_str)])
+
+        # Mosaic tiles whose station has a new frame load it on their own
+        if mosaic_grid is not None:
+            mosaic_grid.show_new_frames(new_frames)
+
+    weather_interface.after(REFRESH_POLL_MS, poll_radar_refresh)
 
 
 
@@ -205,11 +242,11 @@ def radar_image_display(event: str) -> None:
     event: The event object triggered by the selection: when clicked second 
             treeview , It will display 5 images which is legend, background,
             radar, location, range in one canvas which will be download from
-            link.
+            link. The downloads run in the background while a progress bar
+            is shown, and an older selection still loading is dropped.
 
     returns: 
-    none: logs the event and update the interface with download image
-          files and changes the interface
+    none: starts loading the layers, which show_radar_layers then displays
 
     """
     # Retrieve the selected item from the image_index list
@@ -221,133 +258,413 @@ def radar_image_display(event: str) -> None:
         # Using regular expressions (re.sub) to remove dashes and colons from the date and time formatted strings
         date_cleaned = re.sub(r'-', '', date)
         time_cleaned = re.sub(r':', '', time_formatted)
-        image_name = f"{radar_id}.T.{date_cleaned}{time_cleaned}.png"
-
-        # full path to the image file
-        image_path = os.path.join(os.getcwd(), image_name)
-
-        # check if the image file already exists
-        if not os.path.exists(image_path):
-            image_url = f"{RADAR_URL}/{image_name}"
-            log_event_db("ViewImage", f"Viewing image {image_name}")
-            download_file(image_url, image_name)
-
-        # background image download file and link URL 
-        background_image_name = f"{radar_id}.background.png"
-
-        # Full path to the background image file
-        background_image_path = os.path.join(os.getcwd(), background_image_name)  
-
-        # Check if the background image file already exists
-        if not os.path.exists(background_image_path):
-            background_image_url = f"{BACKGROUND_URL}/{background_image_name}"
-            download_file(background_image_url, background_image_name)
-
-        # Responsible for downloading the range map
-        rangemap_name = f"{radar_id}.range.png"
-
-        # full path to the rangemap file
-        rangemap_path = os.path.join(os.getcwd(), rangemap_name)  
-
-        # Check if the rangemap file already exists
-        if not os.path.exists(rangemap_path):
-            rangemap_url = f"{BACKGROUND_URL}/{rangemap_name}"
-            log_event_db("ViewImage", f"Viewing image {rangemap_name}")
-            download_file(rangemap_url, rangemap_name)
-
-        # Responsible for downloading the legend image 
-        legend_name = f"IDR.legend.1.png"
-        legend_name_path = os.path.join(os.getcwd(), legend_name)
-        if not os.path.exists(legend_name_path):
-            legend_url = f"{BACKGROUND_URL}/{legend_name}"
-            log_event_db("ViewImage", f"Viewing image {legend_name}") 
-            download_file(legend_url, legend_name)
-
-        # Responsible for downloading the legend wind image and checking if path exist
-        wind_legend = f"IDR.legend.2.png"
-        wind_legend_path = os.path.join(os.getcwd(), wind_legend)
-
-        if not os.path.exists(wind_legend_path):
-            wind_url = f"{BACKGROUND_URL}/{wind_legend}"
-            log_event_db("ViewImage", f"Viewing image {wind_legend}")
-            download_file(wind_url, wind_legend)
-
-        # Cities for downloading image 
-        cities_location_image = f"{radar_id}.locations.png"
-        cities_location_path = os.path.join(os.getcwd(), cities_location_image)
-
-        # Check if cities_location_image already exists 
-        if not os.path.exists(cities_location_path):
-            cities_location_url = f"{BACKGROUND_URL}/{cities_location_image}"
-            log_event_db("ViewImage", f"Viewing image {cities_location_image}")
-            download_file(cities_location_url, cities_location_image)
-
-        # Find the images
-        background_image = tk.PhotoImage(file=background_image_path)
-        radar_image = tk.PhotoImage(file=image_path)
-        range_image = tk.PhotoImage(file=rangemap_path)
-        legend_image = tk.PhotoImage(file=legend_name_path)
-        location_image = tk.PhotoImage(file=cities_location_path)
-
-
-        # Create the images
-        combined_canvas.create_image(0, 0, anchor=tk.NW, image=background_image)
-        combined_canvas.create_image(0, 0, anchor=tk.NW, image=radar_image)
-        combined_canvas.create_image(0, 0, anchor=tk.NW, image=range_image)
-        combined_canvas.create_image(0, 0, anchor=tk.NW, image=legend_image)
-        combined_canvas.create_image(0, 0, anchor=tk.NW, image=location_image)
-
-        # Assigning image objects to attributes will prevent images from disappearing
-        # in the canvas
-        combined_canvas.background_image = background_image
-        combined_canvas.radar_image = radar_image
-        combined_canvas.range_image = range_image
-        combined_canvas.legend_image = legend_image
-        combined_canvas.location_image = location_image
+        image_name = frame_name(radar_id, f"{date_cleaned}{time_cleaned}")
+
+        layers = core.radar_layers(radar_id, image_name)
+        stop_radar_loop()
+
+        # Show the progress bar until the layers are ready
+        combined_canvas.itemconfigure(loading_window, state="normal")
+        loading_bar.start(10)
+        started = time.perf_counter()
+        task_runner.submit("radar_image", core.fetch_layers, layers,
+                           on_done=lambda layer_data: show_radar_layers(layers, layer_data, started),
+                           on_error=radar_layers_failed)
+
+def hide_loading() -> None:
+    '''
+    Hides the progress bar on the radar canvas.
+    '''
+    loading_bar.stop()
+    combined_canvas.itemconfigure(loading_window, state="hidden")
+
+def radar_layers_failed(error: Exception) -> None:
+    '''
+    Called on the Tk thread when the layers of a radar image could not be loaded.
+    '''
+    hide_loading()
+    print(f"Unable to load radar image: {error}")
+
+def composite_radar_image(layers: tuple, layer_data: dict) -> tk.PhotoImage:
+    '''
+    Returns the radar image of *layers* merged with its background, range map,
+    legend and cities overlay as one image. Overlays missing from 
+    *layer_data* are left out. The static layers of each radar are only 
+    merged once, and merged images are kept in the image cache.
+
+    Parameters:
+    layers: The layers as returned by RadarCore.radar_layers
+    layer_data: The content of each layer file by layer name
+    '''
+    image_name, background_image_name, rangemap_name, legend_name, _, cities_location_image = (
+        layer_name for layer_name, _, _ in layers)
+    radar_id = image_name.split('.')[0]
+
+    if not composite_cache.has_radar(radar_id):
+        composite_cache.add_radar(radar_id, 
+            under_layers=[layer_data[background_image_name]],
+            over_layers=[layer_data[layer_name] 
+                         for layer_name in (rangemap_name, legend_name, cities_location_image)
+                         if layer_name in layer_data])
+
+    radar_image = image_cache.get(image_name)
+    if radar_image is None:
+        metrics_util.count("image_cache_misses_total")
+        with metrics_util.timer("compose_seconds"):
+            radar_image = composite_cache.compose(image_name, layer_data[image_name])
+        image_cache.put(image_name, radar_image)
+    else:
+        metrics_util.count("image_cache_hits_total")
+    return radar_image
+
+def show_radar_layers(layers: tuple, layer_data: dict, started: float = None) -> None:
+    '''
+    Called on the Tk thread once RadarCore.fetch_layers has finished: shows the
+    merged radar image in the single radar image item of the canvas, so the
+    number of canvas items never grows.
+
+    Parameters:
+    layers: The layers as returned by RadarCore.radar_layers
+    layer_data: The content of each layer file by layer name
+    started: The time.perf_counter() of the click, to record how long the
+             image took to show
+    '''
+    hide_loading()
+    combined_canvas.itemconfigure(radar_item, image=composite_radar_image(layers, layer_data))
+    if started is not None:
+        metrics_util.observe("radar_image_seconds", time.perf_counter() - started)
+
+
+
+def stop_radar_loop() -> None:
+    '''
+    Stops the radar loop animation if it is playing.
+    '''
+    radar_loop.stop()
+    task_runner.cancel("radar_loop_layers")
+    btn_play_loop.config(text="Play Loop")
+
+def toggle_radar_loop() -> None:
+    '''
+    Starts or stops playing the last LOOP_FRAMES radar images of the selected
+    radar station as a loop in the canvas.
+    '''
+    if radar_loop.playing or task_runner.pending("radar_loop_layers"):
+        stop_radar_loop()
+        return
+    if selected_radar_id is None:
+        print("Select a radar station before playing the loop")
+        return
+
+    frame_names = [frame_name(selected_radar_id, timestamp_str)
+                   for timestamp_str in core.radar_index().frames(selected_radar_id)[-LOOP_FRAMES:]]
+    if not frame_names:
+        return
+
+    # The static layers are loaded once, together with the first frame
+    layers = core.radar_layers(selected_radar_id, frame_names[0])
+    btn_play_loop.config(text="Stop Loop")
+    combined_canvas.itemconfigure(loading_window, state="normal")
+    loading_bar.start(10)
+    task_runner.submit("radar_loop_layers", core.fetch_layers, layers,
+                       on_done=lambda layer_data: start_radar_loop(frame_names, layers, layer_data),
+                       on_error=radar_layers_failed)
+
+def start_radar_loop(frame_names: list, layers: tuple, layer_data: dict) -> None:
+    '''
+    Called on the Tk thread once the static layers of the loop are loaded.
+    '''
+    hide_loading()
+    composite_radar_image(layers, layer_data)
+    radar_loop.start(frame_names)
+
+def analyse_rain() -> None:
+    '''
+    Works out the rain statistics of every listed radar image of the selected
+    radar station in the background, then shows them in a window. Images
+    analysed before are read from the FrameStats table.
+    '''
+    if selected_radar_id is None:
+        print("Select a radar station before showing rain statistics")
+        return
+    radar_id = selected_radar_id
+    task_runner.submit("rain_statistics", core.analyse_frames, radar_id,
+                       on_done=lambda stats: show_rain_statistics(radar_id, stats),
+                       on_error=lambda error: print(f"Unable to work out rain statistics: {error}"))
+
+def show_rain_statistics(radar_id: str, stats: list) -> None:
+    '''
+    Called on the Tk thread once RadarCore.analyse_frames has finished: lists
+    the rain statistics of each radar image in a new window.
+
+    Parameters:
+    radar_id: The radar the statistics are of
+    stats: A radar_core.analytics.FrameStats for each radar image
+    '''
+    stats_window = tk.Toplevel(weather_interface)
+    stats_window.title(f"Rain statistics of {radar_id}")
+
+    stats_columns = ("Date", "Time", "Rain %", "Max mm/h", "Mean mm/h", 
+                     f"km2 over {RAIN_THRESHOLD:g} mm/h")
+    stats_table = ttk.Treeview(stats_window, columns=stats_columns, show="headings", height=20)
+    for col in stats_columns:
+        stats_table.heading(col, text=col)
+        stats_table.column(col, width=110, stretch=tk.YES)
+    stats_table.pack(fill="both", expand=True, padx=10, pady=5)
+
+    for frame_stats in stats:
+        date, time_formatted = format_timestamp(frame_stats.timestamp)
+        stats_table.insert("", tk.END, values=(date, time_formatted, 
+                                               f"{frame_stats.coverage_percent:.2f}",
+                                               f"{frame_stats.max_rate:g}", 
+                                               f"{frame_stats.mean_rate:.2f}",
+                                               f"{frame_stats.heavy_area_km2:.1f}"))
+
+    if stats:
+        wettest = max(stats, key=lambda frame_stats: frame_stats.coverage_percent)
+        summary = (f"{len(stats)} images; most rain at {' '.join(format_timestamp(wettest.timestamp))}"
+                   f" covering {wettest.coverage_percent:.1f}%")
+    else:
+        summary = "No radar images listed"
+    tk.Label(stats_window, text=summary, font=("Arial", 10), anchor="w").pack(fill="x", padx=10, pady=5)
+
+def open_station_mosaic() -> None:
+    '''
+    Opens the station mosaic: a window showing the latest radar image of 
+    every station of one range matching a search, as a grid of tiles which
+    refresh as new frames are listed.
+    '''
+    global mosaic_window, mosaic_grid, mosaic_runner
+
+    if mosaic_window is not None:
+        mosaic_window.lift()
+        return
+
+    mosaic_window = tk.Toplevel(weather_interface)
+    mosaic_window.title("Station Mosaic")
+    mosaic_window.protocol("WM_DELETE_WINDOW", close_station_mosaic)
+
+    controls = ttk.Frame(mosaic_window)
+    controls.pack(fill="x", padx=10, pady=5)
+    tk.Label(controls, text="Range", font=('Arial', 10)).pack(side="left")
+    mosaic_range = ttk.Combobox(controls, values=("512 km", "256 km", "128 km", "64 km"), 
+                                width=8, state="readonly")
+    mosaic_range.set("128 km")
+    mosaic_range.pack(side="left", padx=5)
+    tk.Label(controls, text="Name", font=('Arial', 10)).pack(side="left")
+    mosaic_filter = ttk.Entry(controls, width=20)
+    mosaic_filter.pack(side="left", padx=5)
+    btn_mosaic_show = tk.Button(controls, font = ('Arial', 10), text="Show", width=10,
+                                command=lambda: show_station_mosaic(int(mosaic_range.get().split()[0]), 
+                                                                    mosaic_filter.get()))
+    btn_mosaic_show.pack(side="left", padx=5)
+
+    mosaic_scrollbar = ttk.Scrollbar(mosaic_window, orient="vertical")
+    mosaic_canvas = tk.Canvas(mosaic_window, width=6 * (MOSAIC_TILE_SIZE + MosaicGrid.PADDING),
+                              height=3 * (MOSAIC_TILE_SIZE + MosaicGrid.CAPTION_HEIGHT + MosaicGrid.PADDING),
+                              yscrollcommand=mosaic_scrollbar.set)
+    mosaic_scrollbar.config(command=mosaic_canvas.yview)
+    mosaic_scrollbar.pack(side="right", fill="y")
+    mosaic_canvas.pack(side="left", fill="both", expand=True)
+
+    # Tiles load on task runner threads of their own, so a full grid never 
+    # waits behind the main window's work or holds it up
+    mosaic_runner = TaskRunner(mosaic_window, max_workers=MOSAIC_WORKERS)
+    mosaic_grid = MosaicGrid(mosaic_canvas, mosaic_runner, CompositeCache(max_size=MOSAIC_TILE_SIZE),
+                             core.radar_layers, core.fetch_layers, tile_size=MOSAIC_TILE_SIZE,
+                             latest_thumbnail=lambda radar_id: latest_thumbnail(THUMBNAIL_DIR, radar_id))
+    mosaic_window.after_idle(lambda: show_station_mosaic(128, ""))
+
+def show_station_mosaic(range_km: int, name_filter: str) -> None:
+    '''
+    Fills the mosaic with a tile for every station in the Radars table of 
+    *range_km* matching the search *name_filter*, and loads their latest
+    radar images.
+    '''
+    stations = [(radar_id, radar_catalog.name(radar_id)) for radar_id in radar_catalog.search(name_filter)
+                if radar_range_km(radar_id) == range_km]
+    core.log_event("StationMosaic", f"Showing {len(stations)} stations of {range_km} km")
+    # Every station's merged layers stay cached while the mosaic is open
+    mosaic_grid.composite_cache.max_radars = max(len(stations), 1)
+    mosaic_grid.set_stations(stations)
+    mosaic_grid.show(core.radar_index())
+
+def close_station_mosaic() -> None:
+    '''
+    Closes the station mosaic, dropping any tiles still loading.
+    '''
+    global mosaic_window, mosaic_grid, mosaic_runner
 
+    if mosaic_window is None:
+        return
+    mosaic_grid.close()
+    mosaic_runner.shutdown()
+    mosaic_window.destroy()
+    mosaic_window = mosaic_grid = mosaic_runner = None
 
+def toggle_metrics_panel(event=None) -> None:
+    '''
+    Opens the metrics debug panel, turning metrics recording on, or closes it
+    if it is open. The panel lists every counter and latency histogram and is
+    refreshed every METRICS_POLL_MS milliseconds.
+    '''
+    global metrics_window, metrics_table, metrics_hit_rates
+
+    if metrics_window is not None:
+        weather_interface.after_cancel(metrics_refresh_job)
+        metrics_window.destroy()
+        metrics_window = None
+        return
+
+    metrics_util.enable()
+    metrics_window = tk.Toplevel(weather_interface)
+    metrics_window.title("Metrics")
+    metrics_window.protocol("WM_DELETE_WINDOW", toggle_metrics_panel)
+    metrics_window.bind("<F12>", toggle_metrics_panel)
+
+    metrics_columns = ("Metric", "Count", "p50 ms", "p95 ms", "Total")
+    metrics_table = ttk.Treeview(metrics_window, columns=metrics_columns, show="headings", height=15)
+    for col in metrics_columns:
+        metrics_table.heading(col, text=col)
+        metrics_table.column(col, width=110 if col != "Metric" else 250, stretch=tk.YES)
+    metrics_table.pack(fill="both", expand=True, padx=10, pady=5)
+
+    metrics_hit_rates = tk.Label(metrics_window, font=("Arial", 10), anchor="w")
+    metrics_hit_rates.pack(fill="x", padx=10)
+
+    buttons = ttk.Frame(metrics_window)
+    buttons.pack(pady=5)
+    tk.Button(buttons, font=('Arial', 10), text="Export JSON",
+              command=lambda: export_metrics(metrics_util.write_json, METRICS_JSON_FILE_NAME)).pack(side="left", padx=5)
+    tk.Button(buttons, font=('Arial', 10), text="Export Prometheus",
+              command=lambda: export_metrics(metrics_util.write_prometheus, METRICS_TEXT_FILE_NAME)).pack(side="left", padx=5)
+    tk.Button(buttons, font=('Arial', 10), text="Reset", command=metrics_util.reset).pack(side="left", padx=5)
+
+    refresh_metrics_panel()
+
+def refresh_metrics_panel() -> None:
+    '''
+    Shows the current metrics in the debug panel while it is open.
+    '''
+    global metrics_refresh_job
+
+    metrics = metrics_util.snapshot()
+    metrics_table.delete(*metrics_table.get_children())
+    for name, value in metrics['counters'].items():
+        metrics_table.insert("", tk.END, values=(name, "", "", "", value))
+    for name, histogram in metrics['histograms'].items():
+        metrics_table.insert("", tk.END, values=(name, histogram['count'],
+                                                 f"{histogram['p50'] * 1000:.1f}",
+                                                 f"{histogram['p95'] * 1000:.1f}",
+                                                 f"{histogram['sum']:.3f} s"))
+
+    hit_rates = (("layer cache", "layer_cache_hits_total", "layer_cache_misses_total"),
+                 ("image cache", "image_cache_hits_total", "image_cache_misses_total"))
+    metrics_hit_rates.config(text="Hit rate: " + ", ".join(
+        f"{label} {metrics_util.hit_rate(hits, misses):.0%}" for label, hits, misses in hit_rates))
+    metrics_refresh_job = weather_interface.after(METRICS_POLL_MS, refresh_metrics_panel)
+
+def export_metrics(write, file_name: str) -> None:
+    '''
+    Saves the metrics with *write* (metrics_util.write_json or write_prometheus).
+    '''
+    write(file_name)
+    print(f"Saved metrics to {file_name}")
 
 def closing_interface() -> None:
     '''
     Close the program and records the application
 
     '''
-    log_event_db("CloseProgram", "The application has been closed.")
+    core.log_event("CloseProgram", "The application has been closed.")
     print('Closing the program Horayy')
+    if radar_refresher is not None:
+        radar_refresher.stop()
+    radar_loop.stop()
+    close_station_mosaic()
+    task_runner.shutdown()
+    core.close()
+    if thumbnail_pipeline is not None:
+        thumbnail_pipeline.close()
     weather_interface.destroy()
 
-def openning_database() -> list:
+def openning_database() -> RadarCatalog:
     """
-    Connect to the database, fetch radar information, populate the Treeview 
-    and return the radar information as a list of tuples.
+    Runs on a worker thread once the window is showing: downloads the two 
+    listing files if they are out of date, parses the radar index and loads
+    the radar catalog from the database.
 
     Returns:
-    list: A list of tuples where each tuple contains (RadarId, RadarName).
+    RadarCatalog: Every radar station, searchable by ID and name.
     """
-
-    connection = connect(DATABASE_NAME)
-    cursor = connection.cursor()
-    cursor.execute(SELECT_RADAR_INFO)
-    radar_info = cursor.fetchall()
-    
-    # Iterate over radar_info and insert each radar into the table
-    for radar in radar_info:
-        table.insert("", tk.END, values=(radar[0], radar[1]))
-    
     # Functions are used to download two text files
-    download_radar_url()
-    download_radar_transparencies_url()
+    core.refresh_listings()
+    core.radar_index()
 
-    connection.close()
-    
-    # Return the list of tuples
-    return radar_info
+    # Read the Radars table once and index it for the search box
+    return core.radar_catalog()
 
+def show_radar_stations(catalog: RadarCatalog) -> None:
+    """
+    Called on the Tk thread once openning_database has finished: populates
+    the Treeview and starts refreshing the radar index in the background.
+
+    Parameters:
+    catalog: Every radar station
+    """
+    global radar_catalog, radar_refresher
+
+    # List the radars matching the search box, which only creates the rows in view
+    radar_catalog = catalog
+    search_radar_stations()
+
+    # keep the radar index up to date in the background while the window is open
+    radar_refresher = core.listing_refresher()
+    radar_refresher.start()
+    weather_interface.after(REFRESH_POLL_MS, poll_radar_refresh)
+
+def startup_failed(error: Exception) -> None:
+    """
+    Called on the Tk thread when openning_database fails, e.g. because the 
+    listings could not be downloaded: says so next to the search box, since
+    the stations table stays empty.
+    """
+    print(f"Unable to load the radar stations: {error}")
+    search_label.config(text=f"Unable to load the radar stations: {error}")
 
 #<-------------------------------------------------------------------------------------------------------------------------------------------------------
 
+# thumbnails for the station mosaic are made on every core by worker
+# processes forked now, since forking once the window is open or threads
+# are running is unsafe; they need NumPy, without which none are made
+try:
+    import radar_core.analytics
+except ImportError as error:
+    print(f"No thumbnails will be made: {error}")
+    thumbnail_pipeline = None
+else:
+    thumbnail_pipeline = FramePipeline()
+    thumbnail_pipeline.start()
+
+# downloads, layer cache, event log and radar index, all opened on first use
+core = RadarCore()
+radar_catalog = RadarCatalog([])
+
+# the frames new in each refreshed listing go to the window (polled from 
+# the Tk thread), the event log, the prefetcher and, if set, the webhook
+new_frame_events = core.frame_events.subscribe("window")
+core.frame_events.subscribe("event_log", core.log_new_frames)
+frame_prefetcher = FramePrefetcher(core.load_frame)
+core.frame_events.subscribe("prefetcher", frame_prefetcher)
+if FRAME_WEBHOOK_URL:
+    core.frame_events.subscribe("webhook", FrameWebhook(FRAME_WEBHOOK_URL))
+
+# every radar image downloaded gets its thumbnail in the background
+if thumbnail_pipeline is not None:
+    core.fetch_events.subscribe("thumbnails", ThumbnailSubscriber(thumbnail_pipeline, core.frame_path))
+
 # logs the event to database
-log_event_db("OpenProgram", "The application has started.")
+core.log_event("OpenProgram", "The application has started.")
 print("the application has open lol")
 
 # Tkinter weather interface 
@@ -368,11 +685,21 @@ application_label.grid(row=0, column=1, pady=10)
 frame = ttk.Frame(weather_interface)
 frame.grid(row=1, column=0, padx=10, pady=10, sticky="nswe")
 
+# search box filtering the radar stations table as the user types
+search_frame = ttk.Frame(frame)
+search_frame.pack(side="top", fill="x", pady=(0, 5))
+tk.Label(search_frame, text="Search", font=('Arial', 10)).pack(side="left")
+station_search = tk.StringVar()
+ttk.Entry(search_frame, textvariable=station_search, width=30).pack(side="left", padx=5)
+search_label = tk.Label(search_frame, text="", font=('Arial', 9))
+search_label.pack(side="left")
+station_search.trace_add("write", search_radar_stations)
+
 scrollbar = ttk.Scrollbar(frame, orient="vertical")
 
 #displaying the radar stations table
 columns = ("Radar ID", "Radar Name")
-table = ttk.Treeview(frame, columns=columns, show="headings", yscrollcommand=scrollbar.set, height= 30)
+table = ttk.Treeview(frame, columns=columns, show="headings", height= 30)
 print(f"{table}, i can see the table horray ")
 for col in columns:
     table.heading(col, text=col)
@@ -380,7 +707,6 @@ for col in columns:
 table.column("Radar ID", width=270, stretch=tk.YES)
 table.column("Radar Name", width=270, stretch=tk.YES)
 
-scrollbar.config(command=table.yview)
 scrollbar.pack(side="right", fill="y")
 
 table.pack(side="left", fill="both", expand=True)
@@ -396,7 +722,7 @@ scrollbar2 = ttk.Scrollbar(frame2, orient="vertical")
 
 # display the radar_weather_table 
 columns2 = ("Radar ID", "Date", "Time")
-table2 = ttk.Treeview(frame2, columns=columns2, show="headings", yscrollcommand=scrollbar2.set, height = 30)
+table2 = ttk.Treeview(frame2, columns=columns2, show="headings", height = 30)
 print(table2)
 
 for col in columns2:
@@ -406,7 +732,6 @@ table2.column("Radar ID", width=250, stretch=tk.YES)
 table2.column("Date", width=250, stretch=tk.YES)
 table2.column("Time", width=250, stretch=tk.YES)
 
-scrollbar2.config(command=table2.yview)
 scrollbar2.pack(side="right", fill="y")
 
 # Create a custom style for the table
@@ -433,18 +758,69 @@ table2.pack(side="left", fill="both", expand=True)
 
 table2.bind("<<TreeviewSelect>>", radar_image_display)
 
+# the tables only hold the rows in view; these hold every row and scroll them
+station_rows = VirtualTable(table, scrollbar, lambda radar_id: (radar_id, radar_catalog.name(radar_id)))
+frame_rows = VirtualTable(table2, scrollbar2, 
+                          lambda timestamp_str: (selected_radar_id, *format_timestamp(timestamp_str)))
+
 combined_canvas = tk.Canvas(weather_interface, width=RADAR_IMAGE_WIDTH , height=RADAR_IMAGE_HEIGHT, relief="solid", borderwidth=2)
 print(f"{combined_canvas}, canvas work yippe")
 combined_canvas.grid(row=1, column=2, padx=10, pady=10)
 
+# progress bar shown on the canvas while radar layers load in the background
+loading_bar = ttk.Progressbar(combined_canvas, mode="indeterminate", length=200)
+loading_window = combined_canvas.create_window(RADAR_IMAGE_WIDTH // 2, RADAR_IMAGE_HEIGHT // 2, 
+                                               window=loading_bar, state="hidden")
+
+# runs downloads and file reads off the Tk thread
+task_runner = TaskRunner(weather_interface)
+
+# merged static layers per radar, merged radar images, and the radar loop
+# animation which shows them in the same single canvas item
+composite_cache = CompositeCache()
+image_cache = PhotoImageCache()
+radar_item = combined_canvas.create_image(0, 0, anchor=tk.NW)
+radar_loop = RadarLoop(combined_canvas, radar_item, task_runner, image_cache, core.load_frame,
+                       decode=composite_cache.compose, fps=LOOP_FPS)
+
 btn_display_log = tk.Button(weather_interface, font = ('Arial', 10) ,text="Display Event Log", command= display_weather_report, width=20)
 btn_display_log.grid(row=2, column= 1)
 
-#call the function and capture the returned list and open DB
-radar_info_list = openning_database()
+btn_play_loop = tk.Button(weather_interface, font = ('Arial', 10) ,text="Play Loop", command= toggle_radar_loop, width=20)
+btn_play_loop.grid(row=2, column= 2)
 
+btn_rain_stats = tk.Button(weather_interface, font = ('Arial', 10) ,text="Rain Statistics", command= analyse_rain, width=20)
+btn_rain_stats.grid(row=2, column= 0)
+
+# date range picker listing the recorded frames of the selected radar
+history_frame = ttk.Frame(weather_interface)
+history_frame.grid(row=3, column=1, pady=10)
+
+tk.Label(history_frame, text="From", font=('Arial', 10)).grid(row=0, column=0, padx=5)
+history_from = ttk.Entry(history_frame, width=12)
+history_from.grid(row=0, column=1)
+tk.Label(history_frame, text="To", font=('Arial', 10)).grid(row=0, column=2, padx=5)
+history_to = ttk.Entry(history_frame, width=12)
+history_to.grid(row=0, column=3)
+
+btn_frame_history = tk.Button(history_frame, font = ('Arial', 10) ,text="Show History", command= show_frame_history, width=15)
+btn_frame_history.grid(row=0, column= 4, padx=5)
+
+history_label = tk.Label(history_frame, text="YYYY-MM-DD; leave both blank for the current listing", font=('Arial', 9))
+history_label.grid(row=1, column=0, columnspan=5)
+
+btn_mosaic = tk.Button(weather_interface, font = ('Arial', 10) ,text="Station Mosaic", command= open_station_mosaic, width=20)
+btn_mosaic.grid(row=3, column= 0)
+
+#open the DB and download the listings once the window has been drawn
+weather_interface.after_idle(lambda: task_runner.submit("startup", openning_database, 
+                                                         on_done=show_radar_stations,
+                                                         on_error=startup_failed))
 
 weather_interface.protocol("WM_DELETE_WINDOW", closing_interface)
 
+# F12 shows the metrics debug panel
+weather_interface.bind("<F12>", toggle_metrics_panel)
+
 weather_interface.mainloop()
 
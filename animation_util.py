@@ -0,0 +1,249 @@
+import collections
+import time
+import tkinter as tk
+
+
+class PhotoImageCache:
+    '''
+    A bounded, least recently used cache of decoded tk.PhotoImage objects,
+    keyed by layer name. Images must only be created and used on the Tk 
+    thread, so the cache is not thread safe.
+
+    Parameters:
+    max_images (int): The most images kept; the least recently used image is
+        dropped when a new one would exceed it.
+    '''
+    def __init__(self, max_images: int = 48):
+        self.max_images = max_images
+        self._images = collections.OrderedDict()
+
+    def get(self, name: str) -> tk.PhotoImage:
+        '''
+        Returns the cached image for *name*, or None if it is not cached.
+        '''
+        image = self._images.get(name)
+        if image is not None:
+            self._images.move_to_end(name)
+        return image
+
+    def put(self, name: str, image: tk.PhotoImage) -> None:
+        '''
+        Adds *image* to the cache under *name*.
+        '''
+        self._images[name] = image
+        self._images.move_to_end(name)
+        while len(self._images) > self.max_images:
+            self._images.popitem(last = False)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._images
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+
+class CompositeCache:
+    '''
+    Merges the static layers of each radar once, so that a radar frame can be
+    shown as a single image. The layers below the frame (the background) are
+    merged into one base image and the layers above it (range map, legend, 
+    cities) into another; compose then blends a frame between the two.
+
+    Parameters:
+    max_radars (int): The most radars whose merged layers are kept; the least
+        recently used radar is dropped first.
+    max_size (int): If given, composites are shrunk by a whole factor so 
+        that neither side is more than this many pixels. The merged layers
+        are shrunk once, so each frame only has its own pixels shrunk.
+    '''
+    def __init__(self, max_radars: int = 8, max_size: int = None):
+        self.max_radars = max_radars
+        self.max_size = max_size
+        self._bases = collections.OrderedDict()
+
+    @staticmethod
+    def _overlay(target: tk.PhotoImage, source: tk.PhotoImage) -> None:
+        # Alpha-blend source onto target inside Tk, without a Python round trip
+        target.tk.call(target, 'copy', source, '-compositingrule', 'overlay')
+
+    def has_radar(self, radar_id: str) -> bool:
+        '''
+        Returns True if the static layers of *radar_id* are already merged.
+        '''
+        return radar_id in self._bases
+
+    def add_radar(self, radar_id: str, under_layers: list, over_layers: list) -> None:
+        '''
+        Decodes and merges the static layers of a radar.
+
+        Parameters:
+        radar_id (str): The radar ID, e.g. "IDR023".
+        under_layers (list): PNG bytes of the layers below the frames, bottom 
+            first. The first layer sets the size of the composite.
+        over_layers (list): PNG bytes of the layers above the frames, bottom 
+            first.
+        '''
+        layers = [tk.PhotoImage(data = data) for data in (*under_layers, *over_layers)]
+        width, height = layers[0].width(), layers[0].height()
+        under_base = tk.PhotoImage(width = width, height = height)
+        over_base = tk.PhotoImage(width = width, height = height)
+        for index, layer in enumerate(layers):
+            self._overlay(under_base if index < len(under_layers) else over_base, layer)
+
+        factor = 1
+        if self.max_size is not None:
+            factor = max(1, -(-max(width, height) // self.max_size))
+        if factor > 1:
+            under_base, over_base = under_base.subsample(factor), over_base.subsample(factor)
+
+        self._bases[radar_id] = (under_base, over_base, factor)
+        self._bases.move_to_end(radar_id)
+        while len(self._bases) > self.max_radars:
+            self._bases.popitem(last = False)
+
+    def compose(self, frame_name: str, frame_data: bytes) -> tk.PhotoImage:
+        '''
+        Returns a single image of the radar frame with the merged static 
+        layers of its radar below and above it. add_radar must have been 
+        called for the radar first; a KeyError is raised if its merged 
+        layers are not cached, e.g. because they have been dropped.
+
+        Parameters:
+        frame_name (str): The frame file name, e.g. "IDR023.T.202405161124.png".
+        frame_data (bytes): The PNG content of the frame.
+        '''
+        radar_id = frame_name.split('.')[0]
+        under_base, over_base, factor = self._bases[radar_id]
+        self._bases.move_to_end(radar_id)
+        composite = under_base.copy()
+        frame = tk.PhotoImage(data = frame_data)
+        if factor > 1:
+            frame = frame.subsample(factor)
+        self._overlay(composite, frame)
+        self._overlay(composite, over_base)
+        return composite
+
+
+class RadarLoop:
+    '''
+    Plays a list of radar frames as a loop in one canvas image item: each 
+    tick only changes the image shown by that item. Upcoming frames are 
+    loaded on worker threads a few ticks ahead and kept, decoded, in a 
+    PhotoImageCache. If the next frame is not ready in time the current one
+    is held (counted in *stalls*) rather than blocking the interface.
+
+    Parameters:
+    canvas (tk.Canvas): The canvas holding the image item.
+    item (int): The canvas image item the frames are shown in.
+    task_runner (TaskRunner): Runs frame loading off the Tk thread.
+    image_cache (PhotoImageCache): Holds the decoded frames.
+    load_frame: Called on a worker thread with a frame name; returns the PNG 
+        bytes of that frame.
+    decode: Called on the Tk thread with a frame name and its bytes; returns
+        the tk.PhotoImage to show. Defaults to decoding the frame on its own.
+    fps (float): Frames shown per second.
+    prefetch (int): How many frames ahead of playback to load.
+    '''
+    TASK_PREFIX = "radar_loop"
+
+    def __init__(self, canvas: tk.Canvas, item: int, task_runner, image_cache: PhotoImageCache,
+                 load_frame, decode = None, fps: float = 5, prefetch: int = 4):
+        self.canvas = canvas
+        self.item = item
+        self.task_runner = task_runner
+        self.image_cache = image_cache
+        self.load_frame = load_frame
+        self.decode = decode or (lambda name, data: tk.PhotoImage(data = data))
+        self.interval = 1 / fps
+        self.prefetch = prefetch
+        self.frame_names = []
+        self.playing = False
+        self.stalls = 0
+        self.tick_seconds = collections.deque(maxlen = 1000)
+        self.shown_at = collections.deque(maxlen = 1000)
+        self._position = 0
+        self._loading = set()
+        self._failed = set()
+        self._next_tick = 0.0
+        self._after_id = None
+
+    def start(self, frame_names: list) -> None:
+        '''
+        Starts (or restarts) the loop.
+
+        Parameters:
+        frame_names (list): The radar frame names, oldest first.
+        '''
+        self.stop()
+        self.frame_names = list(frame_names)
+        self.playing = bool(self.frame_names)
+        if not self.playing:
+            return
+        self.stalls = 0
+        self.tick_seconds.clear()
+        self.shown_at.clear()
+        self._position = 0
+        self._failed.clear()
+        self._prefetch()
+        self._next_tick = time.perf_counter()
+        self._tick()
+
+    def stop(self) -> None:
+        '''
+        Stops the loop, leaving the last frame shown.
+        '''
+        self.playing = False
+        if self._after_id is not None:
+            self.canvas.after_cancel(self._after_id)
+            self._after_id = None
+        for name in self._loading:
+            self.task_runner.cancel(f"{self.TASK_PREFIX}:{name}")
+        self._loading.clear()
+
+    def _tick(self) -> None:
+        started = time.perf_counter()
+        name = self.frame_names[self._position]
+        if name in self._failed:
+            self._position = (self._position + 1) % len(self.frame_names)
+        else:
+            image = self.image_cache.get(name)
+            if image is None:
+                self.stalls += 1
+            else:
+                self.canvas.itemconfigure(self.item, image = image)
+                self.shown_at.append(started)
+                self._position = (self._position + 1) % len(self.frame_names)
+        self._prefetch()
+        self.tick_seconds.append(time.perf_counter() - started)
+
+        # Schedule against a fixed cadence so slow ticks do not add up to drift
+        self._next_tick = max(self._next_tick + self.interval, time.perf_counter())
+        delay_ms = int((self._next_tick - time.perf_counter()) * 1000)
+        self._after_id = self.canvas.after(max(delay_ms, 1), self._tick)
+
+    def _prefetch(self) -> None:
+        for offset in range(min(self.prefetch, len(self.frame_names))):
+            name = self.frame_names[(self._position + offset) % len(self.frame_names)]
+            if name in self.image_cache or name in self._loading or name in self._failed:
+                continue
+            self._loading.add(name)
+            self.task_runner.submit(f"{self.TASK_PREFIX}:{name}", self.load_frame, name,
+                                    on_done = lambda data, name = name: self._loaded(name, data),
+                                    on_error = lambda error, name = name: self._load_failed(name, error))
+
+    def _loaded(self, name: str, data: bytes) -> None:
+        self._loading.discard(name)
+        self.image_cache.put(name, self.decode(name, data))
+
+    def _load_failed(self, name: str, error: Exception) -> None:
+        self._loading.discard(name)
+        self._failed.add(name)
+        print(f"Unable to load radar frame {name}: {error}")
+
+    def achieved_fps(self) -> float:
+        '''
+        Returns the frames per second actually shown over the recorded ticks.
+        '''
+        if len(self.shown_at) < 2:
+            return 0.0
+        return (len(self.shown_at) - 1) / (self.shown_at[-1] - self.shown_at[0])
@@ -0,0 +1,148 @@
+'''
+Archive throughput benchmark: mirrors every radar image of ~350 stations
+from a fake BOM FTP server with RadarArchiver, first with one download
+thread and then with the default pool, and reports frames per second. A
+third run over the same archive shows that an interrupted or repeated run
+only downloads what is missing. Then checks that downloads failing with
+"451" are retried, and that only frames the server says it does not have
+are recorded as failed in the Frames table. Exits with an error if a run
+archives the wrong frames, opens more connections than the per-host limit
+or a check fails.
+
+Run from the repository root:  python benchmarks/bench_archive.py
+'''
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_util import CircuitBreaker, DownloadClient
+from index_util import RadarIndex
+from radar_core.archive import RadarArchiver
+from radar_core.frames import FAILED, LISTED
+from radar_core.settings import ARCHIVE_CONNECTIONS_PER_HOST, ARCHIVE_WORKERS
+from fake_bom_ftp import FakeBomFtpServer
+from run_benchmarks import create_database
+
+RADAR_DIR = '/anon/gen/radar'
+STATIONS = 350
+FRAMES = 4
+LATENCY = 0.005
+RETRY_STATIONS = 40
+
+
+def radar_files() -> dict:
+    return {f'{RADAR_DIR}/IDR{station:03d}.T.2024051611{minute:02d}.png': os.urandom(15_000)
+            for station in range(1, STATIONS + 1) for minute in range(FRAMES)}
+
+
+def run(server: FakeBomFtpServer, archive_dir: str, workers: int, connections: int,
+        radar_ids: list = None, database_name: str = None, radar_index = None,
+        **client_options):
+    client = DownloadClient(max_connections_per_host = connections, retry_seconds = 0.1,
+                            **client_options)
+    archiver = RadarArchiver(client, f'{server.base_url}{RADAR_DIR}/', archive_dir,
+                             workers = workers, database_name = database_name)
+    radar_index = radar_index or archiver.radar_index()
+    try:
+        return archiver.archive(radar_ids or radar_index.radar_ids(), radar_index)
+    finally:
+        client.close()
+
+
+def check(passed: bool, message: str) -> None:
+    if not passed:
+        sys.exit(message)
+
+
+def frame_statuses(database_name: str) -> dict:
+    connection = sqlite3.connect(database_name)
+    try:
+        return dict(connection.execute('SELECT RadarId || Timestamp, Status FROM Frames'))
+    finally:
+        connection.close()
+
+
+def main() -> None:
+    files = radar_files()
+    print(f'{STATIONS} stations x {FRAMES} frames, control reply latency {LATENCY * 1000:.0f} ms')
+    with FakeBomFtpServer(files, latency = LATENCY) as server:
+        for label, workers, connections in (
+                ('1 thread', 1, 1),
+                (f'{ARCHIVE_WORKERS} threads', ARCHIVE_WORKERS, ARCHIVE_CONNECTIONS_PER_HOST)):
+            archive_dir = tempfile.mkdtemp()
+            try:
+                server.most_open_connections = 0
+                stats = run(server, archive_dir, workers, connections)
+                print(f'{label:>12}: {stats}')
+                check(stats.archived == len(files) and not stats.failed,
+                      f'{label}: archived {stats.archived} of {len(files)} frames')
+                check(server.most_open_connections <= connections,
+                      f'{label}: {server.most_open_connections} connections open at once, '
+                      f'limit {connections}')
+                if workers > 1:
+                    # Lose a quarter of the archive, as if the run was interrupted
+                    lost = sorted(os.listdir(archive_dir))[::4]
+                    for radar_dir in lost:
+                        shutil.rmtree(os.path.join(archive_dir, radar_dir))
+                    stats = run(server, archive_dir, workers, connections)
+                    print(f'{"resumed":>12}: {stats}')
+                    check(stats.archived == len(lost) * FRAMES
+                          and stats.skipped == len(files) - len(lost) * FRAMES,
+                          f'resumed: archived {stats.archived} and skipped {stats.skipped} frames '
+                          f'with {len(lost) * FRAMES} lost')
+            finally:
+                shutil.rmtree(archive_dir, ignore_errors = True)
+
+        # A fifth of the downloads fail with "451" and must be retried; the
+        # circuit breaker is kept out of the way so only retries are tested
+        radar_ids = [f'IDR{station:03d}' for station in range(1, RETRY_STATIONS + 1)]
+        archive_dir = tempfile.mkdtemp()
+        database_name = os.path.join(archive_dir, 'radar_app.db')
+        create_database(database_name, 0, 0)
+        try:
+            server.error_rate = 0.2
+            retrievals = server.retrievals
+            stats = run(server, archive_dir, ARCHIVE_WORKERS, ARCHIVE_CONNECTIONS_PER_HOST,
+                        radar_ids, attempts = 6,
+                        circuit_breaker = CircuitBreaker(failure_threshold = 1000))
+            print(f'{"20% errors":>12}: {stats}, {server.retrievals - retrievals} downloads')
+            check(stats.archived == RETRY_STATIONS * FRAMES and not stats.failed,
+                  f'20% errors: archived {stats.archived} of {RETRY_STATIONS * FRAMES} frames')
+            check(server.retrievals - retrievals > RETRY_STATIONS * FRAMES,
+                  '20% errors: no download was retried')
+
+            # Only a frame the server says it does not have is marked failed;
+            # frames which kept failing for other reasons stay listed
+            missing_id = f'IDR{RETRY_STATIONS + 1:03d}'
+            radar_index = RadarIndex({missing_id: [f'2024051611{minute:02d}' for minute in range(FRAMES)]})
+            missing = f'{RADAR_DIR}/{missing_id}.T.202405161100.png'
+            # Listed, but gone by the time it is downloaded
+            content = files.pop(missing)
+            server.error_rate = 0.0
+            try:
+                run(server, archive_dir, 1, 1, [missing_id], database_name, radar_index)
+            finally:
+                files[missing] = content
+            server.error_rate = 1.0
+            try:
+                run(server, archive_dir, 1, 1, [f'IDR{RETRY_STATIONS + 2:03d}'], database_name,
+                    attempts = 1)
+            finally:
+                server.error_rate = 0.0
+            statuses = frame_statuses(database_name)
+            check(statuses[f'{missing_id}202405161100'] == FAILED,
+                  'a frame missing from the server was not marked failed')
+            check(all(statuses[f'IDR{RETRY_STATIONS + 2:03d}2024051611{minute:02d}'] == LISTED
+                      for minute in range(FRAMES)),
+                  'frames which failed with "451" were not left listed')
+            print(f'{"statuses":>12}: missing frame failed, frames failing with 451 left listed')
+        finally:
+            shutil.rmtree(archive_dir, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+'''
+Memory benchmark for displaying radar images: performs thousands of frame 
+selections, first stacking five new canvas items per selection as 
+radar_image_display used to, then showing one merged image from 
+CompositeCache in a single canvas item. Reports the canvas item count and 
+the resident memory of the process as the selections go on.
+
+Without a display the images are shown in stand-in widgets (see 
+headless_tk), so the item counts are checked but the memory reported is
+that of the inflated pixels, not of Tk's images. Run from the repository
+root:  
+    python benchmarks/bench_canvas_memory.py
+'''
+import os
+import sys
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from animation_util import CompositeCache, PhotoImageCache
+from synthetic_png import make_png
+from headless_tk import HeadlessCanvas, HeadlessCompositeCache, HeadlessImage, inflate_png, open_root
+
+SELECTIONS = 3000
+FRAMES = 20
+REPORT_EVERY = 500
+
+
+def resident_megabytes() -> float:
+    # Linux only; other systems report 0
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def stacked_selections(root, canvas, frames: list, static_layers: list, make_image,
+                       selections: int = SELECTIONS, report_every: int = REPORT_EVERY) -> int:
+    '''
+    Selects frames as radar_image_display used to, stacking a new canvas
+    item for every layer, and returns the canvas item count at the end.
+    '''
+    for selection in range(1, selections + 1):
+        name, data = frames[selection % len(frames)]
+        images = [make_image(layer) for layer in (static_layers[0], data, *static_layers[1:])]
+        for image in images:
+            canvas.create_image(0, 0, anchor = tk.NW, image = image)
+        canvas.images = images
+        if selection % report_every == 0:
+            root.update()
+            print(f'  {selection:5d}: {len(canvas.find_all()):6d} items, {resident_megabytes():7.1f} MB')
+    return len(canvas.find_all())
+
+
+def merged_selections(root, canvas, frames: list, static_layers: list, composites,
+                      selections: int = SELECTIONS, report_every: int = REPORT_EVERY) -> int:
+    '''
+    Selects frames by showing one merged image in a single canvas item, and
+    returns the canvas item count at the end.
+    '''
+    composites.add_radar(frames[0][0].split('.')[0], static_layers[:1], static_layers[1:])
+    image_cache = PhotoImageCache()
+    item = canvas.create_image(0, 0, anchor = tk.NW)
+    for selection in range(1, selections + 1):
+        name, data = frames[selection % len(frames)]
+        image = image_cache.get(name)
+        if image is None:
+            image = composites.compose(name, data)
+            image_cache.put(name, image)
+        canvas.itemconfigure(item, image = image)
+        if selection % report_every == 0:
+            root.update()
+            print(f'  {selection:5d}: {len(canvas.find_all()):6d} items, {resident_megabytes():7.1f} MB')
+    return len(canvas.find_all())
+
+
+def main() -> None:
+    root, headless = open_root()
+    if headless:
+        make_canvas = lambda: HeadlessCanvas(root, width = 512, height = 512)
+        make_image = lambda data: HeadlessImage(inflate_png(data))
+        composites = HeadlessCompositeCache()
+    else:
+        def make_canvas():
+            canvas = tk.Canvas(root, width = 512, height = 512)
+            canvas.pack()
+            return canvas
+        make_image = lambda data: tk.PhotoImage(data = data)
+        composites = CompositeCache()
+
+    static_layers = [make_png(coverage = 1.0, seed = 99)] + [make_png(seed = seed) for seed in (97, 98)]
+    frames = [(f'IDR023.T.2024051611{minute:02d}.png', make_png(seed = minute)) 
+              for minute in range(FRAMES)]
+
+    print(f'stacked layers: {SELECTIONS} selections of {FRAMES} frames')
+    canvas = make_canvas()
+    stacked_items = stacked_selections(root, canvas, frames, static_layers, make_image)
+    canvas.destroy()
+
+    print(f'single merged item: {SELECTIONS} selections of {FRAMES} frames')
+    merged_items = merged_selections(root, make_canvas(), frames, static_layers, composites)
+    root.destroy()
+    # The stacked items grow with every selection; the merged item must not
+    stacked_expected = SELECTIONS * (len(static_layers) + 1)
+    if merged_items != 1 or stacked_items != stacked_expected:
+        sys.exit(f'expected 1 merged item and {stacked_expected} stacked items, '
+                 f'found {merged_items} and {stacked_items}')
+
+
+if __name__ == '__main__':
+    main()
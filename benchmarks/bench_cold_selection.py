@@ -0,0 +1,87 @@
+'''
+Measures how long it takes to fetch every layer of a radar frame which is 
+not on disk yet (a "cold" selection), first one file at a time with 
+download_util.download_file as radar_image_display used to, then with the 
+pooled, concurrent DownloadClient.
+
+Run from the repository root:  python benchmarks/bench_cold_selection.py
+'''
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_util import DownloadClient, download_file
+from fake_bom_ftp import FakeBomFtpServer
+
+RADAR_DIR = '/anon/gen/radar'
+BACKGROUND_DIR = '/anon/gen/radar_transparencies'
+LATENCY = 0.02
+SELECTIONS = 5
+
+
+def synthetic_files(radar_id: str, frames: int) -> dict:
+    files = {
+        f'{BACKGROUND_DIR}/{radar_id}.background.png': os.urandom(60_000),
+        f'{BACKGROUND_DIR}/{radar_id}.range.png': os.urandom(8_000),
+        f'{BACKGROUND_DIR}/{radar_id}.locations.png': os.urandom(12_000),
+        f'{BACKGROUND_DIR}/IDR.legend.1.png': os.urandom(4_000),
+        f'{BACKGROUND_DIR}/IDR.legend.2.png': os.urandom(4_000),
+    }
+    for minute in range(frames):
+        files[f'{RADAR_DIR}/{radar_id}.T.2024051611{minute:02d}.png'] = os.urandom(20_000)
+    return files
+
+
+def layer_downloads(base_url: str, radar_id: str, frame: int) -> list:
+    radar_url = f'{base_url}{RADAR_DIR}/'
+    background_url = f'{base_url}{BACKGROUND_DIR}/'
+    names = [(radar_url, f'{radar_id}.T.2024051611{frame:02d}.png'),
+             (background_url, f'{radar_id}.background.png'),
+             (background_url, f'{radar_id}.range.png'),
+             (background_url, 'IDR.legend.1.png'),
+             (background_url, 'IDR.legend.2.png'),
+             (background_url, f'{radar_id}.locations.png')]
+    return [(f'{url}/{name}', name) for url, name in names]
+
+
+def time_selections(download_all) -> list:
+    timings = []
+    for frame in range(SELECTIONS):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            os.chdir(cache_dir)
+            start = time.perf_counter()
+            download_all(frame)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    original_dir = os.getcwd()
+    with FakeBomFtpServer(synthetic_files('IDR023', SELECTIONS), LATENCY) as server:
+        downloads = lambda frame: layer_downloads(server.base_url, 'IDR023', frame)
+
+        def sequential(frame: int) -> None:
+            for url, name in downloads(frame):
+                download_file(url, name)
+
+        before = time_selections(sequential)
+
+        client = DownloadClient()
+        try:
+            after = time_selections(lambda frame: client.download_files(downloads(frame)))
+        finally:
+            client.close()
+    os.chdir(original_dir)
+
+    print(f'simulated round trip: {LATENCY * 1000:.0f} ms, {SELECTIONS} cold selections')
+    print(f'sequential urlopen : median {statistics.median(before) * 1000:7.1f} ms')
+    print(f'pooled concurrent  : first  {after[0] * 1000:7.1f} ms, '
+          f'median {statistics.median(after) * 1000:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
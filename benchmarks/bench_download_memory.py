@@ -0,0 +1,72 @@
+'''
+Peak memory benchmark for saving a large download (such as a long listing
+or an archived file) from a fake BOM FTP server: first buffered whole in
+memory and then written, as download_file used to, then streamed through an
+AtomicFileWriter. Also interrupts a streamed download halfway to show that
+the target file is never left truncated.
+
+Run from the repository root:  python benchmarks/bench_download_memory.py
+'''
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_util import DownloadClient
+from fake_bom_ftp import FakeBomFtpServer
+
+FILE_PATH = '/anon/gen/radar/archive.bin'
+FILE_BYTES = 64 * 1024 * 1024
+
+
+def measure(function) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main() -> None:
+    content = os.urandom(FILE_BYTES)
+    with FakeBomFtpServer({FILE_PATH: content}) as server, \
+            tempfile.TemporaryDirectory() as folder:
+        url = f'{server.base_url}{FILE_PATH}'
+        file_name = os.path.join(folder, 'archive.bin')
+        client = DownloadClient()
+
+        def buffered():
+            data = client.download_bytes(url)
+            with open(file_name, 'wb') as file:
+                file.write(data)
+
+        print(f'{FILE_BYTES / 2 ** 20:.0f} MB download')
+        for label, function in (('buffered', buffered),
+                                ('streamed', lambda: client.download_file(url, file_name))):
+            if os.path.exists(file_name):
+                os.remove(file_name)
+            seconds, peak = measure(function)
+            print(f'  {label}: peak traced memory {peak / 2 ** 20:7.2f} MB, {seconds:5.2f} s')
+
+        # Interrupt a download halfway, as a crash would
+        def interrupt(received, expected):
+            if received > FILE_BYTES // 2:
+                raise KeyboardInterrupt
+
+        os.remove(file_name)
+        try:
+            client.download_file(url, file_name, progress = interrupt)
+        except KeyboardInterrupt:
+            pass
+        print(f'  interrupted: target exists {os.path.exists(file_name)}, '
+              f'files left {os.listdir(folder)}')
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+'''
+Throughput benchmark for writing Log rows: one connection, INSERT and commit
+per event (as log_event_db used to do) against the batched EventLogger.
+
+Run from the repository root:  python benchmarks/bench_event_logger.py
+'''
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_util import EventLogger
+
+EVENTS = 100_000
+PER_EVENT_SAMPLE = 2_000
+INSERT_LOG_INFO = "INSERT INTO Log VALUES(?, ?, ?)"
+
+
+def create_database(folder: str) -> str:
+    database_name = os.path.join(folder, 'radar_app.db')
+    connection = sqlite3.connect(database_name)
+    connection.execute('CREATE TABLE Log (EventType TEXT, DateTime TEXT, Details TEXT)')
+    connection.commit()
+    connection.close()
+    return database_name
+
+
+def per_event(database_name: str, count: int) -> float:
+    start = time.perf_counter()
+    for number in range(count):
+        connection = sqlite3.connect(database_name)
+        stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        connection.execute(INSERT_LOG_INFO, ("ViewImage", stamp, f"Viewing image {number}"))
+        connection.commit()
+        connection.close()
+    return time.perf_counter() - start
+
+
+def batched(database_name: str, count: int) -> tuple:
+    logger = EventLogger(database_name, INSERT_LOG_INFO)
+    start = time.perf_counter()
+    for number in range(count):
+        stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        logger.log("ViewImage", stamp, f"Viewing image {number}")
+    queued = time.perf_counter() - start
+    logger.close()
+    return queued, time.perf_counter() - start
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        seconds = per_event(create_database(folder), PER_EVENT_SAMPLE)
+        print(f'connect/commit per event : {PER_EVENT_SAMPLE / seconds:10.0f} events/s '
+              f'({seconds / PER_EVENT_SAMPLE * 1e6:.0f} us each, {PER_EVENT_SAMPLE} sampled)')
+
+    with tempfile.TemporaryDirectory() as folder:
+        database_name = create_database(folder)
+        queued, total = batched(database_name, EVENTS)
+        connection = sqlite3.connect(database_name)
+        (rows,) = connection.execute('SELECT COUNT(*) FROM Log').fetchone()
+        connection.close()
+        assert rows == EVENTS, rows
+        print(f'batched EventLogger      : {EVENTS / total:10.0f} events/s '
+              f'({EVENTS} written, caller blocked {queued / EVENTS * 1e6:.1f} us each)')
+
+
+if __name__ == '__main__':
+    main()
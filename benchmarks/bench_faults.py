@@ -0,0 +1,104 @@
+'''
+Fault benchmark for DownloadClient against a fake BOM FTP server with faults
+injected, comparing the old behaviour (one try, long timeout, no circuit
+breaker or negative cache) with the new defaults:
+
+  stalls   a few downloads stall; reports the latency percentiles
+  outage   the server stops answering; reports how long callers wait and
+           how often the server is contacted
+  missing  a layer which does not exist is asked for repeatedly; reports how
+           often the server is asked for it
+
+Run from the repository root:  python benchmarks/bench_faults.py
+'''
+import os
+import statistics
+import sys
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_util import CircuitBreaker, DownloadClient, NegativeCache
+from fake_bom_ftp import FakeBomFtpServer
+
+RADAR_DIR = '/anon/gen/radar'
+BACKGROUND_DIR = '/anon/gen/radar_transparencies'
+DOWNLOADS = 400
+OUTAGE_DOWNLOADS = 80
+THREADS = 8
+STALL_SECONDS = 5.0
+
+
+def old_client() -> DownloadClient:
+    return DownloadClient(timeout = 30.0, connect_timeout = 30.0, attempts = 1,
+                          circuit_breaker = CircuitBreaker(failure_threshold = 10 ** 9),
+                          negative_cache = NegativeCache(seconds = 0))
+
+
+def new_client() -> DownloadClient:
+    return DownloadClient(timeout = 0.5, connect_timeout = 0.5, retry_seconds = 0.05)
+
+
+def timed_downloads(client: DownloadClient, urls: list) -> tuple:
+    def timed(url):
+        start = time.perf_counter()
+        try:
+            client.download_bytes(url)
+            failed = False
+        except urllib.error.URLError:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    with ThreadPoolExecutor(max_workers = THREADS) as executor:
+        results = list(executor.map(timed, urls))
+    return [seconds for seconds, _ in results], sum(failed for _, failed in results)
+
+
+def percentiles(timings: list) -> str:
+    cuts = statistics.quantiles(timings, n = 100)
+    return (f'p50 {cuts[49] * 1000:7.1f} ms  p95 {cuts[94] * 1000:7.1f} ms  '
+            f'p99 {cuts[98] * 1000:7.1f} ms  max {max(timings) * 1000:7.1f} ms')
+
+
+def main() -> None:
+    files = {f'{RADAR_DIR}/IDR023.T.{200000000000 + number}.png': os.urandom(10_000)
+             for number in range(DOWNLOADS)}
+
+    print(f'stalls: {DOWNLOADS} downloads, 2% stall for {STALL_SECONDS:.0f} s, 2% fail')
+    for label, make_client in (('old', old_client), ('new', new_client)):
+        with FakeBomFtpServer(files) as server:
+            server.hang_rate, server.hang_seconds, server.error_rate = 0.02, STALL_SECONDS, 0.02
+            client = make_client()
+            timings, failures = timed_downloads(client, [f'{server.base_url}{name}' for name in files])
+            client.close()
+            print(f'  {label}: {percentiles(timings)}  failed {failures}')
+
+    print(f'outage: {OUTAGE_DOWNLOADS} downloads while the server does not answer for '
+          f'{STALL_SECONDS:.0f} s')
+    for label, make_client in (('old', old_client), ('new', new_client)):
+        with FakeBomFtpServer(files) as server:
+            server.down, server.hang_seconds = True, STALL_SECONDS
+            client = make_client()
+            start = time.perf_counter()
+            urls = [f'{server.base_url}{name}' for name in list(files)[:OUTAGE_DOWNLOADS]]
+            timings, failures = timed_downloads(client, urls)
+            elapsed = time.perf_counter() - start
+            client.close()
+            print(f'  {label}: {elapsed:5.2f} s in all, {percentiles(timings)}, '
+                  f'{server.connections} connections')
+
+    print(f'missing: {DOWNLOADS} requests for a layer which does not exist')
+    for label, make_client in (('old', old_client), ('new', new_client)):
+        with FakeBomFtpServer(files) as server:
+            client = make_client()
+            url = f'{server.base_url}{BACKGROUND_DIR}/IDR023.locations.png'
+            timings, failures = timed_downloads(client, [url] * DOWNLOADS)
+            client.close()
+            print(f'  {label}: {server.retrievals} requests reached the server, '
+                  f'{percentiles(timings)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''
+Times listing one day and one week of a radar's frame history out of three
+months of frames recorded for 20 stations: as an indexed range query on the
+Frames table, against a regular expression scan of a listing holding the
+same frames, which is the only way to find old frames without the table.
+Also times recording a refresh of the listing, which only writes the new
+frames.
+
+Run from the repository root:  python benchmarks/bench_frame_history.py
+'''
+import datetime
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import timeit
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIR)
+
+from index_util import RadarIndex
+from radar_core import frames
+
+STATIONS = 20
+DAYS = 90
+FRAMES_PER_DAY = 240
+
+
+def timestamps(days: int) -> list:
+    start = datetime.datetime(2024, 3, 1)
+    return [(start + datetime.timedelta(minutes = 6 * number)).strftime('%Y%m%d%H%M')
+            for number in range(days * FRAMES_PER_DAY)]
+
+
+def radar_ids() -> list:
+    return [f'IDR{station + 10:03d}' for station in range(STATIONS)]
+
+
+def synthetic_listing(stamps: list) -> str:
+    return ''.join(f'-rw-r--r--    1 ftp      ftp         20481 May 16 11:24 '
+                   f'{radar_id}.T.{stamp}.png\r\n'
+                   for radar_id in radar_ids() for stamp in stamps)
+
+
+def regex_scan(listing: str, radar_id: str, start: str, end: str) -> list:
+    return sorted(stamp for found_id, stamp in re.findall(r'(IDR\d{3})\.T\.(\d{12})\.png', listing)
+                  if found_id == radar_id and start <= stamp < end)
+
+
+def per_call_ms(action, repeats: int) -> float:
+    return min(timeit.repeat(action, number = repeats, repeat = 3)) / repeats * 1000
+
+
+def main() -> None:
+    stamps = timestamps(DAYS)
+    database_name = os.path.join(tempfile.mkdtemp(), 'frames.db')
+    connection = sqlite3.connect(database_name)
+    with open(os.path.join(REPOSITORY_DIR, 'create_db.sql')) as script:
+        connection.executescript(script.read())
+    connection.close()
+    frames.record_frames([(radar_id, stamp, None, None, frames.LISTED)
+                          for radar_id in radar_ids() for stamp in stamps], database_name)
+    listing = synthetic_listing(stamps)
+
+    radar_id = 'IDR020'
+    day = ('20240515', '20240516')
+    week = ('20240515', '20240522')
+    def query(start, end):
+        return [record.timestamp for record in frames.frame_range(radar_id, start, end, database_name)]
+    assert query(*week) == regex_scan(listing, radar_id, *week)
+
+    # A refresh of the listing adds one frame per station to what is recorded
+    previous_index = RadarIndex({radar_id: stamps[-FRAMES_PER_DAY:] for radar_id in radar_ids()})
+    next_stamps = timestamps(DAYS + 1)[-FRAMES_PER_DAY - 1:]
+    refreshed_index = RadarIndex({radar_id: next_stamps[1:] for radar_id in radar_ids()})
+    record_refresh = lambda: frames.record_frames(
+        frames.listed_rows(refreshed_index.new_frames(previous_index)), database_name)
+
+    print(f'{STATIONS} stations x {DAYS} days x {FRAMES_PER_DAY} frames '
+          f'({STATIONS * len(stamps)} rows, {len(listing) / 1e6:.0f} MB listing)')
+    print(f'one day,  indexed query : {per_call_ms(lambda: query(*day), 20):9.2f} ms')
+    print(f'one week, indexed query : {per_call_ms(lambda: query(*week), 20):9.2f} ms')
+    print(f'one week, regex scan    : {per_call_ms(lambda: regex_scan(listing, radar_id, *week), 1):9.2f} ms')
+    print(f'record a refresh        : {per_call_ms(record_refresh, 20):9.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
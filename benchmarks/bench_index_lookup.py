@@ -0,0 +1,64 @@
+'''
+Compares the cost of one radar station selection when the whole radar 
+listing is searched with a regular expression and strptime (as 
+radar_station_select used to do) against a lookup in a parsed RadarIndex.
+
+Run from the repository root:  python benchmarks/bench_index_lookup.py
+'''
+import datetime
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_util import RadarIndex, format_timestamp
+
+STATIONS = 350
+FRAMES = 20
+
+
+def synthetic_listing() -> str:
+    lines = []
+    for station in range(STATIONS):
+        radar_id = f'IDR{station + 10:03d}'
+        for frame in range(FRAMES):
+            lines.append(f'-rw-r--r--    1 ftp      ftp         20481 May 16 11:24 '
+                         f'{radar_id}.T.2024051611{frame * 3 % 60:02d}.png\r\n')
+    return ''.join(lines)
+
+
+def regex_scan(listing: str, radar_id: str) -> list:
+    rows = []
+    for match in re.findall(r'(IDR\d{3})\.T\.(\d{12})\.png', listing):
+        if match[0] == radar_id:
+            timestamp = datetime.datetime.strptime(match[1], "%Y%m%d%H%M")
+            rows.append((radar_id, timestamp.date().isoformat(), 
+                         timestamp.time().strftime("%H:%M")))
+    return rows
+
+
+def index_lookup(index: RadarIndex, radar_id: str) -> list:
+    return [(radar_id, *format_timestamp(timestamp)) for timestamp in index.frames(radar_id)]
+
+
+def main() -> None:
+    listing = synthetic_listing()
+    index = RadarIndex.parse(listing)
+    radar_id = 'IDR200'
+    assert regex_scan(listing, radar_id) == index_lookup(index, radar_id)
+
+    repeats = 50
+    scan = min(timeit.repeat(lambda: regex_scan(listing, radar_id), number = repeats, repeat = 3))
+    parse = min(timeit.repeat(lambda: RadarIndex.parse(listing), number = repeats, repeat = 3))
+    lookup = min(timeit.repeat(lambda: index_lookup(index, radar_id), number = repeats, repeat = 3))
+
+    print(f'{STATIONS} stations x {FRAMES} frames ({len(listing)} byte listing)')
+    print(f'regex scan per click   : {scan / repeats * 1e6:9.1f} us')
+    print(f'parse once per refresh : {parse / repeats * 1e6:9.1f} us')
+    print(f'index lookup per click : {lookup / repeats * 1e6:9.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+'''
+Timing benchmark for finding the new frames of a refreshed radar listing of
+every station (200 stations x 240 frames), in which each station has dropped
+its oldest frame and published a new one: RadarIndex.new_frames against
+diffing sets of every image name in both listings. Also times a refresh
+where a few stations publish a late frame in the middle of their listing.
+
+Run from the repository root:  python benchmarks/bench_listing_diff.py
+'''
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_util import RadarIndex
+
+STATIONS = 200
+FRAMES = 240
+
+
+def timestamps(start: int, count: int) -> list:
+    first = datetime.datetime(2024, 5, 16)
+    return [(first + datetime.timedelta(minutes = 6 * number)).strftime('%Y%m%d%H%M')
+            for number in range(start, start + count)]
+
+
+def set_diff(radar_index: RadarIndex, previous: RadarIndex) -> list:
+    # Every image name of both listings, as a whole-listing comparison does
+    known = {(radar_id, timestamp) for radar_id in previous.radar_ids()
+             for timestamp in previous.frames(radar_id)}
+    return sorted((radar_id, timestamp) for radar_id in radar_index.radar_ids()
+                  for timestamp in radar_index.frames(radar_id)
+                  if (radar_id, timestamp) not in known)
+
+
+def main() -> None:
+    radar_ids = [f'IDR{number:03d}' for number in range(STATIONS)]
+    previous = RadarIndex({radar_id: timestamps(0, FRAMES) for radar_id in radar_ids})
+    refreshed = RadarIndex({radar_id: timestamps(1, FRAMES) for radar_id in radar_ids})
+    late = RadarIndex({radar_id: sorted(timestamps(0, FRAMES) +
+                                        ([f'{timestamps(100, 1)[0][:-1]}3'] if number % 20 == 0 else []))
+                       for number, radar_id in enumerate(radar_ids)})
+    for radar_index in (refreshed, late):
+        assert [tuple(new_frame) for new_frame in radar_index.new_frames(previous)] == \
+            set_diff(radar_index, previous)
+
+    repeats = 20
+    print(f'{STATIONS} stations x {FRAMES} frames')
+    for name, radar_index in (('new frame each', refreshed), ('late frames   ', late)):
+        tail = min(timeit.repeat(lambda: radar_index.new_frames(previous), number = repeats, repeat = 3))
+        full = min(timeit.repeat(lambda: set_diff(radar_index, previous), number = repeats, repeat = 3))
+        print(f'{name}: new_frames {tail / repeats * 1000:7.2f} ms, '
+              f'set diff {full / repeats * 1000:7.2f} ms '
+              f'({len(radar_index.new_frames(previous))} new)')
+
+
+if __name__ == '__main__':
+    main()
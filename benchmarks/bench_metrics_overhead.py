@@ -0,0 +1,67 @@
+'''
+Overhead benchmark for metrics_util: the cost per call of timer, count and
+a timed function, with metrics off and on, against the same call with no
+instrumentation at all. Then downloads a set of files from a fake BOM FTP
+server with metrics on and prints what was recorded, in Prometheus format.
+
+Run from the repository root:  python benchmarks/bench_metrics_overhead.py
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics_util
+from download_util import DownloadClient
+from fake_bom_ftp import FakeBomFtpServer
+
+CALLS = 1_000_000
+RADAR_DIR = '/anon/gen/radar'
+
+
+def plain() -> None:
+    pass
+
+
+@metrics_util.timed('bench_seconds')
+def decorated() -> None:
+    pass
+
+
+def with_timer() -> None:
+    with metrics_util.timer('bench_seconds'):
+        pass
+
+
+def with_count() -> None:
+    metrics_util.count('bench_total')
+
+
+def per_call(function) -> float:
+    return min(timeit.repeat(function, number = CALLS, repeat = 3)) / CALLS * 1e9
+
+
+def main() -> None:
+    baseline = per_call(plain)
+    print(f'{CALLS} calls each, nanoseconds per call over an empty function ({baseline:.0f} ns)')
+    for enabled in (False, True):
+        metrics_util.enable(enabled)
+        costs = ', '.join(f'{label} {per_call(function) - baseline:6.0f}'
+                          for label, function in (('timed', decorated), ('timer', with_timer),
+                                                  ('count', with_count)))
+        print(f'  metrics {"on " if enabled else "off"}: {costs}')
+
+    metrics_util.reset()
+    metrics_util.enable()
+    files = {f'{RADAR_DIR}/IDR023.T.{202405161100 + number}.png': os.urandom(20_000)
+             for number in range(50)}
+    with FakeBomFtpServer(files) as server:
+        client = DownloadClient()
+        client.download_all([f'{server.base_url}{name}' for name in files])
+        client.close()
+    print(metrics_util.prometheus_text())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+'''
+Timing benchmark for the station mosaic with 36 stations served by the fake
+BOM FTP server with 50 ms of latency: first as one task fetching every
+station's layers in turn and then drawing every tile at once, then through
+MosaicGrid, which fetches every station at the same time and draws tiles
+as they arrive. Times how long until every tile is drawn and the longest
+the Tk event loop was held up meanwhile, measured by a callback asking to
+run every 5 ms. Then times a refresh in which every station has a new
+frame.
+
+Without a display the mosaic is drawn into stand-in widgets (see 
+headless_tk), so the fetching and the drawing slices are timed but Tk's
+drawing and blending are not. Run from the repository root:
+    python benchmarks/bench_mosaic.py
+'''
+import os
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from animation_util import CompositeCache
+from index_util import RadarIndex
+from mosaic_util import MosaicGrid
+from radar_core import RadarCore
+from task_util import TaskRunner
+from fake_bom_ftp import FakeBomFtpServer
+from headless_tk import HeadlessCanvas, HeadlessCompositeCache, open_root
+from run_benchmarks import BACKGROUND_DIR, RADAR_DIR, create_database, synthetic_files
+
+STATIONS = 36
+LATENCY = 0.05
+TILE_SIZE = 170
+WORKERS = 8
+
+
+class Heartbeat:
+    '''
+    Records the longest gap between runs of a callback asking to run every
+    *interval* seconds, i.e. the longest the event loop was busy.
+    '''
+    def __init__(self, root: tk.Tk, interval: float = 0.005):
+        self.root = root
+        self.interval = interval
+        self.longest = 0.0
+        self._last = time.perf_counter()
+        self._job = root.after(int(interval * 1000), self._beat)
+
+    def _beat(self) -> None:
+        now = time.perf_counter()
+        self.longest = max(self.longest, now - self._last - self.interval)
+        self._last = now
+        self._job = self.root.after(int(self.interval * 1000), self._beat)
+
+    def stop(self) -> None:
+        self.root.after_cancel(self._job)
+
+
+def wait_until(root: tk.Tk, done, timeout: float = 60) -> None:
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            sys.exit(f'the mosaic was not drawn within {timeout:.0f} s')
+        root.update()
+        time.sleep(0.001)
+
+
+def make_canvas(root, width: int, height: int):
+    if not isinstance(root, tk.Tk):
+        return HeadlessCanvas(root, width = width, height = height)
+    canvas = tk.Canvas(root, width = width, height = height)
+    canvas.pack()
+    return canvas
+
+
+def make_composites(root, max_radars: int, max_size: int):
+    if not isinstance(root, tk.Tk):
+        return HeadlessCompositeCache(max_radars = max_radars, max_size = max_size)
+    return CompositeCache(max_radars = max_radars, max_size = max_size)
+
+
+def new_core(server, work_dir: str, number: int) -> RadarCore:
+    # Each run starts with an empty layer cache and archive
+    return RadarCore(os.path.join(work_dir, 'radar_app.db'), f'{server.base_url}{RADAR_DIR}/',
+                     f'{server.base_url}{BACKGROUND_DIR}/',
+                     cache_dir = os.path.join(work_dir, f'radar_cache_{number}'),
+                     archive_dir = os.path.join(work_dir, f'radar_archive_{number}'))
+
+
+def sequential_mosaic(root: tk.Tk, core: RadarCore, radar_index: RadarIndex, radar_ids: list) -> tuple:
+    # One task fetching every station's layers in turn, then drawing them all
+    canvas = make_canvas(root, 6 * TILE_SIZE, 6 * TILE_SIZE)
+    runner = TaskRunner(root)
+    composites = make_composites(root, STATIONS, TILE_SIZE)
+    images = []
+
+    def fetch_all():
+        fetched = []
+        for radar_id in radar_ids:
+            layers = core.radar_layers(radar_id, f'{radar_id}.T.{radar_index.frames(radar_id)[-1]}.png')
+            fetched.append((radar_id, [name for name, _, _ in layers], core.fetch_layers(layers)))
+        return fetched
+
+    def draw_all(fetched):
+        for radar_id, names, layer_data in fetched:
+            composites.add_radar(radar_id, [layer_data[names[1]]],
+                                 [layer_data[name] for name in (names[2], names[3], names[5])
+                                  if name in layer_data])
+            images.append(composites.compose(names[0], layer_data[names[0]]))
+            canvas.create_image((len(images) - 1) % 6 * TILE_SIZE, (len(images) - 1) // 6 * TILE_SIZE,
+                                image = images[-1], anchor = tk.NW)
+
+    heartbeat = Heartbeat(root)
+    start = time.perf_counter()
+    runner.submit('mosaic', fetch_all, on_done = draw_all)
+    wait_until(root, lambda: len(images) == len(radar_ids))
+    seconds = time.perf_counter() - start
+    heartbeat.stop()
+    runner.shutdown()
+    canvas.destroy()
+    return seconds, heartbeat.longest
+
+
+def mosaic_grid(root: tk.Tk, core: RadarCore, indexes: list, radar_ids: list) -> list:
+    canvas = make_canvas(root, 6 * (TILE_SIZE + MosaicGrid.PADDING), 6 * TILE_SIZE)
+    runner = TaskRunner(root, max_workers = WORKERS)
+    grid = MosaicGrid(canvas, runner, make_composites(root, STATIONS, TILE_SIZE),
+                      core.radar_layers, core.fetch_layers, tile_size = TILE_SIZE)
+    grid.set_stations([(radar_id, radar_id) for radar_id in radar_ids])
+
+    results = []
+    for radar_index in indexes:
+        heartbeat = Heartbeat(root)
+        drawn = grid.tiles_drawn
+        start = time.perf_counter()
+        grid.show(radar_index)
+        wait_until(root, lambda: grid.tiles_drawn - drawn == len(radar_ids))
+        results.append((time.perf_counter() - start, heartbeat.longest))
+        heartbeat.stop()
+    grid.close()
+    runner.shutdown()
+    canvas.destroy()
+    return results
+
+
+def main() -> None:
+    root, _ = open_root()
+
+    radar_ids = [f'IDR{number:02d}3' for number in range(1, STATIONS + 1)]
+    files = synthetic_files(radar_ids, 2, 512)
+    frames = {radar_id: sorted(name.split('.')[2] for name in files
+                               if name.startswith(f'{RADAR_DIR}/{radar_id}.T.'))
+              for radar_id in radar_ids}
+    first_index = RadarIndex({radar_id: stamps[:1] for radar_id, stamps in frames.items()})
+    refreshed_index = RadarIndex(frames)
+
+    work_dir = tempfile.mkdtemp()
+    create_database(os.path.join(work_dir, 'radar_app.db'), STATIONS, 0)
+    with FakeBomFtpServer(files, latency = LATENCY) as server:
+        print(f'{STATIONS} stations, {LATENCY * 1000:.0f} ms latency, {TILE_SIZE} px tiles')
+        core = new_core(server, work_dir, 1)
+        one_task_seconds, one_task_longest = sequential_mosaic(root, core, first_index, radar_ids)
+        core.close()
+        print(f'  one task, drawn at once   {one_task_seconds:7.2f} s to fill, event loop held up to '
+              f'{one_task_longest * 1000:6.1f} ms')
+
+        core = new_core(server, work_dir, 2)
+        (seconds, longest), (refresh, refresh_longest) = mosaic_grid(
+            root, core, [first_index, refreshed_index], radar_ids)
+        core.close()
+        print(f'  MosaicGrid, {WORKERS} workers     {seconds:7.2f} s to fill, event loop held up to '
+              f'{longest * 1000:6.1f} ms')
+        print(f'  MosaicGrid refresh        {refresh:7.2f} s, event loop held up to '
+              f'{refresh_longest * 1000:6.1f} ms')
+    root.destroy()
+    if seconds >= one_task_seconds or longest >= one_task_longest:
+        sys.exit('MosaicGrid did not fill faster and hold the event loop up less than one task')
+
+
+if __name__ == '__main__':
+    main()
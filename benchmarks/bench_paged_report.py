@@ -0,0 +1,76 @@
+'''
+Memory and time benchmark for the streaming, paged event log report: fills 
+a Log table with synthetic events (5 million by default) and writes the 
+report with report_util, tracking peak Python memory with tracemalloc. 
+The same is then done with fetchall on the first 10% of the rows, to show 
+how that memory grows with the number of rows.
+
+Run from the repository root:  python benchmarks/bench_paged_report.py [rows]
+'''
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_util import write_report_index, write_report_pages
+
+EVENT_TYPES = ('SelectRadar', 'ViewImage', 'OpenProgram', 'CloseProgram')
+QUERY = "SELECT LogId, EventType, DateTime, Details FROM Log ORDER BY LogId"
+
+
+def fill_log(database_name: str, rows: int) -> None:
+    connection = sqlite3.connect(database_name)
+    connection.execute("CREATE TABLE Log (LogId INTEGER PRIMARY KEY, EventType TEXT, "
+                       "DateTime TEXT, Details TEXT)")
+    batch = 100_000
+    for start in range(0, rows, batch):
+        connection.executemany(
+            "INSERT INTO Log (EventType, DateTime, Details) VALUES(?, ?, ?)",
+            ((EVENT_TYPES[number % 4], 
+              f"2024-{number // 2_000_000 % 12 + 1:02d}-{number // 70_000 % 28 + 1:02d} "
+              f"{number // 3600 % 24:02d}:{number // 60 % 60:02d}:{number % 60:02d}",
+              f"Viewing image IDR{number % 90 + 10:03d}.T.202405161124.png")
+             for number in range(start, min(start + batch, rows))))
+    connection.commit()
+    connection.close()
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        start = time.perf_counter()
+        fill_log('radar_app.db', rows)
+        print(f'{rows} synthetic events inserted in {time.perf_counter() - start:.1f} s')
+
+        connection = sqlite3.connect('radar_app.db')
+        cursor = connection.cursor()
+        tracemalloc.start()
+        start = time.perf_counter()
+        cursor.execute(QUERY)
+        pages, _ = write_report_pages(cursor, 'event_log.html', 'Weather Log Report')
+        write_report_index('event_log.html', 'Weather Log Report', pages)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report_bytes = sum(os.path.getsize(name) for name in os.listdir('.') if name.endswith('.html'))
+        print(f'streamed report : {seconds:6.1f} s, {rows / seconds:9.0f} rows/s, '
+              f'peak {peak / 2**20:6.1f} MiB, {len(pages)} pages, {report_bytes / 2**20:.0f} MiB of html')
+
+        tracemalloc.start()
+        cursor.execute(QUERY + f" LIMIT {rows // 10}")
+        cursor.fetchall()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'fetchall of {rows // 10} rows: peak {peak / 2**20:6.1f} MiB')
+        connection.close()
+        os.chdir(original_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+'''
+Load test for the caching proxy: 100 simulated copies of the radar browser,
+each with its own DownloadClient, start at the same time. Each downloads
+the radar listing, then every layer of the latest image of one radar and
+the radar's last 10 images, as the loop does. The run is done first against
+a fake BOM FTP server directly, then through a cold RadarProxy, then with a
+second wave of clients through the now warm proxy. It reports the wall
+time, per-client latency percentiles, the load reaching the FTP server and
+the proxy's hit rate.
+
+The fake server answers any number of connections at once; the proxy
+fetches over at most 6, as it would from the real server.
+
+Run from the repository root:  python benchmarks/bench_proxy_load.py
+'''
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_util import DownloadClient
+from index_util import RadarIndex
+from radar_core.catalog import frame_name, radar_layers
+from radar_core.proxy import RadarProxy
+from fake_bom_ftp import FakeBomFtpServer
+
+RADAR_DIR = '/anon/gen/radar'
+BACKGROUND_DIR = '/anon/gen/radar_transparencies'
+CLIENTS = 100
+RADARS = 10
+FRAMES = 10
+LATENCY = 0.02
+
+
+def synthetic_files() -> dict:
+    files = {f'{BACKGROUND_DIR}/IDR.legend.{number}.png': os.urandom(4_000) for number in (1, 2)}
+    for radar in range(RADARS):
+        radar_id = f'IDR{radar + 1:03d}'
+        files[f'{BACKGROUND_DIR}/{radar_id}.background.png'] = os.urandom(60_000)
+        files[f'{BACKGROUND_DIR}/{radar_id}.range.png'] = os.urandom(8_000)
+        files[f'{BACKGROUND_DIR}/{radar_id}.locations.png'] = os.urandom(12_000)
+        for minute in range(FRAMES):
+            files[f'{RADAR_DIR}/{radar_id}.T.2024051611{minute:02d}.png'] = os.urandom(20_000)
+    return files
+
+
+def browse(number: int, radar_url: str, background_url: str, start: threading.Event) -> float:
+    # What one copy of the browser downloads when it opens and plays a loop
+    client = DownloadClient()
+    start.wait()
+    began = time.perf_counter()
+    radar_index = RadarIndex.parse(client.download_bytes(radar_url).decode('UTF-8'))
+    radar_id = radar_index.radar_ids()[number % RADARS]
+    timestamps = radar_index.frames(radar_id)
+    layers = radar_layers(radar_id, frame_name(radar_id, timestamps[-1]), radar_url, background_url)
+    client.download_all([f'{url}/{name}' for name, url, _ in layers])
+    client.download_all([f'{radar_url}/{frame_name(radar_id, timestamp)}'
+                         for timestamp in timestamps])
+    seconds = time.perf_counter() - began
+    client.close()
+    return seconds
+
+
+def load(radar_url: str, background_url: str) -> tuple:
+    start = threading.Event()
+    timings = [None] * CLIENTS
+
+    def run(number):
+        timings[number] = browse(number, radar_url, background_url, start)
+
+    threads = [threading.Thread(target = run, args = (number,)) for number in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    began = time.perf_counter()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - began, timings
+
+
+def report(label: str, seconds: float, timings: list, server: FakeBomFtpServer) -> None:
+    cuts = statistics.quantiles(timings, n = 100)
+    print(f'{label:>7}: {seconds:6.2f} s in all, per client p50 {cuts[49]:5.2f} s '
+          f'p95 {cuts[94]:5.2f} s max {max(timings):5.2f} s; FTP server: '
+          f'{server.connections} connections, {server.commands} commands, '
+          f'{server.bytes_sent / 1e6:.1f} MB sent')
+
+
+def main() -> None:
+    files = synthetic_files()
+    print(f'{CLIENTS} clients, {RADARS} radars x {FRAMES} frames, '
+          f'FTP control reply latency {LATENCY * 1000:.0f} ms')
+
+    with FakeBomFtpServer(files, latency = LATENCY) as server:
+        seconds, timings = load(f'{server.base_url}{RADAR_DIR}/', f'{server.base_url}{BACKGROUND_DIR}/')
+        report('direct', seconds, timings, server)
+
+    with FakeBomFtpServer(files, latency = LATENCY) as server, \
+            RadarProxy(('127.0.0.1', 0), radar_url = f'{server.base_url}{RADAR_DIR}/',
+                       background_url = f'{server.base_url}{BACKGROUND_DIR}/') as proxy:
+        for label in ('cold', 'warm'):
+            seconds, timings = load(f'{proxy.base_url}/radar/', 
+                                    f'{proxy.base_url}/radar_transparencies/')
+            report(label, seconds, timings, server)
+        print(f'proxy hit rate {proxy.hit_rate():.1%}: {proxy.counters}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+'''
+Timing harness for the radar loop animation: plays synthetic 512 x 512 
+frames through RadarLoop with a simulated download delay and checks that 
+playback keeps up with the requested frame rate without stalls.
+
+Without a display the loop plays into stand-in widgets (see headless_tk),
+so the scheduling and prefetching are checked but Tk's drawing is not.
+Run from the repository root:  
+    python benchmarks/bench_radar_loop.py
+'''
+import os
+import statistics
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from animation_util import CompositeCache, PhotoImageCache, RadarLoop
+from synthetic_png import make_png
+from task_util import TaskRunner
+from headless_tk import HeadlessCanvas, HeadlessCompositeCache, open_root
+
+FRAMES = 20
+FPS = 5
+SECONDS = 8
+DOWNLOAD_DELAY = 0.15
+
+
+def play(root, canvas, decode, frames: dict, seconds: float = SECONDS, fps: float = FPS,
+         download_delay: float = DOWNLOAD_DELAY) -> RadarLoop:
+    '''
+    Plays *frames*, the PNG content of each frame by name, through a 
+    RadarLoop for *seconds* and returns the stopped loop. *decode* makes 
+    the images shown, as RadarLoop's does.
+    '''
+    def load_frame(name: str) -> bytes:
+        time.sleep(download_delay)
+        return frames[name]
+
+    task_runner = TaskRunner(root)
+    loop = RadarLoop(canvas, canvas.create_image(0, 0, anchor = tk.NW), task_runner, 
+                     PhotoImageCache(len(frames) + 8), load_frame, decode, fps)
+    loop.start(list(frames))
+
+    root.after(int(seconds * 1000), root.quit)
+    root.mainloop()
+    loop.stop()
+    task_runner.shutdown()
+    return loop
+
+
+def main() -> None:
+    root, headless = open_root()
+    if headless:
+        canvas = HeadlessCanvas(root, width = 512, height = 512)
+        composites = HeadlessCompositeCache()
+    else:
+        canvas = tk.Canvas(root, width = 512, height = 512)
+        canvas.pack()
+        composites = CompositeCache()
+    composites.add_radar('IDR023', [make_png(coverage = 1.0, seed = 99)], [make_png(seed = 98)])
+    frames = {f'IDR023.T.2024051611{minute:02d}.png': make_png(seed = minute) 
+              for minute in range(FRAMES)}
+    loop = play(root, canvas, composites.compose, frames)
+
+    gaps = [later - earlier for earlier, later in zip(loop.shown_at, list(loop.shown_at)[1:])]
+    ticks_ms = sorted(seconds * 1000 for seconds in loop.tick_seconds)
+    print(f'{FRAMES} frames at {FPS} fps for {SECONDS} s, {DOWNLOAD_DELAY * 1000:.0f} ms per download')
+    print(f'achieved fps      : {loop.achieved_fps():.2f}')
+    print(f'stalled ticks     : {loop.stalls}')
+    print(f'tick time median  : {statistics.median(ticks_ms):.2f} ms, '
+          f'p99 {ticks_ms[int(len(ticks_ms) * 0.99)]:.2f} ms')
+    print(f'longest frame gap : {max(gaps) * 1000:.0f} ms')
+    root.destroy()
+    if loop.achieved_fps() < FPS * 0.95:
+        sys.exit('radar loop did not sustain the requested frame rate')
+
+
+if __name__ == '__main__':
+    main()
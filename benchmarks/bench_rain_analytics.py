@@ -0,0 +1,85 @@
+'''
+Timing benchmark for the rain statistics of a day of radar images of one
+station (240 palette PNGs of 512 x 512, one every 6 minutes): decoding
+every image into an array of rain rate bins and working out each image's
+statistics from it one pixel array at a time, then frame_statistics, which
+counts the pixels of each palette entry and works out every image's
+statistics together. Both are run with Pillow if it is installed and with
+the zlib decoder used without it.
+
+Run from the repository root:  python benchmarks/bench_rain_analytics.py
+'''
+import builtins
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from radar_core import analytics
+from synthetic_png import make_legend_png, make_palette_png
+
+FRAMES = 240
+REPEAT = 3
+
+
+def per_image_statistics(frames: list, scale: analytics.RainScale) -> list:
+    # Statistics from the full array of rain rates of each image in turn
+    stats = []
+    for timestamp, content in frames:
+        rates = scale.rates[analytics.decode_bins(content, scale)]
+        raining = rates > 0
+        stats.append((timestamp, 100.0 * raining.mean(), rates.max(),
+                      rates[raining].mean() if raining.any() else 0.0,
+                      (rates >= analytics.RAIN_THRESHOLD).sum()))
+    return stats
+
+
+def best_seconds(function) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    scale = analytics.RainScale.from_legend(make_legend_png(analytics.BOM_RAIN_COLOURS))
+    start = datetime.datetime(2024, 5, 16)
+    frames = [((start + datetime.timedelta(minutes = 6 * number)).strftime('%Y%m%d%H%M'),
+               make_palette_png(analytics.BOM_RAIN_COLOURS, seed = number, coverage = 0.4))
+              for number in range(FRAMES)]
+    print(f'{FRAMES} images of 512 x 512, {sum(len(content) for _, content in frames) / 1e6:.1f} MB')
+
+    real_import = builtins.__import__
+
+    def without_pillow(name, *arguments, **keywords):
+        if name == 'PIL' or name.startswith('PIL.'):
+            raise ImportError(name)
+        return real_import(name, *arguments, **keywords)
+
+    for decoder in ('Pillow', 'zlib'):
+        if decoder == 'zlib':
+            builtins.__import__ = without_pillow
+        try:
+            per_image = best_seconds(lambda: per_image_statistics(frames, scale))
+            batched = best_seconds(lambda: analytics.frame_statistics('IDR023', frames, scale))
+        except ImportError:
+            print(f'  {decoder}: not installed')
+            continue
+        finally:
+            builtins.__import__ = real_import
+        print(f'  {decoder:<6}: per image arrays {per_image:6.3f} s, '
+              f'frame_statistics {batched:6.3f} s ({FRAMES / batched:5.0f} images/s)')
+
+    stats = analytics.frame_statistics('IDR023', frames, scale)
+    wettest = max(stats, key = lambda frame_stats: frame_stats.coverage_percent)
+    print(f'  wettest image {wettest.timestamp}: {wettest.coverage_percent:.1f}% rain, '
+          f'max {wettest.max_rate:g} mm/h, mean {wettest.mean_rate:.1f} mm/h, '
+          f'{wettest.heavy_area_km2:.0f} km2 over {analytics.RAIN_THRESHOLD:g} mm/h')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''
+Startup benchmark: measures how long "import radar_core" takes, then runs
+"Weather Program.py" against a fake BOM FTP server with a slow control
+connection and reports the time until the window is first drawn and the
+time until the radar station table is filled in. The listings are
+downloaded on a worker thread, so the first of these no longer depends on
+the network.
+
+The Tk part needs a display and is skipped without one. Run from the
+repository root:  python benchmarks/bench_startup.py
+'''
+import os
+import runpy
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from fake_bom_ftp import FakeBomFtpServer
+
+RADAR_DIR = '/anon/gen/radar'
+BACKGROUND_DIR = '/anon/gen/radar_transparencies'
+LATENCY = 0.2
+TIMEOUT_SECONDS = 60
+
+
+def time_import() -> float:
+    # A fresh interpreter so nothing is imported already
+    code = ('import time; start = time.perf_counter(); import radar_core; '
+            'radar_core.RadarCore(); print(time.perf_counter() - start)')
+    output = subprocess.run([sys.executable, '-c', code], cwd = REPOSITORY, check = True,
+                            capture_output = True, text = True).stdout
+    return float(output)
+
+
+def listing_files(radar_ids: list, frames: int) -> dict:
+    files = {}
+    for radar_id in radar_ids:
+        files[f'{BACKGROUND_DIR}/{radar_id}.background.png'] = b'\x89PNG'
+        for minute in range(frames):
+            files[f'{RADAR_DIR}/{radar_id}.T.2024051611{minute:02d}.png'] = b'\x89PNG'
+    return files
+
+
+def time_first_paint() -> dict:
+    timings = {}
+    start = time.perf_counter()
+
+    def mainloop(root, n = 0):
+        root.update()
+        timings['first paint'] = time.perf_counter() - start
+        table = root.nametowidget('.!frame.!treeview')
+        while not table.get_children():
+            if time.perf_counter() - start > TIMEOUT_SECONDS:
+                break
+            root.update()
+            time.sleep(0.005)
+        timings['radar table filled'] = time.perf_counter() - start
+        # closes the window the way the window manager would
+        root.tk.call(root.protocol('WM_DELETE_WINDOW'))
+
+    tk.Misc.mainloop = mainloop
+    runpy.run_path(os.path.join(REPOSITORY, 'Weather Program.py'), run_name = '__main__')
+    return timings
+
+
+def main() -> None:
+    print(f'import radar_core + RadarCore(): {time_import() * 1000:.1f} ms')
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as error:
+        print(f'No display available, skipping first paint: {error}')
+        return
+
+    radar_ids = [f'IDR{number:03d}' for number in range(1, 80)]
+    with FakeBomFtpServer(listing_files(radar_ids, 10), latency = LATENCY) as server:
+        os.environ['RAINYDAZE_RADAR_URL'] = f'{server.base_url}{RADAR_DIR}/'
+        os.environ['RAINYDAZE_BACKGROUND_URL'] = f'{server.base_url}{BACKGROUND_DIR}/'
+
+        working_dir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(REPOSITORY, 'create_db.sql'), working_dir)
+        connection = sqlite3.connect(os.path.join(working_dir, 'radar_app.db'))
+        with open(os.path.join(working_dir, 'create_db.sql')) as script:
+            connection.executescript(script.read())
+        connection.close()
+
+        os.chdir(working_dir)
+        try:
+            timings = time_first_paint()
+        finally:
+            os.chdir(REPOSITORY)
+            shutil.rmtree(working_dir, ignore_errors = True)
+
+    print(f'control reply latency {LATENCY * 1000:.0f} ms')
+    for name, seconds in timings.items():
+        print(f'{name:>20}: {seconds * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+Timing benchmark for the station search box: every keystroke of a few
+searches typed one letter at a time, looked up in a RadarCatalog built from
+the Radars table of create_db.sql, against scanning every station's ID and
+name for each word. Also times building the catalog at startup.
+
+Run from the repository root:  python benchmarks/bench_station_search.py
+'''
+import os
+import sqlite3
+import sys
+import tempfile
+import timeit
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIR)
+
+from radar_core.catalog import RadarCatalog, load_radars
+
+SEARCHES = ('melbourne 128', 'idr02', 'perth ap', '64 km', 'alice springs', 'zzz')
+
+
+def keystrokes() -> list:
+    # Each search as it reads after every key pressed
+    return [search[:length] for search in SEARCHES for length in range(1, len(search) + 1)]
+
+
+def scan_search(radars: list, query: str) -> list:
+    # Every word must start a word of the ID or name
+    words = query.lower().split()
+    found = []
+    for radar_id, radar_name in radars:
+        tokens = f'{radar_id} {radar_id[3:]} {radar_name}'.lower().replace('(', ' ').replace(')', ' ').split()
+        if all(any(token.startswith(word) for token in tokens) for word in words):
+            found.append(radar_id)
+    return found
+
+
+def main() -> None:
+    database_name = os.path.join(tempfile.mkdtemp(), 'radar_app.db')
+    connection = sqlite3.connect(database_name)
+    with open(os.path.join(REPOSITORY_DIR, 'create_db.sql')) as script:
+        connection.executescript(script.read())
+    connection.close()
+
+    radars = sorted(load_radars(database_name))
+    catalog = RadarCatalog(radars)
+    queries = keystrokes()
+    for query in queries:
+        assert catalog.search(query) == scan_search(radars, query), query
+
+    repeats = 20
+    build = min(timeit.repeat(lambda: RadarCatalog.load(database_name), number = repeats, repeat = 3))
+    indexed = min(timeit.repeat(lambda: [catalog.search(query) for query in queries],
+                                number = repeats, repeat = 3))
+    scanned = min(timeit.repeat(lambda: [scan_search(radars, query) for query in queries],
+                                number = repeats, repeat = 3))
+    worst = max(min(timeit.repeat(lambda: catalog.search(query), number = repeats, repeat = 3))
+                for query in queries)
+
+    print(f'{len(catalog)} stations, {len(queries)} keystrokes')
+    print(f'load and index the catalog  : {build / repeats * 1000:8.2f} ms')
+    print(f'indexed search per keystroke: {indexed / repeats / len(queries) * 1e6:8.1f} us '
+          f'(slowest {worst / repeats * 1e6:.1f} us)')
+    print(f'scan per keystroke          : {scanned / repeats / len(queries) * 1e6:8.1f} us')
+
+
+if __name__ == '__main__':
+    main()
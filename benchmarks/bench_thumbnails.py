@@ -0,0 +1,92 @@
+'''
+Throughput benchmark for the thumbnail pipeline on a corpus of a day of
+radar images of four stations (960 palette PNGs of 512 x 512): every image
+gets a thumbnail and a recompressed archive copy, first in this process one
+image at a time, then by FramePipeline with 1, 2, 4, ... worker processes
+up to the number of cores. Prints the throughput of each run and of each
+worker process, and how the image and archive sizes compare. A second run
+over the same corpus finds nothing new to do.
+
+Run from the repository root:  python benchmarks/bench_thumbnails.py
+'''
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from radar_core import analytics, thumbnails
+from radar_core.archive import archive_path
+from synthetic_png import make_palette_png
+
+STATIONS = ('IDR022', 'IDR023', 'IDR032', 'IDR042')
+FRAMES = 240
+
+
+def make_corpus(folder: str) -> list:
+    # (radar ID, timestamp, path) of each image, as in the Frames table
+    start = datetime.datetime(2024, 5, 16)
+    corpus = []
+    for station_number, radar_id in enumerate(STATIONS):
+        for number in range(FRAMES):
+            timestamp = (start + datetime.timedelta(minutes = 6 * number)).strftime('%Y%m%d%H%M')
+            file_name = os.path.join(folder, f'{radar_id}.T.{timestamp}.png')
+            with open(file_name, 'wb') as image_file:
+                image_file.write(make_palette_png(analytics.BOM_RAIN_COLOURS,
+                                                  seed = station_number * FRAMES + number))
+            corpus.append((radar_id, timestamp, file_name))
+    return corpus
+
+
+def serial_run(corpus: list, output_dir: str) -> float:
+    start = time.perf_counter()
+    for radar_id, timestamp, source in corpus:
+        thumbnails.process_frame(source,
+                                 thumbnails.thumbnail_path(output_dir, radar_id, timestamp),
+                                 archive_path(output_dir, radar_id, timestamp),
+                                 thumbnails.THUMBNAIL_SIZE, thumbnails.PNG_COMPRESS_LEVEL)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    work_dir = tempfile.mkdtemp()
+    corpus_dir = os.path.join(work_dir, 'corpus')
+    os.makedirs(corpus_dir)
+    corpus = make_corpus(corpus_dir)
+    cores = os.cpu_count() or 1
+    print(f'{len(corpus)} images of 512 x 512, {cores} cores')
+
+    output_dir = os.path.join(work_dir, 'serial')
+    seconds = serial_run(corpus, output_dir)
+    print(f'  in process     {len(corpus) / seconds:8.1f} frames/s')
+    shutil.rmtree(output_dir)
+
+    workers = 1
+    while True:
+        output_dir = os.path.join(work_dir, f'workers{workers}')
+        pipeline = thumbnails.FramePipeline(os.path.join(output_dir, 'thumbnails'),
+                                            os.path.join(output_dir, 'archive'), workers = workers)
+        stats = pipeline.run(corpus)
+        per_worker = [rate for _, rate in stats.worker_throughput()]
+        print(f'  {workers:2d} workers     {stats.frames_per_second:8.1f} frames/s, '
+              f'{stats.frames_per_second / workers:6.1f} per core; each worker busy at '
+              f'{min(per_worker):.1f} to {max(per_worker):.1f} frames/s')
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+        shutil.rmtree(output_dir)
+
+    rerun = pipeline.run(corpus)
+    source_bytes = sum(os.path.getsize(source) for _, _, source in corpus)
+    print(f'  second run     {rerun.processed} processed, {rerun.skipped} already done '
+          f'in {rerun.seconds * 1000:.0f} ms')
+    print(f'  sizes          images {source_bytes / 1e6:.2f} MB, archive copies '
+          f'{stats.archive_bytes / 1e6:.2f} MB, thumbnails {stats.thumbnail_bytes / 1e6:.2f} MB')
+    shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+'''
+Timing benchmark for filling the radar image table with a 10,000 frame
+history: first as radar_station_select used to, deleting every row and
+inserting every frame into a plain ttk.Treeview, then through a
+VirtualTable, which only creates the rows in view. Also times the refresh
+which adds a few new frames, switching to another radar, and scrolling a
+page, including the time Tk takes to draw the table.
+
+Without a display the table is a stand-in (see headless_tk), so the Python
+side of each table and the number of rows it creates are measured, but not
+Tk's drawing. Run from the repository root:
+    python benchmarks/bench_virtual_table.py
+'''
+import datetime
+import os
+import statistics
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_util import format_timestamp
+from table_util import VirtualTable
+from headless_tk import HeadlessScrollbar, HeadlessTreeview, HeadlessWidget, open_root
+
+ROWS = 10_000
+NEW_ROWS = 5
+REPEAT = 5
+
+
+def timestamps(count: int, offset: int = 0) -> list:
+    start = datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes = 6 * offset)
+    return [(start + datetime.timedelta(minutes = 6 * number)).strftime('%Y%m%d%H%M')
+            for number in range(count)]
+
+
+def make_table(root: tk.Tk) -> tuple:
+    if not isinstance(root, tk.Tk):
+        return (HeadlessWidget(root), HeadlessTreeview(root, height = 30),
+                HeadlessScrollbar(root))
+    frame = ttk.Frame(root)
+    frame.pack(side = 'left', fill = 'both', expand = True)
+    scrollbar = ttk.Scrollbar(frame, orient = 'vertical')
+    tree = ttk.Treeview(frame, columns = ('Radar ID', 'Date', 'Time'), show = 'headings', height = 30)
+    scrollbar.pack(side = 'right', fill = 'y')
+    tree.pack(side = 'left', fill = 'both', expand = True)
+    return frame, tree, scrollbar
+
+
+def timed(root: tk.Tk, action) -> float:
+    # Includes drawing the table, which is where a long Treeview is slowest
+    start = time.perf_counter()
+    action()
+    root.update()
+    return time.perf_counter() - start
+
+
+def median_ms(timings: list) -> str:
+    return f'{statistics.median(timings) * 1000:9.1f} ms'
+
+
+def plain_table(root: tk.Tk, frames: list, new_frames: list, other_frames: list) -> dict:
+    frame, tree, scrollbar = make_table(root)
+    tree.configure(yscrollcommand = scrollbar.set)
+    scrollbar.config(command = tree.yview)
+
+    def fill(radar_id, stamps):
+        tree.delete(*tree.get_children())
+        for stamp in stamps:
+            tree.insert('', tk.END, iid = stamp, values = (radar_id, *format_timestamp(stamp)))
+
+    def refresh():
+        for stamp in frames + new_frames:
+            if not tree.exists(stamp):
+                tree.insert('', tk.END, iid = stamp, values = ('IDR023', *format_timestamp(stamp)))
+
+    results = {'select': [], 'refresh': [], 'switch': [], 'scroll': []}
+    for _ in range(REPEAT):
+        results['select'].append(timed(root, lambda: fill('IDR023', frames)))
+        results['refresh'].append(timed(root, refresh))
+        results['scroll'].append(timed(root, lambda: tree.yview('scroll', 1, 'pages')))
+        results['switch'].append(timed(root, lambda: fill('IDR024', other_frames)))
+    frame.destroy()
+    return results
+
+
+def virtual_table(root: tk.Tk, frames: list, new_frames: list, other_frames: list) -> dict:
+    frame, tree, scrollbar = make_table(root)
+    radar = ['IDR023']
+    rows = VirtualTable(tree, scrollbar, lambda stamp: (radar[0], *format_timestamp(stamp)))
+
+    def select(radar_id, stamps):
+        if radar_id != radar[0]:
+            rows.clear()
+        radar[0] = radar_id
+        rows.set_keys(stamps)
+
+    results = {'select': [], 'refresh': [], 'switch': [], 'scroll': [], 'items': []}
+    for _ in range(REPEAT):
+        rows.clear()
+        results['select'].append(timed(root, lambda: select('IDR023', frames)))
+        results['refresh'].append(timed(root, lambda: rows.add_keys(frames + new_frames)))
+        results['scroll'].append(timed(root, lambda: rows.yview('scroll', 1, 'pages')))
+        results['switch'].append(timed(root, lambda: select('IDR024', other_frames)))
+        results['items'].append(len(tree.get_children()))
+        radar[0] = 'IDR023'
+    frame.destroy()
+    return results
+
+
+def main() -> None:
+    root, _ = open_root()
+
+    frames = timestamps(ROWS)
+    new_frames = timestamps(NEW_ROWS, offset = ROWS)
+    other_frames = timestamps(ROWS, offset = 1)
+    print(f'{ROWS} frames, {NEW_ROWS} new frames per refresh, median of {REPEAT} runs')
+    medians = {}
+    for label, run in (('plain Treeview', plain_table), ('VirtualTable', virtual_table)):
+        results = run(root, frames, new_frames, other_frames)
+        medians[label] = statistics.median(results['select'])
+        print(f'  {label:<15} select {median_ms(results["select"])}  '
+              f'refresh {median_ms(results["refresh"])}  '
+              f'switch radar {median_ms(results["switch"])}  '
+              f'scroll a page {median_ms(results["scroll"])}')
+    root.destroy()
+    # Only the rows in view may exist as items, and selecting must be faster
+    if max(results['items']) > 30:
+        sys.exit(f'VirtualTable created {max(results["items"])} items for 30 rows in view')
+    if medians['VirtualTable'] >= medians['plain Treeview']:
+        sys.exit('VirtualTable was not faster than a plain Treeview')
+
+
+if __name__ == '__main__':
+    main()
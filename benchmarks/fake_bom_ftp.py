@@ -0,0 +1,251 @@
+'''
+A small in-process FTP server which stands in for ftp.bom.gov.au in the
+benchmarks. It serves files from a dictionary held in memory and can add a
+fixed delay before every control reply to imitate a slow round trip. Faults
+can be injected to imitate a degraded or unreachable upstream: downloads
+that stall or fail at random, or the whole server refusing service.
+'''
+import posixpath
+import random
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+
+class _FtpHandler(socketserver.StreamRequestHandler):
+    '''
+    Handles one FTP control connection. Only the commands used by urllib and
+    ftplib for anonymous downloads are supported.
+    '''
+    def setup(self) -> None:
+        super().setup()
+        self.cwd = '/'
+        self.passive_socket = None
+
+    def reply(self, line: str) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        self.server.connections += 1
+        with self.server.open_lock:
+            self.server.open_connections += 1
+            self.server.most_open_connections = max(self.server.most_open_connections,
+                                                    self.server.open_connections)
+        try:
+            self.serve()
+        finally:
+            with self.server.open_lock:
+                self.server.open_connections -= 1
+
+    def serve(self) -> None:
+        if self.server.down:
+            # Accept the connection but never answer, then drop it
+            time.sleep(self.server.hang_seconds)
+            return
+        self.reply('220 Fake BoM FTP server ready')
+        for raw_line in self.rfile:
+            line = raw_line.decode('latin-1').rstrip('\r\n')
+            command, _, argument = line.partition(' ')
+            command = command.upper()
+            self.server.commands += 1
+            handler = getattr(self, f'ftp_{command.lower()}', None)
+            if handler is None:
+                self.reply(f'502 Command {command} not implemented')
+            elif handler(argument) is False:
+                break
+        if self.passive_socket is not None:
+            self.passive_socket.close()
+
+    def resolve(self, argument: str) -> str:
+        return posixpath.normpath(posixpath.join(self.cwd, argument or '.'))
+
+    def is_directory(self, directory: str) -> bool:
+        prefix = directory.rstrip('/') + '/'
+        return any(name.startswith(prefix) for name in self.server.files)
+
+    def open_data_connection(self) -> socket.socket:
+        if self.passive_socket is None:
+            return None
+        self.passive_socket.settimeout(10)
+        connection, _ = self.passive_socket.accept()
+        self.passive_socket.close()
+        self.passive_socket = None
+        return connection
+
+    def send_data(self, data: bytes, announce_size: bool = False) -> None:
+        connection = self.open_data_connection()
+        if connection is None:
+            self.reply('425 Use PASV first')
+            return
+        # Like vsftpd, announce the size of files being sent
+        size = f' ({len(data)} bytes)' if announce_size else ''
+        self.reply(f'150 Opening BINARY mode data connection{size}')
+        with connection:
+            connection.sendall(data)
+        self.server.bytes_sent += len(data)
+        self.reply('226 Transfer complete')
+
+    def ftp_user(self, argument: str) -> None:
+        self.reply('331 Please specify the password')
+
+    def ftp_pass(self, argument: str) -> None:
+        self.reply('230 Login successful')
+
+    def ftp_syst(self, argument: str) -> None:
+        self.reply('215 UNIX Type: L8')
+
+    def ftp_type(self, argument: str) -> None:
+        self.reply('200 Type set')
+
+    def ftp_noop(self, argument: str) -> None:
+        self.reply('200 NOOP ok')
+
+    def ftp_pwd(self, argument: str) -> None:
+        self.reply(f'257 "{self.cwd}" is the current directory')
+
+    def ftp_cwd(self, argument: str) -> None:
+        directory = self.resolve(argument)
+        if directory == '/' or self.is_directory(directory):
+            self.cwd = directory
+            self.reply('250 Directory successfully changed')
+        else:
+            self.reply('550 Failed to change directory')
+
+    def ftp_pasv(self, argument: str) -> None:
+        if self.passive_socket is not None:
+            self.passive_socket.close()
+        self.passive_socket = socket.create_server((self.server.host, 0))
+        port = self.passive_socket.getsockname()[1]
+        address = self.server.host.replace('.', ',')
+        self.reply(f'227 Entering Passive Mode ({address},{port >> 8},{port & 0xFF})')
+
+    def ftp_epsv(self, argument: str) -> None:
+        if self.passive_socket is not None:
+            self.passive_socket.close()
+        self.passive_socket = socket.create_server((self.server.host, 0))
+        port = self.passive_socket.getsockname()[1]
+        self.reply(f'229 Entering Extended Passive Mode (|||{port}|)')
+
+    def ftp_size(self, argument: str) -> None:
+        content = self.server.files.get(self.resolve(argument))
+        if content is None:
+            self.reply('550 Could not get file size')
+        else:
+            self.reply(f'213 {len(content)}')
+
+    def ftp_mdtm(self, argument: str) -> None:
+        name = self.resolve(argument)
+        if name not in self.server.files:
+            self.reply('550 Could not get file modification time')
+        else:
+            modified = self.server.modified.get(name, self.server.started)
+            self.reply(time.strftime('213 %Y%m%d%H%M%S', time.gmtime(modified)))
+
+    def ftp_retr(self, argument: str) -> None:
+        self.server.retrievals += 1
+        roll = self.server.random.random()
+        if roll < self.server.hang_rate:
+            time.sleep(self.server.hang_seconds)
+        elif roll < self.server.hang_rate + self.server.error_rate:
+            self.reply('451 Requested action aborted: local error in processing')
+            return
+
+        content = self.server.files.get(self.resolve(argument))
+        if content is None:
+            self.reply('550 Failed to open file')
+        else:
+            self.send_data(content, announce_size = True)
+
+    def ftp_list(self, argument: str) -> None:
+        directory = self.resolve(argument)
+        if directory != '/' and not self.is_directory(directory):
+            self.reply('550 Failed to open directory')
+            return
+        prefix = directory.rstrip('/') + '/'
+        lines = []
+        for name, content in sorted(self.server.files.items()):
+            if name.startswith(prefix) and '/' not in name[len(prefix):]:
+                lines.append(f'-rw-r--r--    1 ftp      ftp      {len(content):>8} '
+                             f'May 16 11:24 {name[len(prefix):]}\r\n')
+        self.send_data(''.join(lines).encode('ascii'))
+
+    def ftp_quit(self, argument: str) -> bool:
+        self.reply('221 Goodbye')
+        return False
+
+
+class FakeBomFtpServer(socketserver.ThreadingTCPServer):
+    '''
+    Serves the files in *files* (a mapping of absolute FTP path to content)
+    on a free local port until stop is called.
+
+    Parameters:
+    files (dict): Maps paths such as "/anon/gen/radar/IDR023.T.202405161124.png"
+        to the bytes served for them. The mapping may be changed while the
+        server is running.
+    latency (float): Seconds to wait before every control reply.
+    seed (int): Seeds the random choice of faulty downloads.
+
+    These attributes inject faults and may be changed while the server is 
+    running:
+    down (bool): Accept new connections but drop them after *hang_seconds*
+        without answering, as a host which has stopped responding.
+    hang_rate (float): Fraction of downloads which stall for *hang_seconds*
+        before being answered.
+    error_rate (float): Fraction of downloads which fail with "451".
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, files: dict, latency: float = 0.0, host: str = '127.0.0.1', 
+                 seed: int = 0):
+        super().__init__((host, 0), _FtpHandler)
+        self.host = host
+        self.files = files
+        self.modified = {}
+        self.latency = latency
+        self.down = False
+        self.hang_rate = 0.0
+        self.hang_seconds = 30.0
+        self.error_rate = 0.0
+        self.random = random.Random(seed)
+        self.started = time.time()
+        self.connections = 0
+        # Control connections open now, and the most open at once
+        self.open_connections = 0
+        self.most_open_connections = 0
+        self.open_lock = threading.Lock()
+        self.commands = 0
+        self.bytes_sent = 0
+        self.retrievals = 0
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f'ftp://{self.host}:{self.server_address[1]}'
+
+    def start(self) -> 'FakeBomFtpServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients which gave up on a stalled download have closed the connection
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def __enter__(self) -> 'FakeBomFtpServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
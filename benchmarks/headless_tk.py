@@ -0,0 +1,271 @@
+'''
+Stand-ins for the Tk objects used by the radar loop, canvas, table and
+mosaic benchmarks, so those benchmarks also run where there is no display.
+They keep the state the code under test reads back (items, their options,
+the rows of a table) and run after callbacks from a loop of their own, but
+draw nothing: Tk's drawing and PNG decoding are not measured, and images
+are only inflated, as layer_decode does without a display.
+'''
+import collections
+import heapq
+import itertools
+import struct
+import time
+import weakref
+import zlib
+
+
+def inflate_png(content: bytes) -> bytes:
+    '''
+    Returns the decompressed image data of a PNG, the bulk of the work of
+    decoding it, for when Tk cannot be used.
+    '''
+    position, data = 8, []
+    while position < len(content):
+        length, kind = struct.unpack('>I4s', content[position:position + 8])
+        if kind == b'IDAT':
+            data.append(content[position + 8:position + 8 + length])
+        position += length + 12
+    return zlib.decompress(b''.join(data))
+
+
+class HeadlessRoot:
+    '''
+    Stands in for tk.Tk: after callbacks run from update and mainloop once
+    they are due, in the order they are due.
+    '''
+    def __init__(self):
+        self._jobs = []
+        self._cancelled = set()
+        self._numbers = itertools.count()
+        self._running = False
+
+    def after(self, delay_ms: int, function = None, *arguments):
+        if function is None:
+            time.sleep(delay_ms / 1000)
+            return None
+        number = next(self._numbers)
+        heapq.heappush(self._jobs, (time.perf_counter() + delay_ms / 1000, number, function, arguments))
+        return f'after#{number}'
+
+    def after_idle(self, function, *arguments):
+        return self.after(0, function, *arguments)
+
+    def after_cancel(self, job: str) -> None:
+        self._cancelled.add(job)
+
+    def update(self) -> None:
+        # Callbacks added while updating run too once they are due
+        while self._jobs and self._jobs[0][0] <= time.perf_counter():
+            _, number, function, arguments = heapq.heappop(self._jobs)
+            if f'after#{number}' in self._cancelled:
+                self._cancelled.discard(f'after#{number}')
+                continue
+            function(*arguments)
+
+    def mainloop(self) -> None:
+        self._running = True
+        while self._running:
+            self.update()
+            if self._jobs:
+                time.sleep(min(max(self._jobs[0][0] - time.perf_counter(), 0), 0.001))
+            else:
+                time.sleep(0.001)
+
+    def quit(self) -> None:
+        self._running = False
+
+    def withdraw(self) -> None:
+        pass
+
+    def destroy(self) -> None:
+        self._jobs.clear()
+
+
+class HeadlessWidget:
+    '''
+    The parts of a Tk widget every stand-in shares: geometry management is
+    ignored and after calls go to the root.
+    '''
+    def __init__(self, root: HeadlessRoot, **options):
+        self.root = root
+        self.options = dict(options)
+
+    def after(self, delay_ms: int, function = None, *arguments):
+        return self.root.after(delay_ms, function, *arguments)
+
+    def after_idle(self, function, *arguments):
+        return self.root.after_idle(function, *arguments)
+
+    def after_cancel(self, job: str) -> None:
+        self.root.after_cancel(job)
+
+    def configure(self, **options) -> None:
+        self.options.update(options)
+
+    config = configure
+
+    def cget(self, option: str):
+        return self.options.get(option, '')
+
+    def bind(self, *arguments, **options) -> None:
+        pass
+
+    def pack(self, **options) -> None:
+        pass
+
+    def winfo_width(self) -> int:
+        return 1
+
+    def destroy(self) -> None:
+        pass
+
+
+class HeadlessCanvas(HeadlessWidget):
+    '''
+    Stands in for tk.Canvas, keeping each item's options. As in Tk, an item
+    does not keep its image alive: it holds a weak reference to it.
+    '''
+    def __init__(self, root: HeadlessRoot, **options):
+        super().__init__(root, **options)
+        self.items = {}
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _options(options: dict) -> dict:
+        if options.get('image') is not None:
+            options = dict(options, image = weakref.ref(options['image']))
+        return options
+
+    def _create(self, kind: str, options: dict) -> int:
+        item = next(self._ids)
+        self.items[item] = dict(self._options(options), kind = kind)
+        return item
+
+    def create_image(self, *coords, **options) -> int:
+        return self._create('image', options)
+
+    def create_rectangle(self, *coords, **options) -> int:
+        return self._create('rectangle', options)
+
+    def create_text(self, *coords, **options) -> int:
+        return self._create('text', options)
+
+    def itemconfigure(self, item: int, **options) -> None:
+        self.items[item].update(self._options(options))
+
+    def find_all(self) -> tuple:
+        return tuple(self.items)
+
+    def delete(self, *items) -> None:
+        if 'all' in items:
+            self.items.clear()
+        for item in items:
+            self.items.pop(item, None)
+
+
+class HeadlessTreeview(HeadlessWidget):
+    '''
+    Stands in for ttk.Treeview, keeping the items in order with their values.
+    '''
+    def __init__(self, root: HeadlessRoot, **options):
+        super().__init__(root, **options)
+        self.items = {}
+        self._order = []
+
+    def insert(self, parent: str, index, iid: str = None, **options) -> str:
+        self.items[iid] = options
+        if index == 'end':
+            self._order.append(iid)
+        else:
+            self._order.insert(index, iid)
+        return iid
+
+    def delete(self, *iids) -> None:
+        leaving = set(iids)
+        for iid in leaving:
+            del self.items[iid]
+        self._order = [iid for iid in self._order if iid not in leaving]
+
+    def get_children(self, item: str = '') -> tuple:
+        return tuple(self._order)
+
+    def exists(self, iid: str) -> bool:
+        return iid in self.items
+
+    def item(self, iid: str, **options) -> None:
+        self.items[iid].update(options)
+
+    def selection(self) -> tuple:
+        return ()
+
+    def focus(self) -> str:
+        return ''
+
+    def tag_configure(self, tag: str, **options) -> None:
+        pass
+
+    def yview(self, *arguments) -> None:
+        pass
+
+
+class HeadlessScrollbar(HeadlessWidget):
+    '''
+    Stands in for ttk.Scrollbar.
+    '''
+    def set(self, first, last) -> None:
+        self.options['position'] = (float(first), float(last))
+
+
+class HeadlessImage:
+    '''
+    Stands in for a tk.PhotoImage: the inflated pixels of a PNG.
+    '''
+    def __init__(self, pixels: bytes):
+        self.pixels = pixels
+
+
+class HeadlessCompositeCache:
+    '''
+    Stands in for CompositeCache: the static layers of a radar are inflated
+    once and each frame is inflated when it is composed, but nothing is
+    blended or shrunk.
+    '''
+    def __init__(self, max_radars: int = 8, max_size: int = None):
+        self.max_radars = max_radars
+        self.max_size = max_size
+        self._bases = collections.OrderedDict()
+
+    def has_radar(self, radar_id: str) -> bool:
+        return radar_id in self._bases
+
+    def add_radar(self, radar_id: str, under_layers: list, over_layers: list) -> None:
+        self._bases[radar_id] = [inflate_png(data) for data in (*under_layers, *over_layers)]
+        self._bases.move_to_end(radar_id)
+        while len(self._bases) > self.max_radars:
+            self._bases.popitem(last = False)
+
+    def compose(self, frame_name: str, frame_data: bytes) -> HeadlessImage:
+        # A KeyError if the radar's layers were dropped, as CompositeCache
+        self._bases.move_to_end(frame_name.split('.')[0])
+        return HeadlessImage(inflate_png(frame_data))
+
+
+def open_root() -> tuple:
+    '''
+    Returns a Tk root, or a HeadlessRoot if there is no display, and whether
+    it is the stand-in.
+    '''
+    import tkinter as tk
+    try:
+        return tk.Tk(), False
+    except tk.TclError as error:
+        print(f'No display available, using stand-in widgets, so Tk drawing is not measured: {error}')
+        return HeadlessRoot(), True
+
+
+def headless_decode(name: str, data: bytes) -> HeadlessImage:
+    '''
+    Stands in for the decode function of RadarLoop.
+    '''
+    return HeadlessImage(inflate_png(data))
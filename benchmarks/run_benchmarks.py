@@ -0,0 +1,500 @@
+'''
+The benchmark suite: times the hot paths of the radar browser against a
+fake BOM FTP server serving a synthetic dataset, and writes the results as
+JSON so that runs from different releases can be compared.
+
+  listing_fresh       download_radar_url when the listing is up to date
+  listing_stale       download_radar_url when the listing must be downloaded
+  station_select      parsing the radar listing and formatting the frames of
+                      one station, as radar_station_select does
+  layer_fetch_cold    fetching the six layers of a radar image, none cached
+  layer_fetch_warm    the same once every layer is in the layer cache
+  layer_decode        decoding the six layers into images
+  rain_stats          rain statistics of every image of one radar
+  thumbnails          thumbnails and recompressed archive copies of every 
+                      radar image, in a process pool
+  radar_loop          playing one radar's images through RadarLoop at 20 fps
+  canvas_select       selecting images shown as one merged canvas item
+  table_select        filling the image table with a 10,000 frame history
+  mosaic_fill         fetching and drawing a mosaic tile of every radar
+  log_inserts         queueing events with log_event and writing them
+  report_full         generating the event log report from the start
+  report_incremental  adding new events to an existing report
+
+The radar_loop, canvas_select, table_select and mosaic_fill cases use the
+stand-in widgets of headless_tk whether or not there is a display, so that
+they run, and check what their benchmark scripts check, anywhere; they time
+the Python side only.
+
+Every case runs --repeat times after one untimed warm-up run. The dataset
+and the server latency are set on the command line, and both are recorded
+in the results with the Python version, platform and git commit. With
+--compare, each case's median is compared with an earlier results file and
+the run fails if any case is more than --threshold slower.
+
+Run from the repository root:
+    python benchmarks/run_benchmarks.py [--output results.json] [--compare old.json]
+'''
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIR)
+
+from db_util import EventLogger
+from index_util import RadarIndex, format_timestamp
+from radar_core import RadarCore, frame_name
+from radar_core import schema
+from radar_core.event_log import generate_weather_report, prepare_database
+from radar_core.settings import INDEX_FILE_NAME
+from fake_bom_ftp import FakeBomFtpServer
+from headless_tk import HeadlessCanvas, HeadlessCompositeCache, HeadlessRoot, inflate_png
+from synthetic_png import make_png
+
+RADAR_DIR = '/anon/gen/radar'
+BACKGROUND_DIR = '/anon/gen/radar_transparencies'
+RESULTS_DIR = os.path.join(REPOSITORY_DIR, 'benchmarks', 'results')
+
+# name: (function, what one operation of the case is)
+BENCHMARKS = {}
+
+
+def benchmark(name: str, operation: str):
+    '''
+    Adds a case to the suite. The case is called with the Dataset and
+    returns the number of operations it timed.
+    '''
+    def decorator(function):
+        BENCHMARKS[name] = (function, operation)
+        return function
+    return decorator
+
+
+def synthetic_files(radar_ids: list, frames: int, image_size: int) -> dict:
+    '''
+    Returns the files of a fake BoM radar folder: *frames* radar images for
+    each radar, one every 6 minutes, and every radar's static layers.
+    '''
+    files = {f'{BACKGROUND_DIR}/IDR.legend.{number}.png': make_png(image_size, 64, seed = number)
+             for number in (1, 2)}
+    start = datetime.datetime(2024, 5, 16)
+    for number, radar_id in enumerate(radar_ids):
+        files[f'{BACKGROUND_DIR}/{radar_id}.background.png'] = make_png(
+            image_size, image_size, seed = number, coverage = 0.9)
+        files[f'{BACKGROUND_DIR}/{radar_id}.range.png'] = make_png(
+            image_size, image_size, seed = number + 1000, coverage = 0.05)
+        files[f'{BACKGROUND_DIR}/{radar_id}.locations.png'] = make_png(
+            image_size, image_size, seed = number + 2000, coverage = 0.05)
+        for frame in range(frames):
+            timestamp = (start + datetime.timedelta(minutes = 6 * frame)).strftime('%Y%m%d%H%M')
+            files[f'{RADAR_DIR}/{frame_name(radar_id, timestamp)}'] = make_png(
+                image_size, image_size, seed = number * frames + frame)
+    return files
+
+
+def create_database(database_name: str, radars: int, events: int) -> list:
+    '''
+    Creates a database from create_db.sql holding *events* made up events
+    from the last few hours, and returns the IDs of its first *radars* radars.
+    '''
+    connection = sqlite3.connect(database_name)
+    with open(os.path.join(REPOSITORY_DIR, 'create_db.sql')) as script:
+        connection.executescript(script.read())
+    radar_ids = [radar_id for (radar_id,) in connection.execute(
+        'SELECT RadarId FROM Radars ORDER BY RadarId LIMIT ?', (radars,))]
+    # Recent enough not to be rolled up by prepare_database
+    start = datetime.datetime.now() - datetime.timedelta(seconds = events)
+    with connection:
+        connection.executemany(schema.INSERT_LOG_INFO, (
+            ('ViewImage', (start + datetime.timedelta(seconds = number)).strftime('%Y-%m-%d %H:%M:%S'),
+             f'Viewed image {number}') for number in range(events)))
+    connection.close()
+    prepare_database(database_name)
+    return radar_ids
+
+
+class Dataset:
+    '''
+    A working folder holding a fresh database, a fake BOM FTP server serving
+    the synthetic files and a RadarCore pointed at it. The current folder is
+    changed to the working folder while it is open, since the listings are
+    saved to the current folder.
+    '''
+    def __init__(self, arguments: argparse.Namespace):
+        self.arguments = arguments
+        self.folder = tempfile.TemporaryDirectory()
+        self.original_dir = os.getcwd()
+        os.chdir(self.folder.name)
+
+        # The reports are made from a database holding --events events; the
+        # events logged by log_inserts go to a database of their own
+        self.database_name = 'radar_app.db'
+        self.log_database_name = 'log_inserts.db'
+        self.radar_ids = create_database(self.database_name, arguments.radars, arguments.events)
+        create_database(self.log_database_name, arguments.radars, 0)
+
+        self.files = synthetic_files(self.radar_ids, arguments.frames, arguments.image_size)
+        self.server = FakeBomFtpServer(self.files, latency = arguments.latency).start()
+        self.radar_url = f'{self.server.base_url}{RADAR_DIR}/'
+        self.background_url = f'{self.server.base_url}{BACKGROUND_DIR}/'
+        self.caches = 0
+        self.core = self.new_core()
+        # Every case can list the frames, whichever cases are run
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.core.download_radar_url()
+        self.tk_root = None
+        self.decode_images = []
+        self.table_keys = []
+
+    def new_core(self) -> RadarCore:
+        # Each core gets an empty layer cache of its own
+        self.caches += 1
+        return RadarCore(self.database_name, self.radar_url, self.background_url,
+                         cache_dir = f'radar_cache_{self.caches}')
+
+    def layers(self, number: int) -> tuple:
+        radar_id = self.radar_ids[number % len(self.radar_ids)]
+        timestamps = self.core.radar_index().frames(radar_id)
+        image_name = frame_name(radar_id, timestamps[number // len(self.radar_ids) % len(timestamps)])
+        return self.core.radar_layers(radar_id, image_name)
+
+    def close(self) -> None:
+        self.core.close()
+        self.server.stop()
+        os.chdir(self.original_dir)
+        self.folder.cleanup()
+
+
+@benchmark('listing_fresh', 'freshness check')
+def listing_fresh(dataset: Dataset) -> int:
+    dataset.core.download_radar_url()
+    for _ in range(100):
+        dataset.core.download_radar_url()
+    return 100
+
+
+@benchmark('listing_stale', 'listing download')
+def listing_stale(dataset: Dataset) -> int:
+    # Age the listing so it is out of date
+    os.utime(INDEX_FILE_NAME, (0, 0))
+    dataset.core.download_radar_url()
+    return 1
+
+
+@benchmark('station_select', 'station selected')
+def station_select(dataset: Dataset) -> int:
+    # Each selection after a refresh parses the listing again
+    for radar_id in dataset.radar_ids:
+        radar_index = RadarIndex.load(INDEX_FILE_NAME)
+        for timestamp in radar_index.frames(radar_id):
+            format_timestamp(timestamp)
+    return len(dataset.radar_ids)
+
+
+@benchmark('layer_fetch_cold', 'radar image')
+def layer_fetch_cold(dataset: Dataset) -> int:
+    core = dataset.new_core()
+    try:
+        core.fetch_layers(dataset.layers(dataset.caches))
+    finally:
+        core.close()
+    return 1
+
+
+@benchmark('layer_fetch_warm', 'radar image')
+def layer_fetch_warm(dataset: Dataset) -> int:
+    layers = dataset.layers(0)
+    dataset.core.fetch_layers(layers)
+    for _ in range(10):
+        dataset.core.fetch_layers(layers)
+    return 10
+
+
+@benchmark('layer_decode', 'radar image')
+def layer_decode(dataset: Dataset) -> int:
+    # The layers are fetched during the untimed first run
+    if not dataset.decode_images:
+        dataset.decode_images = [dataset.core.fetch_layers(dataset.layers(number))
+                                 for number in range(10)]
+    images = dataset.decode_images
+    for layer_data in images:
+        for content in layer_data.values():
+            if dataset.tk_root is not None:
+                import tkinter as tk
+                tk.PhotoImage(master = dataset.tk_root, data = content, format = 'png')
+            else:
+                inflate_png(content)
+    return len(images)
+
+
+@benchmark('rain_stats', 'radar image')
+def rain_stats(dataset: Dataset) -> int:
+    from radar_core import analytics
+
+    radar_id = dataset.radar_ids[0]
+    prefix = f'{RADAR_DIR}/{radar_id}.T.'
+    frames = [(name[len(prefix):-4], content) for name, content in dataset.files.items()
+              if name.startswith(prefix)]
+    analytics.frame_statistics(radar_id, frames, analytics.RainScale.default())
+    return len(frames)
+
+
+@benchmark('thumbnails', 'radar image')
+def thumbnails(dataset: Dataset) -> int:
+    from radar_core.thumbnails import FramePipeline
+
+    # The images of every radar, saved where the Frames table would say
+    if not os.path.isdir('frames'):
+        os.makedirs('frames')
+        for name, content in dataset.files.items():
+            if name.startswith(f'{RADAR_DIR}/'):
+                with open(os.path.join('frames', name[len(RADAR_DIR) + 1:]), 'wb') as image_file:
+                    image_file.write(content)
+    frames = [(file_name[:6], file_name[9:21], os.path.join('frames', file_name))
+              for file_name in sorted(os.listdir('frames'))]
+    dataset.caches += 1
+    output_dir = f'thumbnails_{dataset.caches}'
+    FramePipeline(os.path.join(output_dir, 'thumbnails'), os.path.join(output_dir, 'archive')).run(frames)
+    return len(frames)
+
+
+def radar_frames(dataset: Dataset, radar_id: str) -> dict:
+    prefix = f'{RADAR_DIR}/{radar_id}.T.'
+    return {name[len(RADAR_DIR) + 1:]: content for name, content in dataset.files.items()
+            if name.startswith(prefix)}
+
+
+@benchmark('radar_loop', 'frame shown')
+def radar_loop(dataset: Dataset) -> int:
+    from bench_radar_loop import play
+
+    fps = 20
+    root = HeadlessRoot()
+    composites = HeadlessCompositeCache()
+    radar_id = dataset.radar_ids[0]
+    composites.add_radar(radar_id, [dataset.files[f'{BACKGROUND_DIR}/{radar_id}.background.png']], [])
+    loop = play(root, HeadlessCanvas(root), composites.compose, radar_frames(dataset, radar_id),
+                seconds = 1, fps = fps, download_delay = 0.02)
+    if loop.achieved_fps() < fps * 0.9:
+        raise RuntimeError(f'RadarLoop showed {loop.achieved_fps():.1f} of {fps} fps')
+    return len(loop.shown_at)
+
+
+@benchmark('canvas_select', 'selection')
+def canvas_select(dataset: Dataset) -> int:
+    from bench_canvas_memory import merged_selections
+
+    selections = 500
+    root = HeadlessRoot()
+    canvas = HeadlessCanvas(root)
+    radar_id = dataset.radar_ids[0]
+    static_layers = [dataset.files[f'{BACKGROUND_DIR}/{radar_id}.{layer}.png']
+                     for layer in ('background', 'range', 'locations')]
+    items = merged_selections(root, canvas, list(radar_frames(dataset, radar_id).items()),
+                              static_layers, HeadlessCompositeCache(), selections, selections)
+    if items != 1:
+        raise RuntimeError(f'{items} canvas items after {selections} selections, expected 1')
+    return selections
+
+
+@benchmark('table_select', 'radar selected')
+def table_select(dataset: Dataset) -> int:
+    from bench_virtual_table import ROWS, make_table, timestamps
+    from table_util import VirtualTable
+
+    if not dataset.table_keys:
+        dataset.table_keys = [timestamps(ROWS), timestamps(ROWS, offset = 1)]
+    _, tree, scrollbar = make_table(HeadlessRoot())
+    rows = VirtualTable(tree, scrollbar, lambda stamp: ('IDR023', *format_timestamp(stamp)))
+    for keys in dataset.table_keys * 5:
+        rows.clear()
+        rows.set_keys(keys)
+        rows.yview('scroll', 1, 'pages')
+        if len(tree.get_children()) > rows.rows_in_view:
+            raise RuntimeError(f'{len(tree.get_children())} table items for '
+                               f'{rows.rows_in_view} rows in view')
+    return len(dataset.table_keys) * 5
+
+
+@benchmark('mosaic_fill', 'tile')
+def mosaic_fill(dataset: Dataset) -> int:
+    from bench_mosaic import TILE_SIZE, WORKERS, wait_until
+    from mosaic_util import MosaicGrid
+    from task_util import TaskRunner
+
+    # Every run starts with an empty layer cache, as a new session does
+    root = HeadlessRoot()
+    core = dataset.new_core()
+    runner = TaskRunner(root, max_workers = WORKERS)
+    grid = MosaicGrid(HeadlessCanvas(root, width = 6 * (TILE_SIZE + MosaicGrid.PADDING)), runner,
+                      HeadlessCompositeCache(max_radars = len(dataset.radar_ids), max_size = TILE_SIZE),
+                      core.radar_layers, core.fetch_layers, tile_size = TILE_SIZE)
+    try:
+        grid.set_stations([(radar_id, radar_id) for radar_id in dataset.radar_ids])
+        grid.show(dataset.core.radar_index())
+        wait_until(root, lambda: grid.tiles_drawn == len(dataset.radar_ids))
+    finally:
+        grid.close()
+        runner.shutdown()
+        core.close()
+    return len(dataset.radar_ids)
+
+
+@benchmark('log_inserts', 'event')
+def log_inserts(dataset: Dataset) -> int:
+    events = dataset.arguments.events
+    logger = EventLogger(dataset.log_database_name, schema.INSERT_LOG_INFO)
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for number in range(events):
+        logger.log('ViewImage', now, f'Viewed image {number}')
+    logger.close()
+    return events
+
+
+@benchmark('report_full', 'report')
+def report_full(dataset: Dataset) -> int:
+    # Any filter makes the report start from the first event
+    generate_weather_report(dataset.database_name, start_date = '2000-01-01')
+    return 1
+
+
+@benchmark('report_incremental', 'report')
+def report_incremental(dataset: Dataset) -> int:
+    generate_weather_report(dataset.database_name)
+    for number in range(100):
+        dataset.core.log_event('SelectRadar', f'Selected radar {number}')
+    dataset.core.event_logger.flush()
+    generate_weather_report(dataset.database_name)
+    return 1
+
+
+def open_tk():
+    # Decoding with Tk needs a display; without one the PNGs are only inflated
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+        return root
+    except Exception:
+        return None
+
+
+def run_case(function, dataset: Dataset, repeat: int) -> list:
+    # One untimed run first, so one-off costs such as imports do not count
+    with contextlib.redirect_stdout(io.StringIO()):
+        function(dataset)
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            operations = function(dataset)
+            runs.append((time.perf_counter() - start, operations))
+    return runs
+
+
+def summarise(runs: list, operation: str) -> dict:
+    seconds = [elapsed / operations for elapsed, operations in runs]
+    ordered = sorted(seconds)
+    return {'operation': operation, 'repeat': len(runs), 'operations': runs[0][1],
+            'median_seconds': statistics.median(seconds), 'min_seconds': ordered[0],
+            'p95_seconds': ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))],
+            'mean_seconds': statistics.fmean(seconds),
+            'per_second': 1 / statistics.median(seconds) if statistics.median(seconds) else None,
+            'runs_seconds': seconds}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = REPOSITORY_DIR, capture_output = True,
+                              text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_name: str, threshold: float) -> list:
+    '''
+    Prints each case's median against the results in *baseline_name*, and
+    returns the names of the cases more than *threshold* slower.
+    '''
+    with open(baseline_name) as baseline_file:
+        baseline = json.load(baseline_file)['benchmarks']
+    regressions = []
+    print(f'compared with {baseline_name}:')
+    for name, result in results['benchmarks'].items():
+        if name not in baseline or 'median_seconds' not in result \
+                or 'median_seconds' not in baseline[name]:
+            continue
+        ratio = result['median_seconds'] / baseline[name]['median_seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'  {name:<20} {ratio:6.2f}x{flag}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Runs the radar browser benchmark suite.')
+    parser.add_argument('--output', help = 'JSON file the results are written to '
+                        '(default: benchmarks/results/<date and time>.json)')
+    parser.add_argument('--compare', metavar = 'RESULTS', help = 'earlier results to compare with')
+    parser.add_argument('--threshold', type = float, default = 0.2,
+                        help = 'fraction slower than --compare counted as a regression')
+    parser.add_argument('--only', nargs = '+', choices = sorted(BENCHMARKS), metavar = 'CASE',
+                        help = 'run only these cases')
+    parser.add_argument('--repeat', type = int, default = 10, help = 'timed runs of each case')
+    parser.add_argument('--latency', type = float, default = 0.01,
+                        help = 'seconds before every reply of the fake FTP server')
+    parser.add_argument('--radars', type = int, default = 10, help = 'radars in the dataset')
+    parser.add_argument('--frames', type = int, default = 20, help = 'images of each radar')
+    parser.add_argument('--image-size', type = int, default = 256, help = 'width of every image')
+    parser.add_argument('--events', type = int, default = 10_000, help = 'events logged per run')
+    arguments = parser.parse_args()
+
+    results = {'time': datetime.datetime.now().isoformat(timespec = 'seconds'),
+               'commit': git_commit(), 'python': platform.python_version(),
+               'platform': platform.platform(), 'machine': platform.machine(),
+               'cpus': os.cpu_count(),
+               'settings': {name: getattr(arguments, name) for name in
+                            ('repeat', 'latency', 'radars', 'frames', 'image_size', 'events')},
+               'benchmarks': {}}
+
+    dataset = Dataset(arguments)
+    dataset.tk_root = open_tk()
+    results['settings']['decoder'] = 'tk' if dataset.tk_root is not None else 'zlib'
+    try:
+        for name in arguments.only or BENCHMARKS:
+            function, operation = BENCHMARKS[name]
+            result = summarise(run_case(function, dataset, arguments.repeat), operation)
+            results['benchmarks'][name] = result
+            print(f'{name:<20} median {result["median_seconds"] * 1000:9.3f} ms '
+                  f'p95 {result["p95_seconds"] * 1000:9.3f} ms  per {operation}')
+    finally:
+        if dataset.tk_root is not None:
+            dataset.tk_root.destroy()
+        dataset.close()
+
+    output = arguments.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok = True)
+        output = os.path.join(RESULTS_DIR, f'{datetime.datetime.now():%Y%m%d-%H%M%S}.json')
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent = 2)
+    print(f'results written to {output}')
+
+    if arguments.compare and compare(results, arguments.compare, arguments.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
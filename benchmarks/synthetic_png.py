@@ -0,0 +1,73 @@
+'''
+Builds small PNG files in memory for the benchmarks, so no real BoM imagery
+is needed.
+'''
+import random
+import struct
+import zlib
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (struct.pack('>I', len(data)) + kind + data 
+            + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def make_png(width: int = 512, height: int = 512, seed: int = 0, coverage: float = 0.2) -> bytes:
+    '''
+    Returns an RGBA PNG of the given size which is transparent except for 
+    random horizontal streaks of colour covering roughly *coverage* of it,
+    loosely imitating a radar frame.
+    '''
+    generator = random.Random(seed)
+    rows = []
+    for _ in range(height):
+        row = bytearray(width * 4)
+        if generator.random() < coverage:
+            start = generator.randrange(width)
+            end = min(width, start + generator.randrange(16, 128))
+            colour = bytes((generator.randrange(256), generator.randrange(256), 
+                            generator.randrange(256), 255))
+            row[start * 4:end * 4] = colour * (end - start)
+        rows.append(b'\x00' + bytes(row))
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', header) 
+            + _chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + _chunk(b'IEND', b''))
+
+
+def make_palette_png(colours: list, width: int = 512, height: int = 512, seed: int = 0,
+                     coverage: float = 0.2) -> bytes:
+    '''
+    Returns a palette PNG of the given size, like a BoM radar frame: palette
+    entry 0 is transparent and entries 1 onwards are *colours*. Random 
+    horizontal streaks of colour cover roughly *coverage* of the image.
+    '''
+    generator = random.Random(seed)
+    rows = []
+    for _ in range(height):
+        row = bytearray(width)
+        if generator.random() < coverage:
+            start = generator.randrange(width)
+            end = min(width, start + generator.randrange(16, 128))
+            row[start:end] = bytes((generator.randrange(1, len(colours) + 1),)) * (end - start)
+        rows.append(b'\x00' + bytes(row))
+    header = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+    palette = b''.join(bytes(colour) for colour in [(0, 0, 0), *colours])
+    return (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', header) + _chunk(b'PLTE', palette)
+            + _chunk(b'tRNS', b'\x00') + _chunk(b'IDAT', zlib.compress(b''.join(rows), 6))
+            + _chunk(b'IEND', b''))
+
+
+def make_legend_png(colours: list, swatch_height: int = 20, width: int = 40) -> bytes:
+    '''
+    Returns an RGB PNG of a vertical colour scale: a swatch of each colour, 
+    top first, on a white background with black lines between swatches.
+    '''
+    rows = []
+    for colour in colours:
+        rows.append(b'\x00' + bytes((0, 0, 0)) * width)
+        for _ in range(swatch_height - 1):
+            rows.append(b'\x00' + bytes((255, 255, 255)) * 4 + bytes(colour) * (width - 8)
+                        + bytes((255, 255, 255)) * 4)
+    header = struct.pack('>IIBBBBB', width, len(rows), 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', header)
+            + _chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + _chunk(b'IEND', b''))
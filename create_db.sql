@@ -13,10 +13,35 @@ INSERT INTO EventTypes (EventType) VALUES ('SelectRadar');
 INSERT INTO EventTypes (EventType) VALUES ('ViewImage');
 INSERT INTO EventTypes (EventType) VALUES ('CloseProgram');
 INSERT INTO EventTypes (EventType) VALUES ('OpenProgram');
+INSERT INTO EventTypes (EventType) VALUES ('NewFrames');
+INSERT INTO EventTypes (EventType) VALUES ('FrameHistory');
+INSERT INTO EventTypes (EventType) VALUES ('StationMosaic');
 
 -- Table: Log
 DROP TABLE IF EXISTS Log;
-CREATE TABLE Log (EventType TEXT REFERENCES EventTypes (EventType), DateTime TEXT, Details TEXT);
+CREATE TABLE Log (LogId INTEGER PRIMARY KEY, EventType TEXT REFERENCES EventTypes (EventType), DateTime TEXT, Details TEXT);
+CREATE INDEX LogDateTime ON Log (DateTime);
+CREATE INDEX LogEventType ON Log (EventType, DateTime);
+
+-- Table: LogRollup
+DROP TABLE IF EXISTS LogRollup;
+CREATE TABLE LogRollup (Day TEXT, EventType TEXT, EventCount INTEGER, PRIMARY KEY (Day, EventType));
+
+-- Table: ReportWatermark
+DROP TABLE IF EXISTS ReportWatermark;
+CREATE TABLE ReportWatermark (ReportName TEXT PRIMARY KEY, LastLogId INTEGER);
+
+-- Table: ReportPages
+DROP TABLE IF EXISTS ReportPages;
+CREATE TABLE ReportPages (ReportName TEXT, PageNumber INTEGER, FirstDateTime TEXT, LastDateTime TEXT, RowCount INTEGER, PRIMARY KEY (ReportName, PageNumber));
+
+-- Table: FrameStats
+DROP TABLE IF EXISTS FrameStats;
+CREATE TABLE FrameStats (RadarId TEXT REFERENCES Radars (RadarId), Timestamp TEXT, CoveragePercent REAL, MaxRate REAL, MeanRate REAL, HeavyAreaKm2 REAL, Threshold REAL, PRIMARY KEY (RadarId, Timestamp, Threshold));
+
+-- Table: Frames
+DROP TABLE IF EXISTS Frames;
+CREATE TABLE Frames (RadarId TEXT REFERENCES Radars (RadarId), Timestamp TEXT, Path TEXT, Size INTEGER, Status TEXT, PRIMARY KEY (RadarId, Timestamp)) WITHOUT ROWID;
 
 -- Table: Radars
 DROP TABLE IF EXISTS Radars;
@@ -370,5 +395,7 @@ INSERT INTO Radars (RadarId, RadarName) VALUES ('IDR982', 'Taroom (256 km)');
 INSERT INTO Radars (RadarId, RadarName) VALUES ('IDR983', 'Taroom (128 km)');
 INSERT INTO Radars (RadarId, RadarName) VALUES ('IDR984', 'Taroom (64 km)');
 
+PRAGMA user_version = 5;
+
 -- COMMIT TRANSACTION;
 -- PRAGMA foreign_keys = on;
@@ -1,4 +1,10 @@
+import itertools
+import queue
 import sqlite3
+import threading
+import time
+
+import metrics_util
 
 def open_db( database_name: str ) -> sqlite3.Cursor:
     '''
@@ -20,3 +26,173 @@ def close_db( cursor: sqlite3.Cursor ) -> None:
     '''
     cursor.close()
     cursor.connection.close()
+
+
+def migrate_db( database_name: str, migrations: list ) -> int:
+    '''
+    Brings the schema of a SQLite database up to date. The schema version of
+    the database is kept in PRAGMA user_version, and each migration runs in 
+    its own transaction.
+
+    Parameters:
+    database_name (str) - the name of the databse file
+    migrations (list) - SQL scripts; migrations[n] upgrades a database from 
+                        schema version n to version n + 1
+
+    Returns:
+    The schema version of the database after migrating
+    '''
+    connection = sqlite3.connect(database = database_name)
+    try:
+        (version,) = connection.execute('PRAGMA user_version').fetchone()
+        for number in range(version, len(migrations)):
+            connection.executescript(
+                f'BEGIN; {migrations[number]}; PRAGMA user_version = {number + 1}; COMMIT;')
+            version = number + 1
+    finally:
+        # An unfinished migration is rolled back when the connection closes
+        connection.close()
+    return version
+
+class EventLogger:
+    '''
+    Writes rows to a database table through one long-lived connection owned 
+    by a background thread. Rows are queued by log and written together, in 
+    a single transaction with executemany, once *batch_size* rows are 
+    waiting or *flush_seconds* have passed since the oldest waiting row. The
+    database is switched to write-ahead logging so readers are not blocked.
+    Rows for other tables of the same database can be queued with log_row,
+    so that the database has a single writer.
+
+    Parameters:
+    database_name (str) - the name of the database file
+    insert_sql (str) - the INSERT statement each row is written with
+    batch_size (int) - the number of waiting rows which triggers a write
+    flush_seconds (float) - the longest time a row waits before being written
+    prepare - optional function called with the database name on the 
+              background thread before the connection is opened, e.g. to 
+              migrate the schema without making the caller wait
+    counter (str) - the metric counting the rows queued
+    '''
+    FLUSH_SECONDS = 30.0
+
+    def __init__(self, database_name: str, insert_sql: str, batch_size: int = 500,
+                 flush_seconds: float = 1.0, prepare = None, 
+                 counter: str = 'events_logged_total'):
+        self.database_name = database_name
+        self.insert_sql = insert_sql
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.prepare = prepare
+        self.counter = counter
+        self._closed = False
+        # Held while queueing, so nothing is queued once close has begun
+        self._close_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target = self._run, name = 'event-logger', daemon = True)
+        self._thread.start()
+
+    def log(self, *row) -> None:
+        '''
+        Queues one row to be written. Returns immediately.
+        '''
+        self.log_row(self.insert_sql, row)
+
+    def log_row(self, insert_sql: str, row: tuple, counter: str = None) -> None:
+        '''
+        Queues one row to be written with *insert_sql* instead of the 
+        logger's own statement, counted in *counter* (by default the 
+        logger's). Rows logged after close are dropped.
+        '''
+        with self._close_lock:
+            if self._closed:
+                print(f"Not writing a row to the closed log of {self.database_name}")
+                return
+            metrics_util.count(counter or self.counter)
+            self._queue.put((insert_sql, row))
+
+    def flush(self, timeout: float = FLUSH_SECONDS) -> bool:
+        '''
+        Waits until every row queued so far has been written and committed, 
+        for at most *timeout* seconds. Returns at once if the logger has 
+        been closed, since it writes nothing more.
+
+        Returns:
+        True if the rows were written, False if the logger is closed or the
+        wait timed out
+        '''
+        written = threading.Event()
+        with self._close_lock:
+            if self._closed or not self._thread.is_alive():
+                return False
+            self._queue.put(written)
+        return written.wait(timeout)
+
+    def close(self) -> None:
+        '''
+        Writes every queued row, then closes the connection and stops the 
+        background thread.
+        '''
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+        # The thread stops at the None; if it died before reaching it, the
+        # rows queued are lost, but nobody is left waiting for them
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _run(self) -> None:
+        if self.prepare is not None:
+            try:
+                self.prepare(self.database_name)
+            except sqlite3.Error as error:
+                print(f"Preparing {self.database_name} failed: {error}")
+        connection = sqlite3.connect(database = self.database_name)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        rows = []
+        deadline = None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout = timeout)
+            except queue.Empty:
+                item = ()
+            waiters = []
+            # Take everything already waiting without blocking again
+            while True:
+                if item is None:
+                    running = False
+                elif isinstance(item, tuple):
+                    if item:
+                        rows.append(item)
+                else:
+                    waiters.append(item)
+                if self._queue.empty() or not running or len(rows) >= self.batch_size:
+                    break
+                item = self._queue.get_nowait()
+
+            if rows and deadline is None:
+                deadline = time.monotonic() + self.flush_seconds
+            if rows and (waiters or not running or len(rows) >= self.batch_size 
+                         or time.monotonic() >= deadline):
+                try:
+                    with metrics_util.timer('event_log_write_seconds'), connection:
+                        # Runs of rows for the same statement, in order
+                        for insert_sql, batch in itertools.groupby(rows, key = lambda item: item[0]):
+                            connection.executemany(insert_sql, (row for _, row in batch))
+                    metrics_util.count('event_log_rows_written_total', len(rows))
+                except sqlite3.Error as error:
+                    # Drop the batch rather than stop logging altogether
+                    print(f"Writing {len(rows)} rows to {self.database_name} failed: {error}")
+                rows = []
+                deadline = None
+            for waiter in waiters:
+                waiter.set()
+        connection.close()
@@ -1,34 +1,475 @@
-def download_bytes(url: str) -> bytes:
+import fnmatch
+import ftplib
+import hashlib
+import http.client
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics_util
+
+# Seconds to wait for a connection to open, and for data once it is open
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 30.0
+
+# Times a download is tried when the host does not answer, and the longest 
+# wait before a retry; see backoff_seconds
+RETRY_ATTEMPTS = 3
+RETRY_SECONDS = 0.5
+MAX_RETRY_SECONDS = 8.0
+
+# Bytes read from a connection at a time when streaming a download
+CHUNK_BYTES = 64 * 1024
+
+
+class CircuitOpenError(urllib.error.URLError):
+    '''
+    Raised instead of contacting a host which has failed repeatedly and is 
+    assumed to be down.
+    '''
+    def __init__(self, host: str):
+        super().__init__(f'{host} is not responding, not retrying for now')
+        self.host = host
+
+
+class CircuitBreaker:
+    '''
+    Tracks failures per host. After *failure_threshold* failures in a row the
+    host's circuit opens and check fails at once for *reset_seconds*, so 
+    callers do not each wait for a timeout while the host is down. After that
+    one call is let through as a trial: if it succeeds the circuit closes 
+    again, if it fails the circuit stays open for another *reset_seconds*.
+
+    Parameters:
+    failure_threshold (int): Failures in a row which open the circuit.
+    reset_seconds (float): Seconds the circuit stays open before a trial.
+    '''
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+        self._trials = set()
+
+    def check(self, host: str) -> None:
+        '''
+        Returns if *host* may be contacted.
+
+        Raises:
+        CircuitOpenError: If the circuit of *host* is open.
+        '''
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return
+            if time.monotonic() - opened_at < self.reset_seconds or host in self._trials:
+                raise CircuitOpenError(host)
+            # This caller makes the trial call
+            self._trials.add(host)
+
+    def record_success(self, host: str) -> None:
+        '''
+        Records that *host* answered, closing its circuit.
+        '''
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._trials.discard(host)
+
+    def release_trial(self, host: str) -> None:
+        '''
+        Ends a trial call to *host* which neither succeeded nor failed, such
+        as one refused with a permanent error, leaving the circuit as it is;
+        the next call makes a new trial.
+        '''
+        with self._lock:
+            self._trials.discard(host)
+
+    def record_failure(self, host: str) -> None:
+        '''
+        Records that *host* did not answer, opening its circuit once it has 
+        failed *failure_threshold* times in a row.
+        '''
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            self._trials.discard(host)
+            if failures >= self.failure_threshold:
+                self._opened_at[host] = time.monotonic()
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            return host in self._opened_at
+
+
+class NegativeCache:
+    '''
+    Remembers resources found missing (HTTP 404 or 410, FTP 550) for 
+    *seconds*, so asking for them again fails at once without contacting the
+    server. Static layers such as "IDR{xxx}.locations.png" do not exist for 
+    every radar.
+
+    Parameters:
+    seconds (float): Seconds a missing resource is remembered.
+    max_entries (int): The most resources remembered; the oldest are dropped.
+    '''
+    def __init__(self, seconds: float = 300.0, max_entries: int = 4096):
+        self.seconds = seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._missing = {}
+
+    def check(self, url: str) -> None:
+        '''
+        Returns if *url* is not known to be missing.
+
+        Raises:
+        URLError: The error *url* failed with, if it is known to be missing.
+        '''
+        with self._lock:
+            entry = self._missing.get(url)
+            if entry is None:
+                return
+            expires, error = entry
+            if time.monotonic() >= expires:
+                del self._missing[url]
+                return
+        raise error.with_traceback(None)
+
+    def add(self, url: str, error: urllib.error.URLError) -> None:
+        with self._lock:
+            self._missing.pop(url, None)
+            self._missing[url] = (time.monotonic() + self.seconds, error)
+            while len(self._missing) > self.max_entries:
+                del self._missing[next(iter(self._missing))]
+
+
+class DownloadVerificationError(urllib.error.URLError):
+    '''
+    Raised when a download is not the size the server announced or does not
+    match its expected checksum. Like a dropped connection, it is retried.
+    '''
+
+
+class DownloadWriter:
+    '''
+    Receives a download chunk by chunk, counting and hashing the bytes as they
+    arrive so nothing needs to be read back to check them.
+
+    Parameters:
+    progress: If given, called after each chunk with the bytes received so 
+        far and the size the server announced (None if unknown).
+    '''
+    def __init__(self, progress = None):
+        self.progress = progress
+        self.size = 0
+        self.expected_size = None
+        self._hash = hashlib.sha256()
+
+    def restart(self) -> None:
+        '''
+        Drops everything received so far, before the download is tried again.
+        '''
+        self.size = 0
+        self.expected_size = None
+        self._hash = hashlib.sha256()
+
+    def expect(self, size: int) -> None:
+        '''
+        Records the size the server announced for the download, if any.
+        '''
+        self.expected_size = size
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self.progress is not None:
+            self.progress(self.size, self.expected_size)
+
+    @property
+    def digest(self) -> str:
+        '''
+        The SHA-256 digest of the bytes received, in hexadecimal.
+        '''
+        return self._hash.hexdigest()
+
+    def verify(self, url: str, sha256: str = None) -> None:
+        '''
+        Checks the download against the announced size and, if given, its 
+        expected SHA-256 digest.
+
+        Raises:
+        DownloadVerificationError: If either does not match.
+        '''
+        if self.expected_size is not None and self.size != self.expected_size:
+            raise DownloadVerificationError(
+                f'{url}: received {self.size} of {self.expected_size} bytes')
+        if sha256 is not None and self.digest != sha256.lower():
+            raise DownloadVerificationError(f'{url}: checksum does not match')
+
+
+class MemoryWriter(DownloadWriter):
+    '''
+    A DownloadWriter which keeps the download in memory.
+    '''
+    def __init__(self, progress = None):
+        super().__init__(progress)
+        self._chunks = []
+
+    def restart(self) -> None:
+        super().restart()
+        self._chunks = []
+
+    def write(self, chunk: bytes) -> None:
+        self._chunks.append(chunk)
+        super().write(chunk)
+
+    def content(self) -> bytes:
+        return b''.join(self._chunks)
+
+
+class AtomicFileWriter(DownloadWriter):
+    '''
+    A DownloadWriter which streams the download into a temporary file beside
+    *file_name*. commit flushes it to disk and renames it over *file_name* in
+    one step, so *file_name* never holds a partial download, even after a 
+    crash. Used as a context manager, the temporary file is removed unless
+    commit was called.
+
+    Parameters:
+    file_name (str): The file the download is saved as. Its folder is 
+        created if needed.
+    progress: See DownloadWriter.
+    '''
+    def __init__(self, file_name: str, progress = None):
+        super().__init__(progress)
+        self.file_name = file_name
+        directory = os.path.dirname(os.path.abspath(file_name))
+        os.makedirs(directory, exist_ok = True)
+        descriptor, self.temporary_path = tempfile.mkstemp(
+            prefix = f'{os.path.basename(file_name)}.', suffix = '.part', dir = directory)
+        self._file = os.fdopen(descriptor, 'wb')
+        self._committed = False
+
+    def restart(self) -> None:
+        super().restart()
+        self._file.seek(0)
+        self._file.truncate()
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        super().write(chunk)
+
+    def commit(self, file_name: str = None) -> None:
+        '''
+        Saves the download as *file_name*, by default the file name given 
+        when the writer was created.
+        '''
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.temporary_path, file_name or self.file_name)
+        self._committed = True
+
+    def discard(self) -> None:
+        '''
+        Removes the temporary file without saving the download.
+        '''
+        self._file.close()
+        if not self._committed:
+            try:
+                os.remove(self.temporary_path)
+            except OSError:
+                pass
+
+    def __enter__(self) -> 'AtomicFileWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.discard()
+
+
+def backoff_seconds(attempt: int, retry_seconds: float = RETRY_SECONDS,
+                    max_seconds: float = MAX_RETRY_SECONDS) -> float:
+    '''
+    Returns how long to wait before retry number *attempt* (from 0): a random
+    time up to *retry_seconds* doubled for each earlier retry, at most 
+    *max_seconds*. The randomness keeps clients which failed together from 
+    retrying together.
+    '''
+    return random.uniform(0, min(max_seconds, retry_seconds * 2 ** attempt))
+
+
+def _ftp_reply_code(error: Exception) -> str:
+    # The code of the FTP reply *error* stands for, e.g. "550", or None if 
+    # it is not an FTP reply. urllib and DownloadClient wrap FTP errors in one
+    # or two URLErrors, either as the ftplib error or as "ftp error: <reply>"
+    while isinstance(error, urllib.error.URLError):
+        error = error.reason
+    if isinstance(error, ftplib.Error) or (isinstance(error, str) and error.startswith('ftp error')):
+        match = re.search(r'\b[1-5]\d\d\b', str(error))
+        return match.group() if match else None
+    return None
+
+
+def is_missing(error: Exception) -> bool:
+    '''
+    Returns whether *error* means the resource does not exist.
+    '''
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in (404, 410)
+    return _ftp_reply_code(error) == '550'
+
+
+def is_transient(error: Exception) -> bool:
+    '''
+    Returns whether *error* means the host could not be reached or did not 
+    answer properly, so trying again later may work.
+    '''
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code in (408, 429)
+    if isinstance(error, CircuitOpenError) or is_missing(error):
+        return False
+    code = _ftp_reply_code(error)
+    if code is not None:
+        # A 5xx reply, such as a refused login (530) or a name not allowed
+        # (553), will be given again; 4xx replies are temporary
+        return not code.startswith('5')
+    return isinstance(error, (OSError, EOFError, ftplib.Error, http.client.HTTPException))
+
+
+def fetch_with_retries(url: str, fetch, attempts: int = RETRY_ATTEMPTS, 
+                       retry_seconds: float = RETRY_SECONDS, circuit_breaker: CircuitBreaker = None,
+                       negative_cache: NegativeCache = None) -> bytes:
+    '''
+    Calls *fetch* to download *url* until it works, retrying transient 
+    errors up to *attempts* times in all with backoff_seconds between tries.
+
+    Parameters:
+    url (str): The URL *fetch* downloads.
+    fetch: Called with no arguments; returns the downloaded bytes.
+    attempts (int): The most times *fetch* is called.
+    retry_seconds (float): The wait before the first retry; see backoff_seconds.
+    circuit_breaker (CircuitBreaker): If given, fails at once while the host
+        of *url* is down, and is told whether the host answered.
+    negative_cache (NegativeCache): If given, fails at once if *url* was 
+        recently found missing, and remembers it if it is.
+
+    Returns:
+    bytes: What *fetch* returned.
+
+    Raises:
+    HTTPError: If access to the requested resource is denied
+    URLError: If requested resource does not exist, or the host cannot be 
+        reached after every attempt
+    CircuitOpenError: If the host is assumed to be down
+    ValueError: If *attempts* is less than 1
+    '''
+    if attempts < 1:
+        raise ValueError(f"attempts must be at least 1, not {attempts}")
+    host = urllib.parse.urlsplit(url).netloc
+    try:
+        if negative_cache is not None:
+            negative_cache.check(url)
+    except urllib.error.URLError:
+        metrics_util.count('download_negative_cache_hits_total')
+        raise
+
+    for attempt in range(attempts):
+        try:
+            if circuit_breaker is not None:
+                circuit_breaker.check(host)
+        except CircuitOpenError:
+            metrics_util.count('download_circuit_open_total')
+            raise
+        try:
+            # Only the attempt itself is timed, not the waits between attempts
+            with metrics_util.timer('download_seconds'):
+                binary_data = fetch()
+        except Exception as error:
+            metrics_util.count('download_errors_total')
+            if not is_transient(error):
+                # Only a completed download shows the host is up; this says
+                # nothing either way
+                if circuit_breaker is not None:
+                    circuit_breaker.release_trial(host)
+                if negative_cache is not None and is_missing(error):
+                    negative_cache.add(url, error)
+                raise
+            if circuit_breaker is not None:
+                circuit_breaker.record_failure(host)
+            if attempt == attempts - 1:
+                if isinstance(error, urllib.error.URLError):
+                    raise
+                raise urllib.error.URLError(error) from error
+            metrics_util.count('download_retries_total')
+            time.sleep(backoff_seconds(attempt, retry_seconds))
+        else:
+            if circuit_breaker is not None:
+                circuit_breaker.record_success(host)
+            return binary_data
+
+
+# Shared by every call of the download functions below
+_circuit_breaker = CircuitBreaker()
+_negative_cache = NegativeCache()
+
+
+def download_bytes(url: str, timeout: float = READ_TIMEOUT, 
+                   attempts: int = RETRY_ATTEMPTS) -> bytes:
     '''
     Attempts to download the resource specified by parameter url.
 
+    Hosts which do not answer are tried up to *attempts* times, waiting 
+    longer between tries, and are then skipped for a while; resources found
+    missing are remembered for a while. See fetch_with_retries.
+
     Parameters:
     url (str): A string which specifies the URL of the resource.
+    timeout (float): Seconds to wait to connect, and for each read.
+    attempts (int): The most times the download is tried.
 
     Returns:
     bytes: A sequence of bytes which contains the downloaded content.
     
     Raises:
     HTTPError: If access to the requested resource is denied
-    ValueError: If requested resource does not exist
+    URLError: If requested resource does not exist, or the host cannot be 
+        reached
     '''
+    def fetch() -> bytes:
+        with _urlopen(url, timeout) as response:
+            return response.read()
+
+    binary_data = fetch_with_retries(url, fetch, attempts, RETRY_SECONDS, 
+                                     _circuit_breaker, _negative_cache)
+    metrics_util.count('download_bytes_total', len(binary_data))
+    return binary_data
+
+
+def _urlopen(url: str, timeout: float):
     import urllib.request as rq
 
     try:
         # First attempt: try to download the page without identifying our user 
         # agent
         request = rq.Request(url)
-        binary_data = rq.urlopen(request).read()
+        return rq.urlopen(request, timeout = timeout)
 
     except rq.HTTPError:
         # Second attempt: if access is denied, try (just once) again with a 
         # widely-used user agent string. If the second attempt fails, give up.
         request = rq.Request(url) 
         request.add_header("User-Agent", "Mozilla/5.0")
-        binary_data = rq.urlopen(request).read()
-    
-    # If we reach this point, one of the download attempts worked.
-    return binary_data
+        return rq.urlopen(request, timeout = timeout)
 
 
 def download_string( url: str, character_encoding: str = 'UTF-8' ) -> str:
@@ -51,28 +492,565 @@ def download_string( url: str, character_encoding: str = 'UTF-8' ) -> str:
     return binary_data.decode(character_encoding)
 
 
-def download_file(url: str, save_file_name: str) -> None:
+def download_file(url: str, save_file_name: str, progress = None, sha256: str = None,
+                  timeout: float = READ_TIMEOUT, attempts: int = RETRY_ATTEMPTS) -> int:
     '''
     Saves the content of resource identified by *url* into the file 
-    indicated by *save_file_name*.
+    indicated by *save_file_name*. The content is streamed to disk in chunks 
+    and only replaces *save_file_name* once it is complete and checked; see
+    AtomicFileWriter.
 
     Parameters:
     url (str): The address of the resource to download.
     save_file_name: The name of a file which will be overwritten with the 
         downloaded data.
+    progress: If given, called after each chunk with the bytes received so 
+        far and the announced size (None if unknown).
+    sha256 (str): If given, the expected SHA-256 digest of the content.
+    timeout (float): Seconds to wait to connect, and for each read.
+    attempts (int): The most times the download is tried.
 
     Returns:
-    None.
+    int: The size of the saved file.
     
     Raises:
     HTTPError: If access to the requested resource is denied.
-    ValueError: If requested resource does not exist.
+    URLError: If requested resource does not exist, cannot be reached, or 
+        does not match *sha256*.
+    '''
+    with AtomicFileWriter(save_file_name, progress) as writer:
+        def fetch() -> None:
+            writer.restart()
+            with _urlopen(url, timeout) as response:
+                content_length = response.headers.get('Content-Length')
+                writer.expect(int(content_length) if content_length else None)
+                while True:
+                    chunk = response.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+            writer.verify(url, sha256)
+
+        fetch_with_retries(url, fetch, attempts, RETRY_SECONDS, _circuit_breaker, _negative_cache)
+        writer.commit()
+    metrics_util.count('download_bytes_total', writer.size)
+    return writer.size
+
+
+class DownloadClient:
+    '''
+    A download client which keeps FTP and HTTP connections open so that 
+    repeated downloads from the same host skip the connect and login round 
+    trips. A batch of files can be fetched concurrently with download_files.
+    Downloads are retried, and fail fast while a host is down or for 
+    resources recently found missing; see fetch_with_retries.
+
+    Parameters:
+    max_connections_per_host (int): The most connections kept open (and used
+        at the same time) for any one host.
+    timeout (float): Seconds to wait for data on an open connection.
+    connect_timeout (float): Seconds to wait for a connection to open.
+    attempts (int): The most times each download is tried.
+    retry_seconds (float): The wait before the first retry; see backoff_seconds.
+    circuit_breaker (CircuitBreaker): Tracks which hosts are down; a new one
+        if not given.
+    negative_cache (NegativeCache): Remembers missing resources; a new one if
+        not given.
+    '''
+    def __init__(self, max_connections_per_host: int = 6, timeout: float = READ_TIMEOUT,
+                 connect_timeout: float = CONNECT_TIMEOUT, attempts: int = RETRY_ATTEMPTS,
+                 retry_seconds: float = RETRY_SECONDS, circuit_breaker: CircuitBreaker = None,
+                 negative_cache: NegativeCache = None):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.attempts = attempts
+        self.retry_seconds = retry_seconds
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.negative_cache = negative_cache or NegativeCache()
+        self._lock = threading.Lock()
+        self._idle_connections = {}
+        self._host_slots = {}
+        self._executor = ThreadPoolExecutor(max_workers = max_connections_per_host,
+                                            thread_name_prefix = 'download')
+
+    def _host_slot(self, host_key: tuple) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host_key not in self._host_slots:
+                self._host_slots[host_key] = threading.BoundedSemaphore(
+                    self.max_connections_per_host)
+            return self._host_slots[host_key]
+
+    def _take_idle(self, host_key: tuple):
+        with self._lock:
+            idle = self._idle_connections.get(host_key)
+            return idle.pop() if idle else None
+
+    def _put_idle(self, host_key: tuple, connection) -> None:
+        with self._lock:
+            self._idle_connections.setdefault(host_key, []).append(connection)
+
+    def _open_connection(self, parts: urllib.parse.SplitResult):
+        # Connect with the connect timeout, then switch the socket (and, for 
+        # FTP, later data connections) to the read timeout
+        if parts.scheme == 'ftp':
+            ftp = ftplib.FTP()
+            try:
+                ftp.connect(parts.hostname, parts.port or ftplib.FTP_PORT, 
+                            timeout = self.connect_timeout)
+                ftp.timeout = self.timeout
+                ftp.sock.settimeout(self.timeout)
+                ftp.login(urllib.parse.unquote(parts.username or 'anonymous'),
+                          urllib.parse.unquote(parts.password or ''))
+            except BaseException:
+                ftp.close()
+                raise
+            return ftp
+        if parts.scheme == 'https':
+            connection = http.client.HTTPSConnection(parts.hostname, parts.port,
+                                                     timeout = self.connect_timeout)
+        else:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port,
+                                                    timeout = self.connect_timeout)
+        try:
+            connection.connect()
+        except BaseException:
+            connection.close()
+            raise
+        connection.sock.settimeout(self.timeout)
+        return connection
+
+    @staticmethod
+    def _close_connection(connection) -> None:
+        try:
+            connection.close()
+        except (OSError, EOFError, ftplib.Error):
+            pass
+
+    @staticmethod
+    def _ftp_fetch(ftp: ftplib.FTP, path: str, writer: DownloadWriter) -> None:
+        # Paths ending in "/" are directories, for which the listing is returned 
+        # as urllib does. This is ftplib's retrbinary, keeping the size which
+        # servers announce in their "150 ... (n bytes)" reply
+        command = 'LIST ' if path.endswith('/') else 'RETR '
+        try:
+            ftp.voidcmd('TYPE I')
+            data_connection, size = ftp.ntransfercmd(command + path)
+            with data_connection:
+                writer.expect(size)
+                while True:
+                    chunk = data_connection.recv(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+            ftp.voidresp()
+        except ftplib.error_perm as reason:
+            raise urllib.error.URLError(f'ftp error: {reason}') from reason
+
+    @staticmethod
+    def _http_fetch(connection: http.client.HTTPConnection, url: str, 
+                    path: str, writer: DownloadWriter) -> bool:
+        # Mirror download_bytes: if access is denied, try (just once) again with
+        # a widely-used user agent string. Returns whether the connection can
+        # be used again. Only the content itself (200, or 206 for the rest of
+        # a file) is a success; a redirect or an empty reply is not the file
+        for headers in ({}, {"User-Agent": "Mozilla/5.0"}):
+            connection.request('GET', path, headers = headers)
+            response = connection.getresponse()
+            if response.status in (200, 206):
+                break
+            response.read()
+        if response.status not in (200, 206):
+            if response.will_close:
+                connection.close()
+            raise urllib.error.HTTPError(url, response.status, response.reason,
+                                         response.headers, None)
+        writer.expect(response.length)
+        while True:
+            chunk = response.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            writer.write(chunk)
+        if response.will_close:
+            connection.close()
+        return not response.will_close
+
+    def download_bytes(self, url: str) -> bytes:
+        '''
+        Downloads the resource specified by parameter url over a pooled 
+        connection.
+
+        Parameters:
+        url (str): A string which specifies the URL of the resource.
+
+        Returns:
+        bytes: A sequence of bytes which contains the downloaded content.
+
+        Raises:
+        HTTPError: If access to the requested resource is denied
+        URLError: If requested resource does not exist or the host cannot be 
+            reached
+        CircuitOpenError: If the host is assumed to be down
+        '''
+        writer = MemoryWriter()
+        self.download_to(url, writer)
+        return writer.content()
+
+    def download_to(self, url: str, writer: DownloadWriter, sha256: str = None) -> None:
+        '''
+        Streams the resource specified by parameter url into *writer* over a
+        pooled connection, then checks it with writer.verify. *writer* is 
+        restarted if the download is tried again.
+
+        Raises:
+        HTTPError, URLError or CircuitOpenError: As download_bytes.
+        '''
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('ftp', 'http', 'https'):
+            raise ValueError(f"unsupported URL scheme in '{url}'")
+
+        def fetch() -> None:
+            self._download_once(url, parts, writer)
+            writer.verify(url, sha256)
+
+        fetch_with_retries(url, fetch, self.attempts, self.retry_seconds, 
+                           self.circuit_breaker, self.negative_cache)
+        metrics_util.count('download_bytes_total', writer.size)
+
+    def _download_once(self, url: str, parts: urllib.parse.SplitResult, 
+                       writer: DownloadWriter) -> None:
+        # Collapse doubled slashes such as "radar//IDR023.T.202405161124.png"
+        path = urllib.parse.unquote(parts.path) or '/'
+        while '//' in path:
+            path = path.replace('//', '/')
+        if parts.scheme != 'ftp':
+            path = urllib.parse.quote(path) + (f'?{parts.query}' if parts.query else '')
+
+        host_key = (parts.scheme, parts.hostname, parts.port)
+        with self._host_slot(host_key):
+            connection = self._take_idle(host_key)
+            reused = connection is not None
+            while True:
+                writer.restart()
+                try:
+                    if connection is None:
+                        connection = self._open_connection(parts)
+                    if parts.scheme == 'ftp':
+                        self._ftp_fetch(connection, path, writer)
+                        reusable = True
+                    else:
+                        reusable = self._http_fetch(connection, url, path, writer)
+                    break
+                except (OSError, EOFError, ftplib.Error, http.client.HTTPException) as error:
+                    if isinstance(error, urllib.error.URLError):
+                        # The server answered, so the connection is still good
+                        self._put_idle(host_key, connection)
+                        raise
+                    if connection is not None:
+                        self._close_connection(connection)
+                    connection = None
+                    if not reused:
+                        raise urllib.error.URLError(error) from error
+                    # An idle connection may have been dropped by the server: 
+                    # try once more with a new one
+                    reused = False
+            if reusable:
+                self._put_idle(host_key, connection)
+
+    def download_file(self, url: str, save_file_name: str, progress = None, 
+                      sha256: str = None) -> int:
+        '''
+        Saves the content of resource identified by *url* into the file 
+        indicated by *save_file_name*, using a pooled connection. The content
+        is streamed to disk and only replaces *save_file_name* once it is 
+        complete and checked; see AtomicFileWriter.
+
+        Parameters:
+        url (str): The address of the resource to download.
+        save_file_name (str): The file to save the content as.
+        progress: If given, called after each chunk with the bytes received 
+            so far and the announced size (None if unknown).
+        sha256 (str): If given, the expected SHA-256 digest of the content.
+
+        Returns:
+        int: The size of the saved file.
+        '''
+        with AtomicFileWriter(save_file_name, progress) as writer:
+            self.download_to(url, writer, sha256)
+            writer.commit()
+        return writer.size
+
+    def run_all(self, function, argument_list: list, errors: dict = None) -> list:
+        '''
+        Calls *function* once for each tuple of arguments on the download 
+        threads, all at the same time, and waits for every call, e.g. to 
+        download a batch of resources with a method of another class.
+
+        Parameters:
+        function: Called with each tuple of arguments in *argument_list*.
+        argument_list (list): The arguments of each call.
+        errors (dict): If given, calls which fail do not raise; instead the
+            error of each is stored here by its position in *argument_list*
+            and its result is None.
+
+        Returns:
+        list: The result of each call, in the order of *argument_list*.
+
+        Raises:
+        The first error met, once every call has finished, unless *errors* 
+            is given.
+        '''
+        futures = [self._executor.submit(function, *arguments) 
+                   for arguments in argument_list]
+        results = []
+        for number, future in enumerate(futures):
+            error = future.exception()
+            if error is not None and errors is None:
+                raise error
+            if error is not None:
+                errors[number] = error
+            results.append(None if error is not None else future.result())
+        return results
+
+    def download_all(self, urls: list) -> list:
+        '''
+        Downloads several resources at the same time.
+
+        Parameters:
+        urls (list): The URLs of the resources.
+
+        Returns:
+        list: The downloaded bytes of each resource, in the order of *urls*.
+
+        Raises:
+        HTTPError or URLError: The first error met, once every download has 
+            finished.
+        '''
+        return self.run_all(self.download_bytes, [(url,) for url in urls])
+
+    def download_files(self, downloads: list) -> None:
+        '''
+        Downloads several resources into files at the same time.
+
+        Parameters:
+        downloads (list): A list of (url, save_file_name) tuples.
+
+        Returns:
+        None.
+
+        Raises:
+        HTTPError or URLError: The first error met, once every download has 
+            finished.
+        '''
+        self.run_all(self.download_file, downloads)
+
+    def close(self) -> None:
+        '''
+        Stops the download threads and closes every pooled connection.
+        '''
+        self._executor.shutdown(wait = True)
+        with self._lock:
+            idle_connections = self._idle_connections
+            self._idle_connections = {}
+        for connections in idle_connections.values():
+            for connection in connections:
+                self._close_connection(connection)
+
+
+class LayerCache:
+    '''
+    An on-disk cache for downloaded radar layers. Files are stored under the 
+    SHA-256 digest of their content, so identical layers are kept once, and a
+    JSON manifest maps each layer name to its digest, size and last use. When
+    the cache grows past *max_bytes*, the least recently used radar frames are 
+    removed. Static layers (backgrounds, range maps, location overlays and 
+    legends) are pinned and never removed. The manifest is written at most 
+    every SAVE_SECONDS as layers are added, and by save.
+
+    Parameters:
+    cache_dir (str): The folder holding the manifest and cached files. It is 
+        created if needed.
+    max_bytes (int): The byte budget for the cached files.
     '''
-    content = download_bytes(url)
-    file = open(save_file_name, 'wb')
-    file.write(content)
-    file.close()
+    MANIFEST_NAME = 'manifest.json'
+    SAVE_SECONDS = 5.0
+    PINNED_PATTERNS = ('*.background.png', '*.range.png', '*.locations.png', 
+                       'IDR.legend.*.png')
+
+    def __init__(self, cache_dir: str, max_bytes: int = 200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._manifest_path = os.path.join(cache_dir, self.MANIFEST_NAME)
+        self._saved_at = time.monotonic()
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok = True)
+        try:
+            with open(self._manifest_path, 'r') as manifest_file:
+                self._entries = json.load(manifest_file)
+        except (OSError, ValueError):
+            self._entries = {}
+        # Forget any entry whose file was removed behind our back
+        self._entries = {name: entry for name, entry in self._entries.items()
+                         if os.path.exists(self._object_path(entry['digest']))}
+        # Remove downloads left unfinished by a crash, which are written next
+        # to the objects or in their shard folders, and files no entry refers
+        # to, e.g. stored after the manifest was last written, so that they 
+        # do not sit outside the byte budget
+        digests = {entry['digest'] for entry in self._entries.values()}
+        for folder, _, file_names in os.walk(os.path.join(cache_dir, 'objects')):
+            for file_name in file_names:
+                if file_name.endswith('.part') or (file_name.endswith('.png') 
+                                                   and file_name[:-4] not in digests):
+                    os.remove(os.path.join(folder, file_name))
+
+    @classmethod
+    def is_pinned(cls, name: str) -> bool:
+        '''
+        Returns True if the layer called *name* is static and kept forever.
+        '''
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in cls.PINNED_PATTERNS)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, 'objects', digest[:2], f'{digest}.png')
+
+    def _stored_bytes(self) -> int:
+        sizes = {entry['digest']: entry['size'] for entry in self._entries.values()}
+        return sum(sizes.values())
+
+    def path(self, name: str) -> str:
+        '''
+        Returns the path of the cached file for layer *name*, or None if the 
+        layer is not cached. The layer is marked as just used.
+        '''
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            entry['last_used'] = time.time()
+            return self._object_path(entry['digest'])
+
+    def store(self, name: str, content: bytes) -> str:
+        '''
+        Adds the layer *name* with the given content to the cache, evicting 
+        old radar frames if the byte budget is exceeded.
+
+        Returns:
+        str: The path of the cached file.
+        '''
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        with self._lock:
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok = True)
+                temporary_path = f'{object_path}.part'
+                with open(temporary_path, 'wb') as file:
+                    file.write(content)
+                os.replace(temporary_path, object_path)
+            self._add_entry(name, digest, len(content))
+        return object_path
+
+    def download(self, client: DownloadClient, url: str, name: str) -> str:
+        '''
+        Streams the layer *name* from *url* into the cache, hashing it as it
+        is written, and evicts old radar frames if the byte budget is 
+        exceeded.
+
+        Returns:
+        str: The path of the cached file.
+        '''
+        with AtomicFileWriter(os.path.join(self.cache_dir, 'objects', name)) as writer:
+            client.download_to(url, writer)
+            object_path = self._object_path(writer.digest)
+            with self._lock:
+                if not os.path.exists(object_path):
+                    os.makedirs(os.path.dirname(object_path), exist_ok = True)
+                    writer.commit(object_path)
+                self._add_entry(name, writer.digest, writer.size)
+        return object_path
+
+    def _add_entry(self, name: str, digest: str, size: int) -> None:
+        # Records a stored layer, removing the file it replaces if no other
+        # layer has the same content, then keeps to the byte budget
+        previous = self._entries.get(name)
+        self._entries[name] = {'digest': digest, 'size': size, 'last_used': time.time(), 
+                               'pinned': self.is_pinned(name)}
+        if previous is not None and previous['digest'] != digest:
+            self._remove_object(previous['digest'])
+        self._evict()
+        if time.monotonic() - self._saved_at >= self.SAVE_SECONDS:
+            self._save()
+
+    def _remove_object(self, digest: str) -> int:
+        # Removes the file of *digest* unless a layer still has that content,
+        # and returns the bytes freed
+        if any(entry['digest'] == digest for entry in self._entries.values()):
+            return 0
+        object_path = self._object_path(digest)
+        try:
+            size = os.path.getsize(object_path)
+            os.remove(object_path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def _evict(self) -> None:
+        # Remove unpinned layers, least recently used first, until the cache 
+        # fits in its budget
+        stored_bytes = self._stored_bytes()
+        if stored_bytes <= self.max_bytes:
+            return
+        candidates = sorted((entry['last_used'], name) 
+                            for name, entry in self._entries.items() 
+                            if not entry['pinned'])
+        for _, name in candidates:
+            if stored_bytes <= self.max_bytes:
+                break
+            stored_bytes -= self._remove_object(self._entries.pop(name)['digest'])
+
+    def _save(self) -> None:
+        temporary_path = f'{self._manifest_path}.part'
+        with open(temporary_path, 'w') as manifest_file:
+            json.dump(self._entries, manifest_file)
+        os.replace(temporary_path, self._manifest_path)
+        self._saved_at = time.monotonic()
+
+    def save(self) -> None:
+        '''
+        Writes the manifest, including the latest use times, to disk.
+        '''
+        with self._lock:
+            self._save()
+
+    def fetch(self, client: DownloadClient, downloads: list, errors: dict = None) -> dict:
+        '''
+        Returns the cached file of every requested layer, downloading the 
+        missing ones at the same time.
 
-pass
+        Parameters:
+        client (DownloadClient): The client used for missing layers.
+        downloads (list): A list of (url, name) tuples.
+        errors (dict): If given, a layer which cannot be downloaded, e.g. a 
+            radar image no longer listed, does not fail the others: its 
+            error is stored here by layer name and it is left out of the 
+            returned paths.
 
+        Returns:
+        dict: Maps each layer name to the path of its cached file.
 
+        Raises:
+        HTTPError or URLError: If a missing layer cannot be downloaded and 
+            *errors* is not given.
+        '''
+        paths = {name: self.path(name) for _, name in downloads}
+        missing = [(client, url, name) for url, name in downloads if paths[name] is None]
+        metrics_util.count('layer_cache_hits_total', len(downloads) - len(missing))
+        metrics_util.count('layer_cache_misses_total', len(missing))
+        failures = {} if errors is not None else None
+        for (_, _, name), path in zip(missing, client.run_all(self.download, missing, failures)):
+            paths[name] = path
+        if failures:
+            for number, error in failures.items():
+                name = missing[number][2]
+                errors[name] = error
+                del paths[name]
+        return paths
@@ -0,0 +1,192 @@
+import bisect
+import hashlib
+import os
+import queue
+import re
+import threading
+from typing import NamedTuple
+
+import metrics_util
+
+
+class NewFrame(NamedTuple):
+    '''
+    A radar frame which was not in the previous listing.
+    '''
+    radar_id: str
+    timestamp: str
+
+    @property
+    def image_name(self) -> str:
+        return f"{self.radar_id}.T.{self.timestamp}.png"
+
+
+class RadarIndex:
+    '''
+    The radar frames named in a listing of the BoM radar folder, parsed once
+    and grouped by radar ID so the frames of one station can be looked up 
+    without scanning the whole listing again.
+
+    Parameters:
+    frames (dict): Maps each radar ID (e.g. "IDR023") to a sorted list of 
+        frame timestamps in the form "YYYYMMDDhhmm".
+    '''
+    # example match: IDR012.T.202405161124.png
+    FRAME_PATTERN = re.compile(r'(IDR\d{3})\.T\.(\d{12})\.png')
+
+    def __init__(self, frames: dict):
+        self._frames = frames
+
+    @classmethod
+    @metrics_util.timed('index_parse_seconds')
+    def parse(cls, listing: str) -> 'RadarIndex':
+        '''
+        Builds an index from the text of a radar folder listing.
+        '''
+        frames = {}
+        for radar_id, timestamp in cls.FRAME_PATTERN.findall(listing):
+            frames.setdefault(radar_id, []).append(timestamp)
+
+        # Timestamps are fixed width, so sorting the text sorts them by time
+        for timestamps in frames.values():
+            timestamps.sort()
+        return cls(frames)
+
+    @classmethod
+    def load(cls, file_name: str) -> 'RadarIndex':
+        '''
+        Builds an index from a saved listing such as radar_index.txt.
+        '''
+        with open(file_name, 'r') as index_file:
+            return cls.parse(index_file.read())
+
+    def frames(self, radar_id: str) -> list:
+        '''
+        Returns the sorted frame timestamps listed for *radar_id*, or an empty
+        list if the radar has none.
+        '''
+        return self._frames.get(radar_id, [])
+
+    def radar_ids(self) -> list:
+        '''
+        Returns the IDs of every radar with at least one frame.
+        '''
+        return sorted(self._frames)
+
+    def __len__(self) -> int:
+        return sum(len(timestamps) for timestamps in self._frames.values())
+
+    @metrics_util.timed('index_diff_seconds')
+    def new_frames(self, previous: 'RadarIndex') -> list:
+        '''
+        Returns a NewFrame for every frame in this index which is not in
+        *previous*, by radar ID and then time.
+
+        A refreshed listing usually drops its oldest frames and adds new 
+        ones at the end, so each radar's frames are compared as sorted 
+        lists: frames after the last previous frame are new, and the rest
+        only need a closer look if they are not the tail of the previous
+        frames, e.g. when a late frame was published.
+        '''
+        new_frames = []
+        for radar_id in sorted(self._frames):
+            timestamps = self._frames[radar_id]
+            known = previous._frames.get(radar_id)
+            if not known:
+                new_frames += [NewFrame(radar_id, timestamp) for timestamp in timestamps]
+                continue
+            if timestamps == known:
+                continue
+            split = bisect.bisect_right(timestamps, known[-1])
+            older = timestamps[:split]
+            if older != known[len(known) - len(older):]:
+                known_set = set(known)
+                new_frames += [NewFrame(radar_id, timestamp) for timestamp in older
+                               if timestamp not in known_set]
+            new_frames += [NewFrame(radar_id, timestamp) for timestamp in timestamps[split:]]
+        return new_frames
+
+
+def format_timestamp(timestamp: str) -> tuple:
+    '''
+    Splits a frame timestamp such as "202405161124" into the date and time
+    strings shown in the interface.
+
+    Returns:
+    tuple: (date, time) e.g. ("2024-05-16", "11:24")
+    '''
+    return (f"{timestamp[0:4]}-{timestamp[4:6]}-{timestamp[6:8]}", 
+            f"{timestamp[8:10]}:{timestamp[10:12]}")
+
+
+class ListingRefresher(threading.Thread):
+    '''
+    A background thread which downloads a radar folder listing every 
+    *interval* seconds. The saved listing is only rewritten when its content
+    has changed (compared by SHA-256 digest); each changed listing is parsed 
+    and put on the *updates* queue as a RadarIndex for the interface to pick 
+    up from its own thread.
+
+    Parameters:
+    client: An object with a download_bytes(url) method, such as a 
+        DownloadClient.
+    url (str): The address of the folder listing.
+    file_name (str): The file the listing is saved to.
+    interval (float): Seconds between downloads.
+    '''
+    def __init__(self, client, url: str, file_name: str, interval: float):
+        super().__init__(name = 'listing-refresher', daemon = True)
+        self.client = client
+        self.url = url
+        self.file_name = file_name
+        self.interval = interval
+        self.updates = queue.Queue()
+        self._stopped = threading.Event()
+        self._digest = None
+        if os.path.exists(file_name):
+            with open(file_name, 'rb') as listing_file:
+                self._digest = hashlib.sha256(listing_file.read()).hexdigest()
+
+    def refresh(self) -> bool:
+        '''
+        Downloads the listing once, saving and queueing it if it changed.
+
+        Returns:
+        bool: True if the listing changed.
+        '''
+        content = self.client.download_bytes(self.url)
+        digest = hashlib.sha256(content).hexdigest()
+        if digest == self._digest:
+            return False
+
+        # Parsed before saving, so a listing that will not parse never
+        # replaces the last good one
+        radar_index = RadarIndex.parse(content.decode('UTF-8'))
+        # Write to a temporary file first so readers never see half a listing
+        temporary_name = f'{self.file_name}.part'
+        with open(temporary_name, 'wb') as listing_file:
+            listing_file.write(content)
+        os.replace(temporary_name, self.file_name)
+        self._digest = digest
+        self.updates.put(radar_index)
+        return True
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except OSError as error:
+                # Network trouble: keep the old listing and try again later
+                print(f"Refreshing {self.file_name} failed: {error}")
+            except Exception as error:
+                # A listing that will not decode or parse must not stop the
+                # refreshes for good
+                print(f"Refreshing {self.file_name} failed: {error!r}")
+
+    def stop(self) -> None:
+        '''
+        Asks the thread to finish and waits for it.
+        '''
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,225 @@
+'''
+Counters and latency histograms for the hot paths of the radar browser:
+downloads, listing parsing, event logging, report generation and image
+loading. Metrics are off unless the RAINYDAZE_METRICS environment variable
+is set (to anything but "0") or enable is called; while off, every call
+returns at once without recording anything.
+
+Typical use:
+
+    with metrics_util.timer('download_seconds'):
+        ...
+    metrics_util.count('download_bytes_total', len(content))
+'''
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# Upper bounds, in seconds, of the buckets of every latency histogram
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.environ.get('RAINYDAZE_METRICS', '') not in ('', '0')
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+class Histogram:
+    '''
+    Counts observed values into fixed buckets, as Prometheus histograms do.
+
+    Parameters:
+    buckets (tuple): The upper bound of each bucket, in increasing order. A
+        last bucket without an upper bound is added.
+    '''
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction: float) -> float:
+        '''
+        Returns the upper bound of the bucket holding the given fraction
+        (e.g. 0.95) of the observations, or 0.0 if there are none. Values
+        past the last bound are reported as the last bound.
+        '''
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= wanted:
+                return bound
+        return self.buckets[-1]
+
+
+def enable(enabled: bool = True) -> None:
+    '''
+    Turns recording on or off. Metrics already recorded are kept.
+    '''
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def count(name: str, value: int = 1) -> None:
+    '''
+    Adds *value* to the counter *name*.
+    '''
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, seconds: float) -> None:
+    '''
+    Records a latency of *seconds* in the histogram *name*.
+    '''
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        observe(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str):
+    '''
+    Returns a context manager which records how long its block takes in the
+    histogram *name*, whether or not it raises.
+    '''
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def timed(name: str):
+    '''
+    Decorates a function so each call's duration is recorded in the
+    histogram *name*.
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*arguments, **keywords):
+            if not _enabled:
+                return function(*arguments, **keywords)
+            with _Timer(name):
+                return function(*arguments, **keywords)
+        return wrapper
+    return decorator
+
+
+def hit_rate(hits_name: str, misses_name: str) -> float:
+    '''
+    Returns hits / (hits + misses) for two counters, or 0.0 if both are 0.
+    '''
+    with _lock:
+        hits = _counters.get(hits_name, 0)
+        misses = _counters.get(misses_name, 0)
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+def reset() -> None:
+    '''
+    Forgets every counter and histogram.
+    '''
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def snapshot() -> dict:
+    '''
+    Returns a copy of every metric:
+    {"counters": {name: value},
+     "histograms": {name: {"count", "sum", "p50", "p95", "p99", "buckets"}}}
+    where "buckets" maps each upper bound to the number of values at or
+    below it.
+    '''
+    with _lock:
+        histograms = {}
+        for name, histogram in sorted(_histograms.items()):
+            cumulative, buckets = 0, {}
+            for bound, bucket_count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += bucket_count
+                buckets[str(bound)] = cumulative
+            histograms[name] = {'count': histogram.count, 'sum': histogram.sum,
+                                'p50': histogram.quantile(0.5), 'p95': histogram.quantile(0.95),
+                                'p99': histogram.quantile(0.99), 'buckets': buckets}
+        return {'counters': dict(sorted(_counters.items())), 'histograms': histograms}
+
+
+def prometheus_text() -> str:
+    '''
+    Returns every metric in the Prometheus text exposition format.
+    '''
+    metrics = snapshot()
+    lines = []
+    for name, value in metrics['counters'].items():
+        lines += [f'# TYPE {name} counter', f'{name} {value}']
+    for name, histogram in metrics['histograms'].items():
+        lines.append(f'# TYPE {name} histogram')
+        lines += [f'{name}_bucket{{le="{bound}"}} {cumulative}'
+                  for bound, cumulative in histogram['buckets'].items()]
+        lines += [f'{name}_sum {histogram["sum"]}', f'{name}_count {histogram["count"]}']
+    return ''.join(f'{line}\n' for line in lines)
+
+
+def write_json(file_name: str) -> None:
+    '''
+    Saves snapshot() to *file_name* as JSON, with the time it was taken.
+    '''
+    metrics = snapshot()
+    metrics['time'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    with open(file_name, 'w') as json_file:
+        json.dump(metrics, json_file, indent = 2)
+
+
+def write_prometheus(file_name: str) -> None:
+    '''
+    Saves prometheus_text() to *file_name*, e.g. for the node exporter's
+    text file collector.
+    '''
+    with open(file_name, 'w') as text_file:
+        text_file.write(prometheus_text())
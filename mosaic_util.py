@@ -0,0 +1,221 @@
+import collections
+import math
+import os
+import time
+import tkinter as tk
+
+
+class MosaicGrid:
+    '''
+    Shows the latest radar image of many stations at once as a grid of
+    tiles in one canvas, each tile being one image item and one caption
+    item. The latest frame of every station is loaded on worker threads at
+    the same time, and each tile is drawn as soon as its frame arrives, so
+    tiles fill in and refresh independently of each other.
+
+    The static layers of a station are only fetched and merged (shrunk to
+    the tile size) for its first frame; later frames are fetched on their
+    own and drawn between them. Drawing happens on the Tk thread in slices
+    of at most *draw_budget* seconds, so a burst of finished downloads
+    never holds the interface up for long. Until then, a tile can show the
+    thumbnail of the newest image of its station seen before.
+
+    Parameters:
+    canvas (tk.Canvas): The canvas the tiles are drawn in.
+    task_runner (TaskRunner): Runs the downloads off the Tk thread.
+    composite_cache (CompositeCache): Merges and shrinks the static layers;
+        it should keep at least as many radars as there are tiles.
+    radar_layers: Called with a radar ID and an image name; returns the
+        layers of that image, as RadarCore.radar_layers does.
+    fetch_layers: Called on a worker thread with some of those layers;
+        returns the content of each by layer name, as RadarCore.fetch_layers
+        does.
+    tile_size (int): The width and height of a tile in pixels.
+    draw_budget (float): The longest time spent drawing tiles at once.
+    latest_thumbnail: Called with a radar ID; returns the thumbnail file of
+        the newest image of that station which has one, or None, as
+        radar_core.thumbnails.latest_thumbnail does. Without it, tiles stay
+        empty until their latest frame is drawn.
+    '''
+    TASK_PREFIX = "mosaic"
+    CAPTION_HEIGHT = 18
+    PADDING = 6
+
+    def __init__(self, canvas: tk.Canvas, task_runner, composite_cache, radar_layers,
+                 fetch_layers, tile_size: int = 170, draw_budget: float = 0.01,
+                 latest_thumbnail = None):
+        self.canvas = canvas
+        self.task_runner = task_runner
+        self.composite_cache = composite_cache
+        self.radar_layers = radar_layers
+        self.fetch_layers = fetch_layers
+        self.tile_size = tile_size
+        self.draw_budget = draw_budget
+        self.latest_thumbnail = latest_thumbnail
+        self.stations = []
+        self.tiles_drawn = 0
+        self.draw_seconds = collections.deque(maxlen = 1000)
+        self._items = {}
+        self._images = {}
+        self._shown = {}
+        self._loading = {}
+        self._ready = collections.OrderedDict()
+        self._draw_job = None
+
+    def set_stations(self, stations: list) -> None:
+        '''
+        Lays out one empty tile for each station.
+
+        Parameters:
+        stations (list): (radar ID, radar name) of each station, in order.
+        '''
+        self.close()
+        self.canvas.delete('all')
+        self.stations = list(stations)
+        self._items.clear()
+        self._images.clear()
+        self._shown.clear()
+
+        pitch_x = self.tile_size + self.PADDING
+        pitch_y = self.tile_size + self.CAPTION_HEIGHT + self.PADDING
+        width = max(self.canvas.winfo_width(), int(self.canvas.cget('width')))
+        columns = max(1, width // pitch_x)
+        for index, (radar_id, radar_name) in enumerate(self.stations):
+            row, column = divmod(index, columns)
+            x, y = column * pitch_x + self.PADDING, row * pitch_y + self.PADDING
+            self.canvas.create_rectangle(x, y, x + self.tile_size, y + self.tile_size,
+                                         outline = 'lightgrey')
+            image_item = self.canvas.create_image(x, y, anchor = tk.NW)
+            caption_item = self.canvas.create_text(x, y + self.tile_size + 2, anchor = tk.NW,
+                                                   text = f"{radar_id} {radar_name}",
+                                                   font = ('Arial', 8), width = self.tile_size)
+            self._items[radar_id] = (image_item, caption_item, radar_name)
+            if self.latest_thumbnail is not None:
+                self._show_thumbnail(radar_id)
+        rows = math.ceil(len(self.stations) / columns)
+        self.canvas.configure(scrollregion = (0, 0, columns * pitch_x + self.PADDING,
+                                              rows * pitch_y + self.PADDING))
+
+    def _show_thumbnail(self, radar_id: str) -> None:
+        # Fills a tile with a thumbnail until its latest frame is drawn
+        thumbnail_file = self.latest_thumbnail(radar_id)
+        if thumbnail_file is None:
+            return
+        try:
+            self._images[radar_id] = tk.PhotoImage(file = thumbnail_file)
+        except tk.TclError as error:
+            print(f"Unable to show thumbnail {thumbnail_file}: {error}")
+            return
+        image_item, caption_item, radar_name = self._items[radar_id]
+        self.canvas.itemconfigure(image_item, image = self._images[radar_id])
+        self.canvas.itemconfigure(caption_item,
+                                  text = self._caption(radar_id, radar_name, os.path.basename(thumbnail_file)))
+
+    @staticmethod
+    def _caption(radar_id: str, radar_name: str, image_name: str) -> str:
+        timestamp = image_name.split('.')[2]
+        return f"{radar_id} {radar_name} {timestamp[8:10]}:{timestamp[10:12]}"
+
+    def show(self, radar_index) -> None:
+        '''
+        Loads the latest frame of every station in *radar_index* which its
+        tile is not already showing or loading.
+        '''
+        for radar_id, _ in self.stations:
+            timestamps = radar_index.frames(radar_id)
+            if not timestamps:
+                continue
+            image_name = f"{radar_id}.T.{timestamps[-1]}.png"
+            waiting = self._ready.get(radar_id)
+            if image_name in (self._shown.get(radar_id), self._loading.get(radar_id),
+                              waiting and waiting[0][0][0]):
+                continue
+            self._load(radar_id, image_name)
+
+    def show_new_frames(self, new_frames: list) -> None:
+        '''
+        Loads the newest of the new frames of each station in the grid, 
+        given as the NewFrame events of a listing refresh, so a refresh only
+        costs work for the stations which have published a new frame.
+        '''
+        latest = {}
+        for radar_id, timestamp in new_frames:
+            if radar_id in self._items and timestamp > latest.get(radar_id, ''):
+                latest[radar_id] = timestamp
+        for radar_id, timestamp in latest.items():
+            shown = self._shown.get(radar_id)
+            image_name = f"{radar_id}.T.{timestamp}.png"
+            if shown is None or image_name > shown:
+                self._load(radar_id, image_name)
+
+    def _load(self, radar_id: str, image_name: str) -> None:
+        layers = self.radar_layers(radar_id, image_name)
+        if self.composite_cache.has_radar(radar_id):
+            # Only the frame; its static layers are merged already
+            layers = layers[:1]
+        self._loading[radar_id] = image_name
+        self.task_runner.submit(f"{self.TASK_PREFIX}:{radar_id}", self.fetch_layers, layers,
+            on_done = lambda layer_data: self._loaded(radar_id, layers, layer_data),
+            on_error = lambda error: self._load_failed(radar_id, image_name, error))
+
+    def _loaded(self, radar_id: str, layers: tuple, layer_data: dict) -> None:
+        self._loading.pop(radar_id, None)
+        # Only the newest frame of each station waiting to be drawn is kept
+        self._ready.pop(radar_id, None)
+        self._ready[radar_id] = (layers, layer_data)
+        if self._draw_job is None:
+            self._draw_job = self.canvas.after_idle(self._draw)
+
+    def _load_failed(self, radar_id: str, image_name: str, error: Exception) -> None:
+        self._loading.pop(radar_id, None)
+        print(f"Unable to load radar image {image_name}: {error}")
+
+    def _draw(self) -> None:
+        # Draws waiting tiles until the budget is spent, then lets Tk handle
+        # its events before drawing the rest
+        self._draw_job = None
+        started = time.perf_counter()
+        while self._ready and time.perf_counter() - started < self.draw_budget:
+            radar_id, (layers, layer_data) = self._ready.popitem(last = False)
+            self._draw_tile(radar_id, layers, layer_data)
+        self.draw_seconds.append(time.perf_counter() - started)
+        if self._ready:
+            self._draw_job = self.canvas.after(1, self._draw)
+
+    def _draw_tile(self, radar_id: str, layers: tuple, layer_data: dict) -> None:
+        if radar_id not in self._items:
+            return
+        image_name = layers[0][0]
+        if not self.composite_cache.has_radar(radar_id):
+            if len(layers) == 1:
+                # The merged layers were dropped since the frame was asked
+                # for, so the static layers are needed again
+                self._load(radar_id, image_name)
+                return
+            _, background_name, rangemap_name, legend_name, _, locations_name = (
+                layer_name for layer_name, _, _ in layers)
+            self.composite_cache.add_radar(radar_id,
+                under_layers = [layer_data[background_name]],
+                over_layers = [layer_data[layer_name]
+                               for layer_name in (rangemap_name, legend_name, locations_name)
+                               if layer_name in layer_data])
+
+        image_item, caption_item, radar_name = self._items[radar_id]
+        # The tile's image is kept referenced, or Tk would blank it
+        self._images[radar_id] = self.composite_cache.compose(image_name, layer_data[image_name])
+        self._shown[radar_id] = image_name
+        self.canvas.itemconfigure(image_item, image = self._images[radar_id])
+        self.canvas.itemconfigure(caption_item, text = self._caption(radar_id, radar_name, image_name))
+        self.tiles_drawn += 1
+
+    def close(self) -> None:
+        '''
+        Stops loading and drawing tiles.
+        '''
+        if self._draw_job is not None:
+            self.canvas.after_cancel(self._draw_job)
+            self._draw_job = None
+        for radar_id in list(self._loading):
+            self.task_runner.cancel(f"{self.TASK_PREFIX}:{radar_id}")
+        self._loading.clear()
+        self._ready.clear()
@@ -0,0 +1,38 @@
+'''
+Headless core of the RainyDaze radar browser: the radar catalog, radar index
+parsing, layer downloads, event logging, offline archiving, a caching 
+proxy, rain statistics and thumbnails, with no Tk code, so that it can be scripted or driven by other front
+ends. "python -m radar_core" runs it from the command line.
+
+Submodules are only imported when one of their names is first used, which
+keeps "import radar_core" cheap.
+'''
+import importlib
+
+# Maps each public name to the submodule defining it
+_EXPORTS = {
+    'RadarCore': 'core',
+    'load_radars': 'catalog',
+    'RadarCatalog': 'catalog',
+    'radar_layers': 'catalog',
+    'frame_name': 'catalog',
+    'radar_range_km': 'catalog',
+    'prepare_database': 'event_log',
+    'apply_log_retention': 'event_log',
+    'generate_weather_report': 'event_log',
+    'RadarArchiver': 'archive',
+    'RadarProxy': 'proxy',
+    'RainScale': 'analytics',
+    'frame_statistics': 'analytics',
+    'FramePipeline': 'thumbnails',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'radar_core' has no attribute '{name}'")
+    value = getattr(importlib.import_module(f'radar_core.{_EXPORTS[name]}'), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,330 @@
+'''
+Command line mode of the radar browser.
+
+    python -m radar_core archive                     every station in the Radars table
+    python -m radar_core archive IDR023 IDR024       chosen stations
+    python -m radar_core archive --every 600         keep archiving new images
+    python -m radar_core proxy                       caching proxy for other copies
+    python -m radar_core stats IDR023 2024-05-16     rain statistics of archived images
+    python -m radar_core thumbnails                  thumbnails of new downloaded images
+    python -m radar_core stations melb               search the stations, grouped by site
+    python -m radar_core watch IDR023                print each new frame as it is listed
+'''
+import argparse
+import sys
+import time
+
+from radar_core.settings import (ARCHIVE_ATTEMPTS, ARCHIVE_CONNECTIONS_PER_HOST, ARCHIVE_DIR,
+                                 ARCHIVE_RETRY_SECONDS, ARCHIVE_WORKERS, BACKGROUND_URL,
+                                 DATABASE_NAME, FRAME_WEBHOOK_URL, MAX_SECONDS, PIPELINE_WORKERS,
+                                 PNG_COMPRESS_LEVEL, PROXY_CACHE_BYTES, PROXY_LISTING_SECONDS,
+                                 PROXY_PORT, RADAR_URL, RAIN_THRESHOLD, THUMBNAIL_DIR,
+                                 THUMBNAIL_SIZE)
+
+
+def archive_command(arguments: argparse.Namespace) -> int:
+    '''
+    Archives the radar images of the chosen stations, once or every
+    *arguments.every* seconds, and prints the throughput of each run.
+
+    Returns:
+    int: The exit status, 1 if any image could not be archived.
+    '''
+    from download_util import DownloadClient
+    from radar_core.archive import RadarArchiver
+    from radar_core.catalog import load_radars
+    from radar_core.event_log import prepare_database
+
+    known_ids = [radar_id for radar_id, _ in load_radars(arguments.database)]
+    radar_ids = arguments.stations or known_ids
+    unknown_ids = sorted(set(radar_ids) - set(known_ids))
+    if unknown_ids:
+        print(f"Unknown radar stations: {' '.join(unknown_ids)}", file=sys.stderr)
+        return 2
+
+    # Archived images are recorded in the Frames table
+    prepare_database(arguments.database)
+    client = DownloadClient(max_connections_per_host=arguments.connections,
+                            attempts=arguments.attempts, retry_seconds=arguments.retry_seconds)
+    archiver = RadarArchiver(client, arguments.radar_url, arguments.archive_dir, arguments.workers,
+                             arguments.database)
+    try:
+        while True:
+            stats = archiver.archive(radar_ids)
+            print(stats)
+            if not arguments.every:
+                return 1 if stats.failed else 0
+            time.sleep(arguments.every)
+    except KeyboardInterrupt:
+        # Whatever was archived so far is kept; the next run carries on
+        return 130
+    finally:
+        client.close()
+
+
+def proxy_command(arguments: argparse.Namespace) -> int:
+    '''
+    Runs the caching proxy until interrupted.
+
+    Returns:
+    int: The exit status.
+    '''
+    from radar_core.proxy import RadarProxy
+
+    proxy = RadarProxy((arguments.host, arguments.port), radar_url=arguments.radar_url,
+                       background_url=arguments.background_url,
+                       cache_bytes=arguments.cache_mb * 1024 * 1024,
+                       listing_seconds=arguments.listing_seconds)
+    print(f"Serving {proxy.base_url}/radar/ and {proxy.base_url}/radar_transparencies/, "
+          f"metrics at {proxy.base_url}/metrics")
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.server_close()
+        proxy.client.close()
+    return 0
+
+
+def stats_command(arguments: argparse.Namespace) -> int:
+    '''
+    Works out the rain statistics of one station's archived images of one
+    day, stores them in the FrameStats table and prints them.
+
+    Returns:
+    int: The exit status, 1 if no images of that day are archived.
+    '''
+    import glob
+    import os
+
+    from radar_core import analytics
+    from radar_core.archive import archive_path
+    from radar_core.event_log import prepare_database
+
+    day = arguments.date.replace('-', '')
+    folder = os.path.dirname(archive_path(arguments.archive_dir, arguments.station, day + '0000'))
+    file_names = sorted(glob.glob(os.path.join(folder, f'{arguments.station}.T.{day}*.png')))
+    if not file_names:
+        print(f"No archived images of {arguments.station} in {folder}", file=sys.stderr)
+        return 1
+
+    if arguments.legend:
+        with open(arguments.legend, 'rb') as legend_file:
+            scale = analytics.RainScale.from_legend(legend_file.read())
+    else:
+        scale = analytics.RainScale.default()
+
+    started = time.perf_counter()
+    frames = []
+    for file_name in file_names:
+        with open(file_name, 'rb') as image_file:
+            frames.append((os.path.basename(file_name).split('.')[2], image_file.read()))
+    stats = analytics.frame_statistics(arguments.station, frames, scale, arguments.threshold)
+    seconds = time.perf_counter() - started
+
+    prepare_database(arguments.database)
+    analytics.save_frame_stats(stats, arguments.threshold, arguments.database)
+    print(f"{'Time':<6} {'Rain %':>7} {'Max mm/h':>9} {'Mean mm/h':>10} "
+          f"{'>= ' + str(arguments.threshold) + ' mm/h km2':>18}")
+    for frame_stats in stats:
+        print(f"{frame_stats.timestamp[8:10]}:{frame_stats.timestamp[10:]} "
+              f"{frame_stats.coverage_percent:7.2f} {frame_stats.max_rate:9.1f} "
+              f"{frame_stats.mean_rate:10.2f} {frame_stats.heavy_area_km2:18.1f}")
+    print(f"{len(stats)} images analysed in {seconds:.2f} s")
+    return 0
+
+
+def thumbnails_command(arguments: argparse.Namespace) -> int:
+    '''
+    Makes thumbnails, and recompressed archive copies if an archive folder
+    is given, of every downloaded image in the Frames table not processed 
+    yet, and prints the throughput of each worker process.
+
+    Returns:
+    int: The exit status, 1 if any image could not be processed.
+    '''
+    import os
+
+    from radar_core import frames
+    from radar_core.event_log import prepare_database
+    from radar_core.thumbnails import FramePipeline
+
+    prepare_database(arguments.database)
+    downloaded = [row for row in frames.fetched_frames(arguments.stations, arguments.database)
+                  if os.path.exists(row[2])]
+    pipeline = FramePipeline(arguments.thumbnail_dir, arguments.archive_dir, arguments.size,
+                             arguments.level, arguments.workers)
+    stats = pipeline.run(downloaded)
+    if arguments.archive_dir:
+        # The archive copies outlast the layer cache, so they become the
+        # recorded paths of their images
+        from radar_core.archive import archive_path
+
+        archived = [(radar_id, timestamp, archive_path(arguments.archive_dir, radar_id, timestamp))
+                    for radar_id, timestamp, _ in downloaded]
+        frames.record_frames([frames.fetched_row(*row) for row in archived if os.path.exists(row[2])],
+                             arguments.database)
+    print(stats)
+    if stats.processed:
+        print(f"thumbnails {stats.thumbnail_bytes / 1e6:.1f} MB, "
+              f"archive copies {stats.archive_bytes / 1e6:.1f} MB")
+    return 1 if stats.failed else 0
+
+
+def stations_command(arguments: argparse.Namespace) -> int:
+    '''
+    Prints the stations matching a search, grouped by site with the range of
+    each product.
+
+    Returns:
+    int: The exit status, 1 if no station matches or the database has no
+         Radars table.
+    '''
+    import sqlite3
+
+    from radar_core.catalog import RadarCatalog, radar_range_km
+
+    try:
+        catalog = RadarCatalog.load(arguments.database)
+    except sqlite3.Error as error:
+        print(f"Unable to read the radar stations from {arguments.database}: {error} "
+              f"(create it with create_db.sql)", file=sys.stderr)
+        return 1
+    matches = catalog.search(' '.join(arguments.query))
+    for site_name, radar_ids in catalog.sites(matches):
+        products = ', '.join(f"{radar_id} ({radar_range_km(radar_id) or '?'} km)" for radar_id in radar_ids)
+        print(f"{site_name:<24} {products}")
+    print(f"{len(matches)} of {len(catalog)} stations")
+    return 0 if matches else 1
+
+
+def watch_command(arguments: argparse.Namespace) -> int:
+    '''
+    Refreshes the radar listing every *arguments.every* seconds until 
+    interrupted, printing each new frame of the chosen stations, logging
+    them and posting them to the webhook if one is given.
+
+    Returns:
+    int: The exit status.
+    '''
+    from radar_core.core import RadarCore
+    from radar_core.frame_events import FrameWebhook
+
+    watched = set(arguments.stations)
+
+    def print_new_frames(new_frames: list) -> None:
+        for radar_id, timestamp in new_frames:
+            if not watched or radar_id in watched:
+                print(f"New frame for {radar_id} at {timestamp[:4]}-{timestamp[4:6]}-{timestamp[6:8]} "
+                      f"{timestamp[8:10]}:{timestamp[10:]}", flush=True)
+
+    core = RadarCore(arguments.database, arguments.radar_url)
+    core.frame_events.subscribe("print", print_new_frames)
+    core.frame_events.subscribe("event_log", core.log_new_frames)
+    if arguments.webhook:
+        core.frame_events.subscribe("webhook", FrameWebhook(arguments.webhook))
+
+    core.download_radar_url()
+    core.radar_index()
+    refresher = core.listing_refresher(arguments.every)
+    refresher.start()
+    try:
+        while True:
+            core.set_radar_index(refresher.updates.get())
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        refresher.stop()
+        core.close()
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m radar_core',
+                                     description='RainyDaze radar browser without the window.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    archive = commands.add_parser('archive', help='mirror radar images into a dated folder tree')
+    archive.add_argument('stations', nargs='*', metavar='RADAR_ID',
+                         help='stations to archive, e.g. IDR023 (default: every station)')
+    archive.add_argument('--archive-dir', default=ARCHIVE_DIR, help='folder of the archive')
+    archive.add_argument('--workers', type=int, default=ARCHIVE_WORKERS,
+                         help='images downloaded at the same time')
+    archive.add_argument('--connections', type=int, default=ARCHIVE_CONNECTIONS_PER_HOST,
+                         help='connections to each host')
+    archive.add_argument('--attempts', type=int, default=ARCHIVE_ATTEMPTS,
+                         help='times each image is tried')
+    archive.add_argument('--retry-seconds', type=float, default=ARCHIVE_RETRY_SECONDS,
+                         help='longest wait before the first retry, doubled for each further retry')
+    archive.add_argument('--every', type=float, default=0,
+                         help='archive new images every this many seconds until interrupted')
+    archive.add_argument('--database', default=DATABASE_NAME, 
+                         help='database with the Radars and Frames tables')
+    archive.add_argument('--radar-url', default=RADAR_URL, help='folder the radar images come from')
+    archive.set_defaults(run=archive_command)
+
+    proxy = commands.add_parser('proxy', help='serve the radar folders to other copies over HTTP')
+    proxy.add_argument('--host', default='', help='address to listen on (default: every address)')
+    proxy.add_argument('--port', type=int, default=PROXY_PORT, help='port to listen on')
+    proxy.add_argument('--cache-mb', type=int, default=PROXY_CACHE_BYTES // (1024 * 1024),
+                       help='memory for cached radar images, in MB')
+    proxy.add_argument('--listing-seconds', type=float, default=PROXY_LISTING_SECONDS,
+                       help='seconds a folder listing is served before it is fetched again')
+    proxy.add_argument('--radar-url', default=RADAR_URL, help='upstream radar folder')
+    proxy.add_argument('--background-url', default=BACKGROUND_URL,
+                       help='upstream folder of static layers')
+    proxy.set_defaults(run=proxy_command)
+
+    stats = commands.add_parser('stats', help='rain statistics of one day of archived images')
+    stats.add_argument('station', metavar='RADAR_ID', help='station, e.g. IDR023')
+    stats.add_argument('date', help='day of the images, as YYYY-MM-DD')
+    stats.add_argument('--archive-dir', default=ARCHIVE_DIR, help='folder of the archive')
+    stats.add_argument('--legend', help='legend image to read the rain scale from '
+                       '(default: the BoM scale)')
+    stats.add_argument('--threshold', type=float, default=RAIN_THRESHOLD,
+                       help='rain rate in mm/h counted as heavy rain')
+    stats.add_argument('--database', default=DATABASE_NAME, 
+                       help='database the statistics are stored in')
+    stats.set_defaults(run=stats_command)
+
+    thumbnails = commands.add_parser('thumbnails', 
+                                     help='thumbnails and archive copies of downloaded images')
+    thumbnails.add_argument('stations', nargs='*', metavar='RADAR_ID',
+                            help='stations to process, e.g. IDR023 (default: every station)')
+    thumbnails.add_argument('--thumbnail-dir', default=THUMBNAIL_DIR, help='folder of the thumbnails')
+    thumbnails.add_argument('--archive-dir', 
+                            help='also keep recompressed copies of the images in this archive')
+    thumbnails.add_argument('--size', type=int, default=THUMBNAIL_SIZE,
+                            help='longest side of a thumbnail in pixels')
+    thumbnails.add_argument('--level', type=int, default=PNG_COMPRESS_LEVEL, 
+                            help='zlib level of the images written')
+    thumbnails.add_argument('--workers', type=int, default=PIPELINE_WORKERS, 
+                            help='worker processes (default: one per core)')
+    thumbnails.add_argument('--database', default=DATABASE_NAME, 
+                            help='database with the Frames table')
+    thumbnails.set_defaults(run=thumbnails_command)
+
+    stations = commands.add_parser('stations', help='search the radar stations')
+    stations.add_argument('query', nargs='*', 
+                          help='start of a radar ID or of words of the name, e.g. "melb 128" '
+                          '(default: every station)')
+    stations.add_argument('--database', default=DATABASE_NAME, help='database with the Radars table')
+    stations.set_defaults(run=stations_command)
+
+    watch = commands.add_parser('watch', help='print each new radar frame as it is listed')
+    watch.add_argument('stations', nargs='*', metavar='RADAR_ID',
+                       help='stations to print new frames of, e.g. IDR023 (default: every station)')
+    watch.add_argument('--every', type=float, default=MAX_SECONDS, 
+                       help='seconds between downloads of the listing')
+    watch.add_argument('--webhook', default=FRAME_WEBHOOK_URL,
+                       help='address every batch of new frames is posted to as JSON')
+    watch.add_argument('--database', default=DATABASE_NAME, help='database the events are logged to')
+    watch.add_argument('--radar-url', default=RADAR_URL, help='folder the radar listing comes from')
+    watch.set_defaults(run=watch_command)
+
+    arguments = parser.parse_args(argv)
+    return arguments.run(arguments)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+'''
+Rain intensity statistics of radar images. Each frame is decoded into
+rain rate bins, using the colour scale of the radar legend, and the pixels
+in each bin are counted; the counts of a batch of frames then give every
+frame's rain coverage, heaviest and mean rain rate and area of heavy rain
+at once.
+
+PNGs are decoded with Pillow when it is installed, and otherwise by a
+decoder built on zlib and NumPy. NumPy is needed either way, but only by
+this module: the rest of the radar browser runs without it.
+'''
+import io
+import struct
+import zlib
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("Rain statistics and thumbnails need NumPy, which is not installed; "
+                      "install it with \"pip install numpy\"") from error
+
+from radar_core import schema
+from radar_core.settings import DATABASE_NAME, RAIN_THRESHOLD
+
+# The colours of the BoM rain rate scale, lightest first, and the lowest
+# rain rate in mm/h each colour stands for
+BOM_RAIN_COLOURS = (
+    (245, 245, 255), (180, 180, 255), (120, 120, 255), (20, 20, 255), (0, 216, 195),
+    (0, 150, 144), (0, 102, 102), (255, 255, 0), (255, 200, 0), (255, 150, 0),
+    (255, 100, 0), (255, 0, 0), (200, 0, 0), (120, 0, 0), (40, 0, 0),
+)
+BOM_RAIN_RATES = (0.2, 0.5, 1.5, 2.5, 4.0, 6.0, 10.0, 15.0, 20.0, 35.0, 50.0, 80.0, 120.0,
+                  200.0, 300.0)
+
+# Kilometres covered by one pixel, by the last digit of the radar ID (the
+# 512, 256, 128 and 64 km products)
+KM_PER_PIXEL = {'1': 2.0, '2': 1.0, '3': 0.5, '4': 0.25}
+
+# Pixels of a colour a legend swatch has at least, so that the edges of
+# its text are not taken for swatches
+MIN_SWATCH_PIXELS = 20
+
+
+class FrameStats(NamedTuple):
+    '''
+    The rain statistics of one radar image.
+    '''
+    radar_id: str
+    timestamp: str
+    coverage_percent: float
+    max_rate: float
+    mean_rate: float
+    heavy_area_km2: float
+
+
+def _pack(colours: np.ndarray) -> np.ndarray:
+    # One integer per RGB colour, so colours can be compared as numbers
+    colours = colours.astype(np.uint32)
+    return (colours[..., 0] << 16) | (colours[..., 1] << 8) | colours[..., 2]
+
+
+class RainScale:
+    '''
+    The colours of a rain rate legend and the rain rate of each.
+
+    Parameters:
+    colours (sequence): RGB colours of the scale, lightest rain first.
+    rates (sequence): The lowest rain rate, in mm/h, of each colour.
+    '''
+    def __init__(self, colours, rates):
+        if len(colours) != len(rates):
+            raise ValueError(f"{len(colours)} colours but {len(rates)} rain rates")
+        self.colours = np.asarray(colours, dtype=np.uint8).reshape(-1, 3)
+        # Bin 0 is no rain; bin n is the n-th colour of the scale
+        self.rates = np.concatenate(([0.0], np.asarray(rates, dtype=np.float64)))
+        packed = _pack(self.colours)
+        self._order = np.argsort(packed)
+        self._sorted = packed[self._order]
+
+    @classmethod
+    def default(cls) -> 'RainScale':
+        '''
+        Returns the BoM rain rate scale.
+        '''
+        return cls(BOM_RAIN_COLOURS, BOM_RAIN_RATES)
+
+    @classmethod
+    def from_legend(cls, content: bytes, rates: tuple = BOM_RAIN_RATES) -> 'RainScale':
+        '''
+        Reads the colour scale from a legend image such as IDR.legend.1.png:
+        its coloured swatches, in order along the legend from the lightest
+        rain, are given *rates*.
+
+        Raises:
+        ValueError: If the legend does not have one swatch for each rate.
+        '''
+        pixels = decode_rgba(content)
+        opaque = pixels[..., 3] > 0
+        colours = pixels[..., :3]
+        # The background, border and text are shades of grey
+        coloured = opaque & ~((colours[..., 0] == colours[..., 1])
+                              & (colours[..., 1] == colours[..., 2]))
+        rows, columns = np.nonzero(coloured)
+        along = rows if pixels.shape[0] >= pixels.shape[1] else columns
+        packed = _pack(colours[rows, columns])
+        unique, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+        positions = np.bincount(inverse, weights=along) / counts
+        swatches = unique[counts >= MIN_SWATCH_PIXELS]
+        swatches = swatches[np.argsort(positions[counts >= MIN_SWATCH_PIXELS])]
+        if len(swatches) != len(rates):
+            raise ValueError(f"Found {len(swatches)} colours in the legend, "
+                             f"expected {len(rates)}")
+
+        swatch_colours = np.stack([(swatches >> 16) & 0xFF, (swatches >> 8) & 0xFF,
+                                   swatches & 0xFF], axis=1)
+        # Whichever end of the legend is lighter is the lightest rain
+        if swatch_colours[0].sum() < swatch_colours[-1].sum():
+            swatch_colours = swatch_colours[::-1]
+        return cls(swatch_colours, rates)
+
+    def bins(self, colours: np.ndarray) -> np.ndarray:
+        '''
+        Returns the rain rate bin of each RGB colour in *colours* (an array
+        whose last axis holds R, G and B): 0 for colours not on the scale, or
+        n for the n-th colour of the scale.
+        '''
+        packed = _pack(colours)
+        found = np.searchsorted(self._sorted, packed).clip(max=len(self._sorted) - 1)
+        matched = self._sorted[found] == packed
+        return np.where(matched, self._order[found] + 1, 0).astype(np.uint8)
+
+
+def _unfilter(raw: np.ndarray, height: int, stride: int, pixel_bytes: int) -> np.ndarray:
+    # Reverses the PNG filter of each scanline; see the PNG specification
+    lines = raw.reshape(height, stride + 1)
+    image = np.zeros((height, stride), dtype=np.uint8)
+    previous = np.zeros(stride, dtype=np.uint8)
+    for number in range(height):
+        kind, line = lines[number, 0], lines[number, 1:]
+        if kind == 0:
+            current = line
+        elif kind == 1:
+            current = line.reshape(-1, pixel_bytes).cumsum(axis=0, dtype=np.uint8).reshape(-1)
+        elif kind == 2:
+            current = line + previous
+        else:
+            # Average and Paeth depend on the byte just decoded, so are done
+            # one byte at a time
+            current = line.astype(np.int32)
+            above = previous.astype(np.int32)
+            for index in range(stride):
+                left = current[index - pixel_bytes] if index >= pixel_bytes else 0
+                if kind == 3:
+                    current[index] = (current[index] + (left + above[index]) // 2) & 0xFF
+                else:
+                    upper_left = above[index - pixel_bytes] if index >= pixel_bytes else 0
+                    estimate = left + above[index] - upper_left
+                    distances = (abs(estimate - left), abs(estimate - above[index]),
+                                 abs(estimate - upper_left))
+                    predictor = (left, above[index], upper_left)[distances.index(min(distances))]
+                    current[index] = (current[index] + predictor) & 0xFF
+            current = current.astype(np.uint8)
+        image[number] = current
+        previous = image[number]
+    return image
+
+
+def _read_png(content: bytes) -> tuple:
+    # Decodes an 8 bit, non-interlaced PNG without Pillow; see decode_png
+    if content[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError("Not a PNG file")
+    position, data, palette, transparency = 8, [], None, None
+    while position < len(content):
+        length, kind = struct.unpack('>I4s', content[position:position + 8])
+        chunk = content[position + 8:position + 8 + length]
+        if kind == b'IHDR':
+            width, height, depth, colour_type, _, _, interlace = struct.unpack('>IIBBBBB', chunk)
+        elif kind == b'PLTE':
+            palette = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, 3)
+        elif kind == b'tRNS':
+            transparency = np.frombuffer(chunk, dtype=np.uint8)
+        elif kind == b'IDAT':
+            data.append(chunk)
+        position += length + 12
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[colour_type]
+    if depth != 8 or interlace:
+        raise ValueError("Only 8 bit, non-interlaced PNGs can be decoded without Pillow")
+
+    raw = np.frombuffer(zlib.decompress(b''.join(data)), dtype=np.uint8)
+    pixels = _unfilter(raw, height, width * channels, channels).reshape(height, width, channels)
+    if colour_type == 3:
+        alpha = np.full(len(palette), 255, dtype=np.uint8)
+        if transparency is not None:
+            alpha[:len(transparency)] = transparency
+        return pixels[..., 0], np.concatenate((palette, alpha[:, None]), axis=1)
+    if colour_type == 6:
+        return None, pixels
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[..., :3] = pixels[..., :1] if colour_type in (0, 4) else pixels
+    rgba[..., 3] = pixels[..., 1] if colour_type == 4 else 255
+    return None, rgba
+
+
+def decode_png(content: bytes) -> tuple:
+    '''
+    Decodes a PNG, keeping palette images as palette indices so that each 
+    palette colour only needs looking at once.
+
+    Returns:
+    tuple: (palette indices, RGBA palette) for a palette PNG, arrays of 
+           shape (height, width) and (colours, 4), or (None, RGBA pixels)
+           for any other PNG
+    '''
+    try:
+        from PIL import Image
+    except ImportError:
+        return _read_png(content)
+    with Image.open(io.BytesIO(content)) as image:
+        if image.mode != 'P':
+            return None, np.asarray(image.convert('RGBA'))
+        indices = np.asarray(image)
+        palette = np.asarray(image.getpalette() or [], dtype=np.uint8).reshape(-1, 3)
+        alpha = np.full(len(palette), 255, dtype=np.uint8)
+        transparency = image.info.get('transparency')
+        if isinstance(transparency, bytes):
+            alpha[:len(transparency)] = np.frombuffer(transparency, dtype=np.uint8)[:len(palette)]
+        elif isinstance(transparency, int) and transparency < len(palette):
+            alpha[transparency] = 0
+        return indices, np.concatenate((palette, alpha[:, None]), axis=1)
+
+
+def decode_rgba(content: bytes) -> np.ndarray:
+    '''
+    Decodes a PNG into an array of shape (height, width, 4) of RGBA pixels.
+    '''
+    indices, colours = decode_png(content)
+    return colours if indices is None else colours[indices]
+
+
+def _colour_bins(colours: np.ndarray, scale: RainScale) -> np.ndarray:
+    # The bin of each RGBA colour; transparent colours are no rain
+    return np.where(colours[..., 3] > 0, scale.bins(colours[..., :3]), 0).astype(np.uint8)
+
+
+def decode_bins(content: bytes, scale: RainScale) -> np.ndarray:
+    '''
+    Decodes a radar image into an array of shape (height, width) holding the
+    rain rate bin of each pixel. Palette images are mapped through their
+    palette, so each palette colour is looked up only once.
+    '''
+    indices, colours = decode_png(content)
+    if indices is None:
+        return _colour_bins(colours, scale)
+    return _colour_bins(colours, scale)[indices]
+
+
+def bin_counts(content: bytes, scale: RainScale) -> np.ndarray:
+    '''
+    Returns the number of pixels of a radar image in each rain rate bin. For
+    palette images the palette entries are counted and then added up by 
+    bin, so no array of bins is made.
+    '''
+    bin_total = len(scale.rates)
+    indices, colours = decode_png(content)
+    if indices is None:
+        return np.bincount(_colour_bins(colours, scale).ravel(), minlength=bin_total)
+    entry_counts = np.bincount(indices.ravel(), minlength=len(colours))[:len(colours)]
+    return np.bincount(_colour_bins(colours, scale), weights=entry_counts,
+                       minlength=bin_total).astype(np.int64)
+
+
+def frame_statistics(radar_id: str, frames: list, scale: RainScale,
+                     threshold: float = RAIN_THRESHOLD) -> list:
+    '''
+    Works out the rain statistics of radar images of one radar. Each image
+    is decoded into counts of pixels by rain rate bin, and the statistics 
+    of every image are then worked out together from the counts.
+
+    Parameters:
+    radar_id: The radar ID, e.g. "IDR023", which sets the area of a pixel
+    frames: (timestamp, PNG content) of each image
+    scale: The colour scale the images are drawn with
+    threshold: The rain rate, in mm/h, counted as heavy rain
+
+    returns:
+    list: A FrameStats for each image, in the order given
+    '''
+    if not frames:
+        return []
+    pixel_km2 = KM_PER_PIXEL.get(radar_id[-1], 1.0) ** 2
+    bin_total = len(scale.rates)
+    counts = np.stack([bin_counts(content, scale) for _, content in frames])
+
+    pixels = counts.sum(axis=1)
+    raining = counts[:, 1:].sum(axis=1)
+    coverage = 100.0 * raining / pixels
+    mean_rate = np.divide(counts @ scale.rates, raining, out=np.zeros(len(frames)),
+                          where=raining > 0)
+    # The highest bin with any pixels in it
+    top_bin = bin_total - 1 - np.argmax(counts[:, ::-1] > 0, axis=1)
+    max_rate = np.where(raining > 0, scale.rates[top_bin], 0.0)
+    heavy_area = counts[:, scale.rates >= threshold].sum(axis=1) * pixel_km2
+    return [FrameStats(radar_id, timestamp, *values) for (timestamp, _), *values in
+            zip(frames, coverage.tolist(), max_rate.tolist(), mean_rate.tolist(),
+                heavy_area.tolist())]
+
+
+def save_frame_stats(stats: list, threshold: float = RAIN_THRESHOLD,
+                     database_name: str = DATABASE_NAME) -> None:
+    '''
+    Stores FrameStats in the FrameStats table, replacing any already stored
+    for the same images.
+    '''
+    import sqlite3
+
+    connection = sqlite3.connect(database_name)
+    try:
+        with connection:
+            connection.executemany(schema.INSERT_FRAME_STATS,
+                                   [(*frame_stats, threshold) for frame_stats in stats])
+    finally:
+        connection.close()
+
+
+def load_frame_stats(radar_id: str, start: str = None, end: str = None,
+                     threshold: float = RAIN_THRESHOLD,
+                     database_name: str = DATABASE_NAME) -> list:
+    '''
+    Reads the stored FrameStats of a radar's images, oldest first.
+
+    Parameters:
+    radar_id: The radar ID, e.g. "IDR023"
+    start: Only images at or after this timestamp ("YYYYMMDDhhmm")
+    end: Only images before this timestamp
+    threshold: Only statistics worked out with this heavy rain threshold
+    '''
+    import sqlite3
+
+    connection = sqlite3.connect(database_name)
+    try:
+        rows = connection.execute(schema.SELECT_FRAME_STATS,
+                                  (radar_id, threshold, start or '', end or '99999999999999'))
+        return [FrameStats(*row) for row in rows]
+    finally:
+        connection.close()
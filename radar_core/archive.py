@@ -0,0 +1,167 @@
+'''
+Mirrors radar images into a dated folder tree for offline use, without the
+window.
+'''
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from radar_core import frames
+from radar_core.catalog import frame_name
+from radar_core.settings import ARCHIVE_DIR, ARCHIVE_WORKERS, RADAR_URL
+
+
+def archive_path(archive_dir: str, radar_id: str, timestamp: str) -> str:
+    '''
+    Returns where a radar image is archived, e.g.
+    "radar_archive/IDR023/2024/05/16/IDR023.T.202405161124.png" for radar
+    "IDR023" at timestamp "202405161124".
+    '''
+    return os.path.join(archive_dir, radar_id, timestamp[:4], timestamp[4:6], timestamp[6:8],
+                        frame_name(radar_id, timestamp))
+
+
+class ArchiveStats:
+    '''
+    Counts what one archive run did.
+    '''
+    def __init__(self):
+        self.archived = 0
+        self.skipped = 0
+        self.failed = []
+        self.missing = []
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def add(self, archived_bytes: int) -> None:
+        self.archived += 1
+        self.bytes += archived_bytes
+
+    def add_failure(self, image_name: str, missing: bool = False) -> None:
+        # Missing images are those the server confirmed it does not have
+        self.failed.append(image_name)
+        if missing:
+            self.missing.append(image_name)
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.archived / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"archived {self.archived} frames ({self.bytes / 1e6:.1f} MB) in "
+                f"{self.seconds:.1f} s, {self.frames_per_second:.1f} frames/s; "
+                f"{self.skipped} already archived, {len(self.failed)} failed")
+
+
+class RadarArchiver:
+    '''
+    Downloads every radar image of the chosen stations which is not archived
+    yet. Images are downloaded by a fixed number of threads sharing one
+    DownloadClient, which also limits the connections to each host and 
+    retries failed downloads with a growing delay. Each
+    image is streamed to a temporary file and renamed once complete, so an
+    interrupted run can simply be started again: images already archived are
+    skipped and partly written ones are downloaded again.
+
+    Parameters:
+    client (DownloadClient): Downloads the listing and the images.
+    radar_url (str): The folder radar images and the radar listing come from.
+    archive_dir (str): The folder the archive is kept in.
+    workers (int): Images downloaded at the same time.
+    database_name (str): If given, each run records the images listed, 
+        archived and failed in the Frames table of this database.
+    '''
+    def __init__(self, client, radar_url: str = RADAR_URL, archive_dir: str = ARCHIVE_DIR,
+                 workers: int = ARCHIVE_WORKERS, database_name: str = None):
+        self.client = client
+        self.radar_url = radar_url
+        self.archive_dir = archive_dir
+        self.workers = workers
+        self.database_name = database_name
+
+    def radar_index(self):
+        '''
+        Downloads and parses the listing of the radar folder.
+        '''
+        from index_util import RadarIndex
+
+        return RadarIndex.parse(self.client.download_bytes(self.radar_url).decode('UTF-8'))
+
+    def pending_frames(self, radar_index, radar_ids: list) -> list:
+        '''
+        Returns the (radar ID, timestamp) of every image of *radar_ids* in
+        *radar_index* which is not archived yet.
+        '''
+        return [(radar_id, timestamp)
+                for radar_id in radar_ids
+                for timestamp in radar_index.frames(radar_id)
+                if not os.path.exists(archive_path(self.archive_dir, radar_id, timestamp))]
+
+    def _archive_frame(self, radar_id: str, timestamp: str) -> int:
+        # Downloads one image and returns its size
+        image_name = frame_name(radar_id, timestamp)
+        file_name = archive_path(self.archive_dir, radar_id, timestamp)
+        return self.client.download_file(f"{self.radar_url}/{image_name}", file_name)
+
+    def frame_rows(self, radar_index, radar_ids: list, missing: list) -> list:
+        '''
+        Returns a Frames row for every image of *radar_ids* in *radar_index*:
+        fetched to its archive path if archived, failed if its name is in
+        *missing*, and otherwise only listed. Only images the server said it
+        does not have are marked failed; those which failed for any other
+        reason, such as a timeout, stay listed so they are tried again.
+        '''
+        missing = set(missing)
+        rows = []
+        for radar_id in radar_ids:
+            for timestamp in radar_index.frames(radar_id):
+                file_name = archive_path(self.archive_dir, radar_id, timestamp)
+                if os.path.exists(file_name):
+                    rows.append(frames.fetched_row(radar_id, timestamp, file_name))
+                elif frame_name(radar_id, timestamp) in missing:
+                    rows.append((radar_id, timestamp, None, None, frames.FAILED))
+                else:
+                    rows.append((radar_id, timestamp, None, None, frames.LISTED))
+        return rows
+
+    def archive(self, radar_ids: list, radar_index=None, progress=None) -> ArchiveStats:
+        '''
+        Archives every image of *radar_ids* which is not archived yet.
+
+        Parameters:
+        radar_ids (list): The stations to archive, e.g. ["IDR023", "IDR024"].
+        radar_index (RadarIndex): The images available; the listing is
+            downloaded when not given.
+        progress: Called with the ArchiveStats after each image, if given.
+
+        Returns:
+        ArchiveStats: What was archived, skipped and failed.
+        '''
+        from download_util import is_missing
+
+        stats = ArchiveStats()
+        start = time.perf_counter()
+        if radar_index is None:
+            radar_index = self.radar_index()
+
+        pending = self.pending_frames(radar_index, radar_ids)
+        stats.skipped = sum(len(radar_index.frames(radar_id)) for radar_id in radar_ids) - len(pending)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._archive_frame, radar_id, timestamp):
+                       frame_name(radar_id, timestamp) for radar_id, timestamp in pending}
+            for future in as_completed(futures):
+                try:
+                    stats.add(future.result())
+                except OSError as error:
+                    # URLError is an OSError too
+                    print(f"Unable to archive {futures[future]}: {error}")
+                    stats.add_failure(futures[future], is_missing(error))
+                if progress is not None:
+                    progress(stats)
+
+        if self.database_name is not None:
+            frames.record_frames(self.frame_rows(radar_index, radar_ids, stats.missing), 
+                                 self.database_name)
+        stats.seconds = time.perf_counter() - start
+        return stats
@@ -0,0 +1,184 @@
+'''
+The radar stations and the layer files making up each radar image.
+'''
+import bisect
+import re
+
+from radar_core.settings import BACKGROUND_URL, DATABASE_NAME, RADAR_URL
+from radar_core.schema import SELECT_RADAR_INFO
+
+
+def load_radars(database_name: str = DATABASE_NAME) -> list:
+    '''
+    Reads every radar station from the Radars table.
+
+    Returns:
+    list: A list of tuples where each tuple contains (RadarId, RadarName).
+    '''
+    import sqlite3
+
+    connection = sqlite3.connect(database_name)
+    try:
+        return connection.execute(SELECT_RADAR_INFO).fetchall()
+    finally:
+        connection.close()
+
+
+# Range in km of each radar product, by the last digit of the radar ID
+RADAR_RANGES_KM = {'1': 512, '2': 256, '3': 128, '4': 64}
+
+
+def radar_range_km(radar_id: str) -> int:
+    '''
+    Returns the range in km of a radar product, e.g. 128 for "IDR023", or 
+    None for a product without a range such as a Doppler wind image.
+    '''
+    return RADAR_RANGES_KM.get(radar_id[-1:])
+
+
+class RadarCatalog:
+    '''
+    Every radar station, held in sorted lists and searchable as the user 
+    types. Each station is indexed under the lower case tokens of its radar
+    ID ("idr023" and "023") and of its name ("melbourne", "128", "km"). A
+    query matches the stations having, for every word of the query, a token
+    starting with that word, so "melb 128" finds "Melbourne (128 km)" and 
+    "IDR02" every Melbourne product. The tokens are kept sorted, so the 
+    tokens starting with a word are found by bisection.
+
+    Stations are also grouped by site: the products of one radar differ
+    only in the last digit of their ID, which gives the range.
+
+    Parameters:
+    radars (list): (RadarId, RadarName) of every station, as load_radars 
+        returns.
+    '''
+    TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+    def __init__(self, radars: list):
+        radars = sorted(radars)
+        self.radar_ids = [radar_id for radar_id, _ in radars]
+        self.radar_names = [radar_name for _, radar_name in radars]
+        self._positions = {radar_id: position for position, radar_id in enumerate(self.radar_ids)}
+
+        postings = {}
+        for position, (radar_id, radar_name) in enumerate(radars):
+            text = f"{radar_id} {radar_id[3:]} {radar_name}".lower()
+            for token in set(self.TOKEN_PATTERN.findall(text)):
+                postings.setdefault(token, []).append(position)
+        self._tokens = sorted(postings)
+        self._postings = [frozenset(postings[token]) for token in self._tokens]
+
+        self._sites = {}
+        for radar_id in self.radar_ids:
+            self._sites.setdefault(radar_id[:-1], []).append(radar_id)
+
+    @classmethod
+    def load(cls, database_name: str = DATABASE_NAME) -> 'RadarCatalog':
+        '''
+        Builds the catalog from the Radars table.
+        '''
+        return cls(load_radars(database_name))
+
+    def __len__(self) -> int:
+        return len(self.radar_ids)
+
+    def __contains__(self, radar_id: str) -> bool:
+        return radar_id in self._positions
+
+    def __iter__(self):
+        return iter(zip(self.radar_ids, self.radar_names))
+
+    def name(self, radar_id: str) -> str:
+        '''
+        Returns the name of a station, e.g. "Melbourne (128 km)".
+        '''
+        return self.radar_names[self._positions[radar_id]]
+
+    def _matching(self, word: str) -> set:
+        # Positions of the stations having a token starting with *word*
+        start = bisect.bisect_left(self._tokens, word)
+        end = bisect.bisect_left(self._tokens, word + '\x7f', start)
+        if end - start == 1:
+            return self._postings[start]
+        return set().union(*self._postings[start:end])
+
+    def search(self, query: str) -> list:
+        '''
+        Returns the radar IDs of the stations matching every word of 
+        *query*, in radar ID order; every station for a blank query.
+        '''
+        words = self.TOKEN_PATTERN.findall(query.lower())
+        if not words:
+            return list(self.radar_ids)
+        # The rarest word first, so the intersections stay small
+        matches = sorted((self._matching(word) for word in words), key=len)
+        found = set(matches[0])
+        for match in matches[1:]:
+            found &= match
+            if not found:
+                return []
+        return [self.radar_ids[position] for position in sorted(found)]
+
+    def site_name(self, radar_id: str) -> str:
+        '''
+        Returns the name of a station without its range, e.g. "Melbourne".
+        '''
+        return re.sub(r'\s*\(\d+ km\)$', '', self.name(radar_id))
+
+    def variants(self, radar_id: str) -> list:
+        '''
+        Returns the radar IDs of every product of the site of *radar_id*,
+        including itself, widest range first.
+        '''
+        return list(self._sites.get(radar_id[:-1], ()))
+
+    def sites(self, radar_ids: list = None) -> list:
+        '''
+        Groups stations by site.
+
+        Parameters:
+        radar_ids (list): The stations to group; every station if not given.
+
+        Returns:
+        list: (site name, [radar ID of each product, widest range first]) 
+            of each site, in radar ID order.
+        '''
+        grouped = {}
+        for radar_id in (self.radar_ids if radar_ids is None else radar_ids):
+            grouped.setdefault(radar_id[:-1], []).append(radar_id)
+        return [(self.site_name(products[0]), products) for products in grouped.values()]
+
+
+def frame_name(radar_id: str, timestamp: str) -> str:
+    '''
+    Returns the file name of a radar image, e.g. "IDR023.T.202405161124.png"
+    for radar "IDR023" at timestamp "202405161124".
+    '''
+    return f"{radar_id}.T.{timestamp}.png"
+
+
+def radar_layers(radar_id: str, image_name: str, radar_url: str = RADAR_URL, 
+                 background_url: str = BACKGROUND_URL) -> tuple:
+    '''
+    Lists every layer needed to display one radar image.
+
+    Parameters:
+    radar_id: The radar ID, e.g. "IDR023"
+    image_name: The file name of the radar image, e.g. "IDR023.T.202405161124.png"
+    radar_url: The folder radar images are downloaded from
+    background_url: The folder the static layers are downloaded from
+
+    returns:
+    tuple: (layer name, link it is downloaded from, whether downloading it is
+           logged) for the radar image, background, range map, both legends
+           and the cities overlay
+    '''
+    return (
+        (image_name, radar_url, True),
+        (f"{radar_id}.background.png", background_url, False),
+        (f"{radar_id}.range.png", background_url, True),
+        (f"IDR.legend.1.png", background_url, True),
+        (f"IDR.legend.2.png", background_url, True),
+        (f"{radar_id}.locations.png", background_url, True),
+    )
@@ -0,0 +1,540 @@
+'''
+The RadarCore class, which holds the state of a radar browser session.
+'''
+import datetime
+import os
+import os.path as path
+import shutil
+import sqlite3
+import threading
+
+import metrics_util
+
+from radar_core import catalog, frames, schema
+from radar_core.event_log import generate_weather_report, prepare_database
+from radar_core.settings import (ARCHIVE_DIR, BACKGROUND_URL, CACHE_DIR, CACHE_MAX_BYTES, 
+                                 DATABASE_NAME, INDEX_FILE_NAME, KEEP_FETCHED_FRAMES, MAX_SECONDS,
+                                 RADAR_FILE_NAME, RADAR_URL, RAIN_THRESHOLD)
+
+
+class RadarCore:
+    '''
+    Everything a radar browser session needs apart from its window: pooled
+    downloads, the layer cache, the event logger, the parsed radar index and
+    the Frames table recording every radar image listed or fetched. With
+    *keep_frames*, radar images downloaded are also kept in the archive 
+    folder, since the layer cache may remove them long before they are 
+    wanted again; images archived there by RadarArchiver are used either way.
+    Nothing is opened, read or downloaded until it is first used, so creating
+    a RadarCore is instant. The slow operations (refresh_listings, radars, 
+    fetch_layers, load_frame, analyse_frames, generate_report) are safe to 
+    call from worker threads.
+
+    Parameters:
+    database_name (str): The SQLite database holding the Radars and Log tables.
+    radar_url (str): The folder radar images and the radar listing come from.
+    background_url (str): The folder static layers come from.
+    cache_dir (str): The folder of the layer cache.
+    cache_max_bytes (int): The byte budget of the layer cache.
+    archive_dir (str): The archive folder, laid out as by RadarArchiver.
+    keep_frames (bool): Whether radar images downloaded are copied to the 
+        archive folder. It has no size limit, so this is off by default.
+    '''
+    def __init__(self, database_name: str = DATABASE_NAME, radar_url: str = RADAR_URL,
+                 background_url: str = BACKGROUND_URL, cache_dir: str = CACHE_DIR,
+                 cache_max_bytes: int = CACHE_MAX_BYTES, archive_dir: str = ARCHIVE_DIR,
+                 keep_frames: bool = KEEP_FETCHED_FRAMES):
+        self.database_name = database_name
+        self.radar_url = radar_url
+        self.background_url = background_url
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.archive_dir = archive_dir
+        self.keep_frames = keep_frames
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        # Held while the radar index is replaced and compared with the one 
+        # before, so each new frame is recorded and published once
+        self._index_lock = threading.Lock()
+        self._schema_ready = False
+        self._download_client = None
+        self._layer_cache = None
+        self._event_logger = None
+        self._frame_events = None
+        self._fetch_events = None
+        self._radar_index = None
+        self._radar_index_mtime = None
+        self._rain_scale = None
+        self._radar_catalog = None
+
+    @property
+    def download_client(self):
+        with self._lock:
+            if self._download_client is None:
+                from download_util import DownloadClient
+                self._download_client = DownloadClient()
+            return self._download_client
+
+    @property
+    def layer_cache(self):
+        with self._lock:
+            if self._layer_cache is None:
+                from download_util import LayerCache
+                self._layer_cache = LayerCache(self.cache_dir, self.cache_max_bytes)
+            return self._layer_cache
+
+    @property
+    def event_logger(self):
+        with self._lock:
+            if self._event_logger is None:
+                from db_util import EventLogger
+                # The schema is migrated on the logger's own thread before the
+                # first write, so logging never waits for it
+                self._event_logger = EventLogger(self.database_name, schema.INSERT_LOG_INFO,
+                                                 prepare=lambda _: self._prepare_database())
+            return self._event_logger
+
+    def _record_frame(self, *row) -> None:
+        # Rows of the Frames table go through the event logger, so the 
+        # database has one writer and they are batched like events
+        self.event_logger.log_row(schema.RECORD_FRAME, row, counter='frames_recorded_total')
+
+    @property
+    def frame_events(self):
+        '''
+        The FrameEventBus on which the frames new in each refreshed radar 
+        listing are published.
+        '''
+        with self._lock:
+            if self._frame_events is None:
+                from radar_core.frame_events import FrameEventBus
+                self._frame_events = FrameEventBus()
+            return self._frame_events
+
+    @property
+    def fetch_events(self):
+        '''
+        The FrameEventBus on which the radar images downloaded are published,
+        as NewFrame events, once they are in the layer cache (and, with
+        keep_frames, the archive folder); see frame_path.
+        '''
+        with self._lock:
+            if self._fetch_events is None:
+                from radar_core.frame_events import FrameEventBus
+                self._fetch_events = FrameEventBus('frames_fetched_total')
+            return self._fetch_events
+
+    def _prepare_database(self) -> None:
+        # Migrates the schema once per session, whichever thread needs it 
+        # first; the others wait for it rather than migrating at the same time
+        with self._schema_lock:
+            if not self._schema_ready:
+                prepare_database(self.database_name)
+                self._schema_ready = True
+
+    def log_event(self, event: str, details: str) -> None:
+        '''
+        Logs an event to the Log table. The event is queued and written in a 
+        batch shortly afterwards.
+
+        Parameters:
+        event: Type of the event
+        details: Details of the event
+        '''
+        time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.event_logger.log(event, time, details)
+
+    def radars(self) -> list:
+        '''
+        Returns every radar station as a (RadarId, RadarName) tuple.
+        '''
+        return catalog.load_radars(self.database_name)
+
+    def radar_catalog(self) -> catalog.RadarCatalog:
+        '''
+        Returns the searchable catalog of every radar station, read from the 
+        Radars table the first time it is needed.
+        '''
+        with self._lock:
+            if self._radar_catalog is None:
+                self._radar_catalog = catalog.RadarCatalog.load(self.database_name)
+            return self._radar_catalog
+
+    def _download_listing(self, url: str, file_name: str) -> None:
+        if path.exists(file_name):
+            # get the last modified time of the file
+            last_modified_time = path.getmtime(file_name)
+            current_time = datetime.datetime.now().timestamp()
+
+            # check if the file is older than MAX_SECONDS
+            if current_time - last_modified_time <= MAX_SECONDS:
+                print(f"{file_name} is up to date at {current_time}")
+                return
+
+        # If the file does not exist or is out of date, download a new copy
+        self.download_client.download_file(url, file_name)
+        print(f"{path.getsize(file_name)} bytes saved to {file_name}")
+
+    def download_radar_url(self) -> None:
+        '''
+        Downloads the radar index file if it does not exist or is older than 
+        MAX_SECONDS.
+        '''
+        self._download_listing(self.radar_url, INDEX_FILE_NAME)
+
+    def download_radar_transparencies_url(self) -> None:
+        '''
+        Downloads the image index file if it does not exist or is older than 
+        MAX_SECONDS.
+        '''
+        self._download_listing(self.background_url, RADAR_FILE_NAME)
+
+    def refresh_listings(self) -> None:
+        '''
+        Downloads both listings if they are out of date.
+        '''
+        self.download_radar_url()
+        self.download_radar_transparencies_url()
+
+    def radar_index(self):
+        '''
+        Returns the parsed radar index file. The file is only parsed again 
+        when it has been refreshed since the last call, by whichever thread
+        asks first.
+        '''
+        from index_util import RadarIndex
+
+        with self._index_lock:
+            modified_time = path.getmtime(INDEX_FILE_NAME)
+            if self._radar_index is None or modified_time != self._radar_index_mtime:
+                previous_index = self._radar_index
+                self._radar_index = RadarIndex.load(INDEX_FILE_NAME)
+                self._radar_index_mtime = modified_time
+                self._listing_changed(self._radar_index, previous_index)
+            return self._radar_index
+
+    def set_radar_index(self, radar_index):
+        '''
+        Replaces the parsed radar index with one parsed from a listing just 
+        saved to the radar index file, e.g. by a ListingRefresher.
+
+        Returns:
+        RadarIndex: The index it replaces, or None if none was parsed yet.
+        '''
+        with self._index_lock:
+            previous_index = self._radar_index
+            if radar_index is previous_index:
+                return previous_index
+            self._radar_index = radar_index
+            self._radar_index_mtime = path.getmtime(INDEX_FILE_NAME)
+            self._listing_changed(radar_index, previous_index)
+            return previous_index
+
+    def _listing_changed(self, radar_index, previous_index) -> None:
+        # The listing is compared with the previous one once, and only the
+        # new frames go on: each is recorded in the Frames table and, unless
+        # this is the first listing, published as a new frame. Called with 
+        # _index_lock held
+        from index_util import RadarIndex
+
+        new_frames = radar_index.new_frames(previous_index or RadarIndex({}))
+        for row in frames.listed_rows(new_frames):
+            self._record_frame(*row)
+        if previous_index is not None:
+            self.frame_events.publish(new_frames)
+
+    def log_new_frames(self, new_frames: list) -> None:
+        '''
+        Logs one event for a batch of new frames; a FrameEventBus handler.
+        '''
+        radar_ids = sorted({new_frame.radar_id for new_frame in new_frames})
+        self.log_event("NewFrames", f"{len(new_frames)} new frames from {len(radar_ids)} radars: "
+                                    f"{' '.join(radar_ids[:20])}{' ...' if len(radar_ids) > 20 else ''}")
+
+    def _fetch_files(self, downloads: list, errors: dict = None) -> dict:
+        '''
+        Returns the local path of each (url, name) in *downloads*. Radar 
+        images not in the layer cache are read from where the Frames table 
+        says they are kept, if the file is still there, since older images
+        can no longer be downloaded; anything else is downloaded into the 
+        layer cache. Radar images downloaded are published on fetch_events 
+        and, with keep_frames, copied to the archive folder and recorded with
+        that path; those found missing are recorded as failed. If *errors* 
+        is given, files which cannot be downloaded are left out and their 
+        errors stored there by name; see LayerCache.fetch.
+        '''
+        from download_util import is_missing
+        from index_util import NewFrame, RadarIndex
+
+        wanted = {}
+        for url, name in downloads:
+            match = RadarIndex.FRAME_PATTERN.fullmatch(name)
+            if match and self.layer_cache.path(name) is None:
+                wanted[name] = match
+        stored_paths = {}
+        try:
+            by_radar = {}
+            for match in wanted.values():
+                by_radar.setdefault(match.group(1), []).append(match.group(2))
+            for radar_id, timestamps in by_radar.items():
+                for timestamp, frame_path in frames.frame_paths(radar_id, timestamps, 
+                                                                self.database_name).items():
+                    if path.exists(frame_path):
+                        stored_paths[catalog.frame_name(radar_id, timestamp)] = frame_path
+        except sqlite3.Error:
+            # The Frames table is not made until the schema is migrated
+            pass
+
+        # Download every missing file at the same time over pooled connections
+        failures = {}
+        file_paths = self.layer_cache.fetch(self.download_client, 
+            [(url, name) for url, name in downloads if name not in stored_paths], failures)
+        downloaded = []
+        for name, file_path in file_paths.items():
+            match = wanted.get(name)
+            if match is None:
+                continue
+            if self.keep_frames:
+                self._keep_frame(*match.groups(), file_path)
+            downloaded.append(NewFrame(*match.groups()))
+        if downloaded:
+            self.fetch_events.publish(downloaded)
+        for name, error in failures.items():
+            match = RadarIndex.FRAME_PATTERN.fullmatch(name)
+            # Only images which are gone for good; the next try may work 
+            # after a network error
+            if match and is_missing(error):
+                self._record_frame(*match.groups(), None, None, frames.FAILED)
+        if failures and errors is None:
+            raise next(iter(failures.values()))
+        if errors is not None:
+            errors.update(failures)
+        file_paths.update(stored_paths)
+        return file_paths
+
+    def _keep_frame(self, radar_id: str, timestamp: str, file_path: str) -> None:
+        # Copies a radar image from the layer cache to the archive folder, 
+        # unless it is there already, and records it there
+        from radar_core.archive import archive_path
+
+        kept_path = path.abspath(archive_path(self.archive_dir, radar_id, timestamp))
+        if path.exists(kept_path):
+            return
+        os.makedirs(path.dirname(kept_path), exist_ok=True)
+        # Copied under a temporary name, so a partial copy is never taken 
+        # for the image
+        partial_path = f"{kept_path}.{threading.get_ident()}.part"
+        shutil.copyfile(file_path, partial_path)
+        os.replace(partial_path, kept_path)
+        self._record_frame(*frames.fetched_row(radar_id, timestamp, kept_path))
+
+    def frame_path(self, radar_id: str, timestamp: str) -> str:
+        '''
+        Returns the local file of a radar image: its copy in the archive 
+        folder if there is one, otherwise its file in the layer cache, or 
+        None if it is in neither.
+        '''
+        from radar_core.archive import archive_path
+
+        archived_path = archive_path(self.archive_dir, radar_id, timestamp)
+        if path.exists(archived_path):
+            return archived_path
+        return self.layer_cache.path(catalog.frame_name(radar_id, timestamp))
+
+    def listing_refresher(self, interval: float = MAX_SECONDS):
+        '''
+        Returns a ListingRefresher (not yet started) which keeps the radar 
+        index file up to date every *interval* seconds.
+        '''
+        from index_util import ListingRefresher
+
+        return ListingRefresher(self.download_client, self.radar_url, INDEX_FILE_NAME, interval)
+
+    def radar_layers(self, radar_id: str, image_name: str) -> tuple:
+        '''
+        Lists every layer needed to display one radar image; see 
+        catalog.radar_layers.
+        '''
+        return catalog.radar_layers(radar_id, image_name, self.radar_url, self.background_url)
+
+    @metrics_util.timed('fetch_layers_seconds')
+    def fetch_layers(self, layers: tuple) -> dict:
+        '''
+        Downloads the layers which are not cached yet and reads every layer 
+        file. The radar image and its background are needed; the overlays 
+        after them (range map, legends and cities) are left out if they 
+        cannot be downloaded, since some radars lack some of them.
+
+        Parameters:
+        layers: The layers as returned by radar_layers
+
+        returns: 
+        dict: the content of each layer file by layer name
+
+        Raises:
+        URLError, HTTPError or CircuitOpenError: If the radar image or the 
+            background cannot be downloaded
+        '''
+        # Log the layers which are not in the layer cache yet
+        for layer_name, layer_url, logged in layers:
+            if logged and self.layer_cache.path(layer_name) is None:
+                self.log_event("ViewImage", f"Viewing image {layer_name}")
+
+        errors = {}
+        layer_paths = self._fetch_files(
+            [(f"{layer_url}/{layer_name}", layer_name) for layer_name, layer_url, _ in layers], errors)
+        for layer_name, _, _ in layers[:2]:
+            if layer_name in errors:
+                raise errors[layer_name]
+        for layer_name, error in errors.items():
+            print(f"Showing the radar image without {layer_name}: {error}")
+
+        layer_data = {}
+        for layer_name, layer_path in layer_paths.items():
+            with open(layer_path, 'rb') as layer_file:
+                layer_data[layer_name] = layer_file.read()
+        return layer_data
+
+    @metrics_util.timed('load_frame_seconds')
+    def load_frame(self, image_name: str) -> bytes:
+        '''
+        Returns the content of a radar image, downloading it into the layer 
+        cache if it is neither there nor kept elsewhere.
+        '''
+        layer_paths = self._fetch_files([(f"{self.radar_url}/{image_name}", image_name)])
+        with open(layer_paths[image_name], 'rb') as image_file:
+            return image_file.read()
+
+    def rain_scale(self):
+        '''
+        Returns the rain rate scale read from the radar legend, 
+        IDR.legend.1.png, or the BoM scale if the legend cannot be 
+        downloaded or read.
+        '''
+        from radar_core.analytics import RainScale
+
+        if self._rain_scale is None:
+            legend_name = "IDR.legend.1.png"
+            try:
+                layer_paths = self.layer_cache.fetch(
+                    self.download_client, [(f"{self.background_url}/{legend_name}", legend_name)])
+                with open(layer_paths[legend_name], 'rb') as legend_file:
+                    self._rain_scale = RainScale.from_legend(legend_file.read())
+            except (OSError, ValueError) as error:
+                # URLError is an OSError too
+                print(f"Using the BoM rain scale: {error}")
+                self._rain_scale = RainScale.default()
+        return self._rain_scale
+
+    def analyse_frames(self, radar_id: str, timestamps: list = None, 
+                       threshold: float = RAIN_THRESHOLD) -> list:
+        '''
+        Works out the rain statistics of the radar images of a radar which 
+        are not in the FrameStats table yet, and stores them there.
+
+        Parameters:
+        radar_id: The radar ID, e.g. "IDR023"
+        timestamps: The timestamps of the images; every image of the radar in
+                    the radar index if not given
+        threshold: The rain rate, in mm/h, counted as heavy rain
+
+        returns:
+        list: The analytics.FrameStats of every image, oldest first, leaving
+              out images which could not be downloaded
+        '''
+        from radar_core import analytics
+
+        if timestamps is None:
+            timestamps = self.radar_index().frames(radar_id)
+        if not timestamps:
+            return []
+
+        # The FrameStats table may not be made yet
+        self._prepare_database()
+        stored = {frame_stats.timestamp: frame_stats for frame_stats in 
+                  analytics.load_frame_stats(radar_id, min(timestamps), threshold=threshold, 
+                                             database_name=self.database_name)}
+        missing = [timestamp for timestamp in timestamps if timestamp not in stored]
+        if missing:
+            image_names = [catalog.frame_name(radar_id, timestamp) for timestamp in missing]
+            # An image which has left the listing since is skipped, rather 
+            # than failing the rest
+            errors = {}
+            layer_paths = self._fetch_files(
+                [(f"{self.radar_url}/{image_name}", image_name) for image_name in image_names],
+                errors)
+            for image_name, error in errors.items():
+                print(f"Unable to download {image_name}: {error}")
+            frames = []
+            for timestamp, image_name in zip(missing, image_names):
+                if image_name in layer_paths:
+                    with open(layer_paths[image_name], 'rb') as image_file:
+                        frames.append((timestamp, image_file.read()))
+            new_stats = analytics.frame_statistics(radar_id, frames, self.rain_scale(), threshold)
+            analytics.save_frame_stats(new_stats, threshold, self.database_name)
+            stored.update((frame_stats.timestamp, frame_stats) for frame_stats in new_stats)
+        return [stored[timestamp] for timestamp in timestamps if timestamp in stored]
+
+    def frame_history(self, radar_id: str, start: str = None, end: str = None) -> list:
+        '''
+        Returns the timestamps of every image of a radar recorded in the 
+        Frames table in a time range, oldest first, leaving out images which
+        can be neither opened nor downloaded: those found missing, and those
+        no longer listed whose file is gone.
+
+        Parameters:
+        radar_id: The radar ID, e.g. "IDR023"
+        start: Only images at or after this timestamp, e.g. "20240516"
+        end: Only images before this timestamp
+        '''
+        # Rows still queued are written first
+        self.event_logger.flush()
+        radar_index = self._radar_index
+        listed = set(radar_index.frames(radar_id)) if radar_index is not None else set()
+        return [record.timestamp for record in 
+                frames.frame_range(radar_id, start, end, self.database_name)
+                if record.status != frames.FAILED and (
+                    record.timestamp in listed 
+                    or (record.path is not None and path.exists(record.path)))]
+
+    def frame_span(self, radar_id: str) -> tuple:
+        '''
+        Returns the (oldest, newest) timestamp recorded for a radar, or 
+        (None, None) if none is.
+        '''
+        self.event_logger.flush()
+        return frames.frame_span(radar_id, self.database_name)
+
+    def generate_report(self, start_date: str = None, end_date: str = None, 
+                        event_types: tuple = ()) -> str:
+        '''
+        Writes every queued event, then generates the event log report; see
+        event_log.generate_weather_report.
+
+        Returns:
+        str: the file name of the index page of the report
+        '''
+        self.event_logger.flush()
+        return generate_weather_report(self.database_name, start_date, end_date, event_types)
+
+    def close(self) -> None:
+        '''
+        Stops the new and fetched frame subscribers, closes the pooled 
+        connections, saves the layer cache manifest and writes every queued
+        event.
+        '''
+        with self._lock:
+            (download_client, layer_cache, event_logger, frame_events, fetch_events) = (
+                self._download_client, self._layer_cache, self._event_logger, 
+                self._frame_events, self._fetch_events)
+        # Subscribers may still be downloading or logging
+        if frame_events is not None:
+            frame_events.close()
+        if fetch_events is not None:
+            fetch_events.close()
+        if download_client is not None:
+            download_client.close()
+        if layer_cache is not None:
+            layer_cache.save()
+        if event_logger is not None:
+            event_logger.close()
@@ -0,0 +1,119 @@
+'''
+Upkeep of the Log table and the HTML event log report.
+'''
+import datetime
+import sqlite3
+
+import metrics_util
+
+from radar_core.settings import (DATABASE_NAME, FILTERED_LOG_FILE_NAME, LOG_FILE_NAME, 
+                                 LOG_RETENTION_DAYS, REPORT_PAGE_SIZE)
+from radar_core import schema
+
+
+def apply_log_retention(database_name: str = DATABASE_NAME, 
+                        retention_days: int = LOG_RETENTION_DAYS) -> None:
+    '''
+    Rolls events older than *retention_days* up into daily counts per event
+    type in the LogRollup table and removes them from the Log table, so the
+    Log table stays small however long the application is used.
+    '''
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+    cutoff_text = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+    connection = sqlite3.connect(database_name)
+    with connection:
+        connection.execute(schema.ROLLUP_OLD_LOG, (cutoff_text,))
+        connection.execute(schema.DELETE_OLD_LOG, (cutoff_text,))
+    connection.close()
+
+
+def prepare_database(database_name: str = DATABASE_NAME) -> None:
+    '''
+    Brings the database schema up to date and rolls up old events.
+    '''
+    from db_util import migrate_db
+
+    migrate_db(database_name, schema.SCHEMA_MIGRATIONS)
+    apply_log_retention(database_name)
+
+
+@metrics_util.timed('report_seconds')
+def generate_weather_report(database_name: str = DATABASE_NAME, start_date: str = None, 
+                            end_date: str = None, event_types: tuple = ()) -> str:
+    ''''
+    Generates a paged HTML report of event log information.
+
+    Streams event log data from the database into HTML pages of 
+    REPORT_PAGE_SIZE events with an index page. Without filters the whole log
+    is reported in LOG_FILE_NAME incrementally: only events newer than the 
+    last event already in the report (the watermark) are read, and they are 
+    added to the last page and new pages. With filters a separate report, 
+    FILTERED_LOG_FILE_NAME, is written from the start.
+
+    Parameters:
+    database_name: the name of the database file
+    start_date: only report events at or after this date ("YYYY-MM-DD", 
+                optionally followed by " HH:MM:SS")
+    end_date: only report events before this date
+    event_types: only report events of these types
+
+    returns:
+    str: the file name of the index page of the report
+
+    '''
+    from report_util import can_append, write_report_index, write_report_pages
+
+    # Connect to the database
+    connection = sqlite3.connect(database_name)
+    cursor = connection.cursor()
+
+    filtered = bool(start_date or end_date or event_types)
+    report_name = FILTERED_LOG_FILE_NAME if filtered else LOG_FILE_NAME
+
+    # Find the pages and the last event already written to the report
+    last_log_id, pages = 0, []
+    if not filtered:
+        cursor.execute(schema.SELECT_REPORT_PAGES, (report_name,))
+        pages = cursor.fetchall()
+        cursor.execute(schema.SELECT_REPORT_WATERMARK, (report_name,))
+        watermark = cursor.fetchone()
+        if watermark and can_append(report_name, pages):
+            last_log_id = watermark[0]
+        else:
+            pages = []
+
+    # Build the SQL query for the events to add
+    conditions, parameters = ["LogId > ?"], [last_log_id]
+    if start_date:
+        conditions.append("DateTime >= ?")
+        parameters.append(start_date)
+    if end_date:
+        conditions.append("DateTime < ?")
+        parameters.append(end_date)
+    if event_types:
+        conditions.append(f"EventType IN ({', '.join('?' * len(event_types))})")
+        parameters.extend(event_types)
+    cursor.execute(schema.SELECT_LOG_INFO.format(conditions=" AND ".join(conditions)), parameters)
+
+    # Stream the events into the pages, then list the pages on the index page
+    pages, last_key = write_report_pages(cursor, report_name, "Weather Log Report", 
+                                         REPORT_PAGE_SIZE, pages)
+    description = ""
+    if filtered:
+        description = (f"Events from {start_date or 'the start'} to {end_date or 'now'}"
+                       f" of types {', '.join(event_types) or 'all'}")
+    write_report_index(report_name, "Weather Log Report", pages, description)
+
+    # Remember the pages and the last event written
+    if not filtered:
+        cursor.execute(schema.DELETE_REPORT_PAGES, (report_name,))
+        cursor.executemany(schema.INSERT_REPORT_PAGE, [(report_name, *page) for page in pages])
+        cursor.execute(schema.UPDATE_REPORT_WATERMARK, 
+                       (report_name, last_log_id if last_key is None else last_key))
+        connection.commit()
+    connection.close()
+
+    # Print success message
+    print(f"Event log report generated - {report_name}")
+    return report_name
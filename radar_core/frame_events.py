@@ -0,0 +1,180 @@
+'''
+The stream of new radar frames. Each time the radar listing is refreshed,
+RadarCore compares it with the previous listing and publishes the frames
+which are new (index_util.NewFrame) on a FrameEventBus, so that everything
+downstream does work in proportion to the new frames rather than to the
+whole listing. Subscribers each get every batch in order, on a thread of
+their own, so a slow subscriber such as a webhook never holds up another.
+'''
+import json
+import queue
+import threading
+import urllib.request
+
+import metrics_util
+
+
+class Subscription:
+    '''
+    One subscriber of a FrameEventBus: a queue of batches of NewFrame
+    events and, if the subscriber has a handler, the thread passing each
+    batch to it. Without a handler the owner takes the batches off *events*
+    itself, e.g. from the Tk thread.
+    '''
+    def __init__(self, name: str, handler=None):
+        self.name = name
+        self.handler = handler
+        self.events = queue.Queue()
+        self.thread = None
+        if handler is not None:
+            self.thread = threading.Thread(target=self._run, name=f'frame-events-{name}', daemon=True)
+            self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = self.events.get()
+            if batch is None:
+                return
+            try:
+                self.handler(batch)
+            except Exception as error:
+                # One failing subscriber must not stop the stream for itself
+                # or anyone else
+                metrics_util.count('frame_event_errors_total')
+                print(f"Frame event subscriber {self.name} failed: {error!r}")
+
+    def pending(self) -> list:
+        '''
+        Returns every NewFrame waiting in the queue, oldest first, without
+        waiting. Only for subscriptions without a handler.
+        '''
+        new_frames = []
+        while not self.events.empty():
+            new_frames += self.events.get_nowait()
+        return new_frames
+
+    def close(self, timeout: float = None) -> None:
+        if self.thread is not None:
+            self.events.put(None)
+            self.thread.join(timeout)
+
+
+class FrameEventBus:
+    '''
+    Hands every batch of new frames to each subscriber. Publishing never
+    waits on a subscriber.
+
+    Parameters:
+    counter (str): The metric counting the frames published.
+    '''
+    def __init__(self, counter: str = 'new_frames_total'):
+        self.counter = counter
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, name: str, handler=None) -> Subscription:
+        '''
+        Adds a subscriber, replacing any other of the same name.
+
+        Parameters:
+        name (str): Names the subscriber, e.g. "webhook".
+        handler: Called on the subscriber's own thread with each batch, a
+            list of NewFrame. Without one, the batches are left on the
+            returned Subscription's queue.
+
+        Returns:
+        Subscription: The subscription.
+        '''
+        subscription = Subscription(name, handler)
+        with self._lock:
+            previous = self._subscriptions.get(name)
+            self._subscriptions[name] = subscription
+        if previous is not None:
+            previous.close()
+        return subscription
+
+    def unsubscribe(self, name: str) -> None:
+        '''
+        Removes a subscriber, letting it finish the batches it has.
+        '''
+        with self._lock:
+            subscription = self._subscriptions.pop(name, None)
+        if subscription is not None:
+            subscription.close()
+
+    def publish(self, new_frames: list) -> None:
+        '''
+        Queues a batch of NewFrame events for every subscriber.
+        '''
+        if not new_frames:
+            return
+        metrics_util.count(self.counter, len(new_frames))
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        for subscription in subscriptions:
+            subscription.events.put(new_frames)
+
+    def close(self, timeout: float = 5.0) -> None:
+        '''
+        Stops every subscriber once it has handled the batches it has.
+        '''
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+            self._subscriptions.clear()
+        for subscription in subscriptions:
+            subscription.close(timeout)
+
+
+class FramePrefetcher:
+    '''
+    A subscriber downloading the new frames of the stations being watched,
+    e.g. the one shown in the window, into the layer cache as soon as they
+    are listed, so they show without a download when chosen.
+
+    Parameters:
+    load_frame: Called with an image name; downloads it, as
+        RadarCore.load_frame does.
+    '''
+    def __init__(self, load_frame):
+        self.load_frame = load_frame
+        self._watched = frozenset()
+
+    def watch(self, radar_ids) -> None:
+        '''
+        Sets the stations whose new frames are downloaded.
+        '''
+        self._watched = frozenset(radar_ids)
+
+    def __call__(self, new_frames: list) -> None:
+        watched = self._watched
+        for new_frame in new_frames:
+            if new_frame.radar_id in watched:
+                self.load_frame(new_frame.image_name)
+                metrics_util.count('frames_prefetched_total')
+
+
+class FrameWebhook:
+    '''
+    A subscriber POSTing each batch of new frames as JSON to a URL, e.g. a
+    local alerting service:
+
+        {"frames": [{"radar_id": "IDR023", "timestamp": "202405161124",
+                     "image_name": "IDR023.T.202405161124.png"}]}
+
+    Parameters:
+    url (str): The address the batches are posted to.
+    timeout (float): Seconds to wait for the endpoint.
+    '''
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, new_frames: list) -> None:
+        body = json.dumps({'frames': [{'radar_id': new_frame.radar_id,
+                                       'timestamp': new_frame.timestamp,
+                                       'image_name': new_frame.image_name}
+                                      for new_frame in new_frames]}).encode('UTF-8')
+        request = urllib.request.Request(self.url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
@@ -0,0 +1,123 @@
+'''
+The Frames table: every radar image ever listed, kept so that images can
+be browsed by date long after the BoM listing has dropped them. Each row
+holds where the image is kept locally, its size and whether it was
+fetched, and the (RadarId, Timestamp) key makes a date range of one radar
+a single index range scan.
+'''
+import os
+import sqlite3
+from typing import NamedTuple
+
+from radar_core import schema
+from radar_core.settings import DATABASE_NAME
+
+# Status of a frame: in a listing only, downloaded to Path, or not downloadable
+LISTED = 'listed'
+FETCHED = 'fetched'
+FAILED = 'failed'
+
+
+class FrameRecord(NamedTuple):
+    '''
+    One row of the Frames table.
+    '''
+    radar_id: str
+    timestamp: str
+    path: str
+    size: int
+    status: str
+
+
+def listed_rows(new_frames: list) -> list:
+    '''
+    Returns a Frames row for each image newly listed, given as the NewFrame
+    events of RadarIndex.new_frames.
+    '''
+    return [(radar_id, timestamp, None, None, LISTED) for radar_id, timestamp in new_frames]
+
+
+def fetched_row(radar_id: str, timestamp: str, path: str) -> tuple:
+    '''
+    Returns the Frames row of an image which has been saved to *path*. The
+    path is recorded as an absolute path, so it can be opened from any 
+    working directory.
+    '''
+    return (radar_id, timestamp, os.path.abspath(path), os.path.getsize(path), FETCHED)
+
+
+def record_frames(rows: list, database_name: str = DATABASE_NAME) -> None:
+    '''
+    Writes Frames rows (radar ID, timestamp, path, size, status) in one
+    transaction. Rows for images already known only add to what is known;
+    see schema.RECORD_FRAME.
+    '''
+    connection = sqlite3.connect(database_name)
+    try:
+        with connection:
+            connection.executemany(schema.RECORD_FRAME, rows)
+    finally:
+        connection.close()
+
+
+def frame_range(radar_id: str, start: str = None, end: str = None,
+                database_name: str = DATABASE_NAME) -> list:
+    '''
+    Returns the FrameRecord of every image of a radar in a time range,
+    oldest first.
+
+    Parameters:
+    radar_id: The radar ID, e.g. "IDR023"
+    start: Only images at or after this timestamp ("YYYYMMDDhhmm", or any
+           leading part of it such as "20240516")
+    end: Only images before this timestamp
+    '''
+    connection = sqlite3.connect(database_name)
+    try:
+        rows = connection.execute(schema.SELECT_FRAMES, (radar_id, start or '', end or '~'))
+        return [FrameRecord(*row) for row in rows]
+    finally:
+        connection.close()
+
+
+def frame_paths(radar_id: str, timestamps: list, database_name: str = DATABASE_NAME) -> dict:
+    '''
+    Returns the recorded local path of each of the given images of a radar
+    which has one, by timestamp. The files may since have been removed.
+    '''
+    if not timestamps:
+        return {}
+    connection = sqlite3.connect(database_name)
+    try:
+        sql = schema.SELECT_FRAME_PATHS.format(timestamps=', '.join('?' * len(timestamps)))
+        return dict(connection.execute(sql, (radar_id, *timestamps)))
+    finally:
+        connection.close()
+
+
+def fetched_frames(radar_ids: list = None, database_name: str = DATABASE_NAME) -> list:
+    '''
+    Returns the (radar ID, timestamp, path) of every image downloaded, of
+    *radar_ids* only if given. The files may since have been removed.
+    '''
+    connection = sqlite3.connect(database_name)
+    try:
+        rows = connection.execute(schema.SELECT_FETCHED_FRAMES).fetchall()
+    finally:
+        connection.close()
+    if radar_ids:
+        wanted = set(radar_ids)
+        rows = [row for row in rows if row[0] in wanted]
+    return rows
+
+
+def frame_span(radar_id: str, database_name: str = DATABASE_NAME) -> tuple:
+    '''
+    Returns the (oldest, newest) timestamp recorded for a radar, or (None,
+    None) if it has no images.
+    '''
+    connection = sqlite3.connect(database_name)
+    try:
+        return connection.execute(schema.SELECT_FRAME_SPAN, (radar_id,)).fetchone()
+    finally:
+        connection.close()
@@ -0,0 +1,257 @@
+'''
+A caching HTTP proxy for the BoM radar folders, so that every copy of the
+radar browser on a network shares one set of upstream downloads.
+
+    /radar/<file>                  from RADAR_URL
+    /radar_transparencies/<file>   from BACKGROUND_URL
+    /metrics                       counters, in Prometheus text format
+
+Concurrent requests for the same file are merged into one upstream fetch.
+Static layers are kept in memory for good, radar images in a memory cache
+of PROXY_CACHE_BYTES, and folder listings for PROXY_LISTING_SECONDS.
+'''
+import http.client
+import http.server
+import threading
+import time
+import urllib.error
+import urllib.parse
+from collections import OrderedDict
+
+import metrics_util
+
+from radar_core.settings import (BACKGROUND_URL, PROXY_CACHE_BYTES, PROXY_LISTING_SECONDS,
+                                 PROXY_PORT, RADAR_URL)
+
+
+class _Flight:
+    '''
+    One upstream fetch, which requests for the same file arriving while it
+    runs wait for instead of fetching again.
+    '''
+    def __init__(self):
+        self.done = threading.Event()
+        self.content = None
+        self.error = None
+
+
+def _timed_out(error: Exception) -> bool:
+    # Whether *error* is, or wraps, a timeout waiting for upstream
+    while isinstance(error, urllib.error.URLError) and isinstance(error.reason, Exception):
+        error = error.reason
+    return isinstance(error, TimeoutError)
+
+
+class _ProxyHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Answers GET requests for one client connection, keeping it open between
+    requests as DownloadClient expects.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def send_content(self, status: int, content: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if path == '/metrics':
+            self.send_content(200, self.server.metrics_text().encode('UTF-8'),
+                              'text/plain; version=0.0.4')
+            return
+
+        folder, _, name = path.lstrip('/').partition('/')
+        if folder not in self.server.upstream_urls or '/' in name or name in ('.', '..'):
+            self.send_content(404, b'Not found', 'text/plain')
+            return
+
+        from download_util import is_missing
+
+        try:
+            content = self.server.fetch(folder, name)
+        except (OSError, EOFError, ValueError, http.client.HTTPException) as error:
+            # Whatever went wrong upstream, the client gets an answer
+            if is_missing(error):
+                self.send_content(404, b'Not found', 'text/plain')
+            elif _timed_out(error):
+                self.send_content(504, f'Upstream timed out: {error}'.encode('UTF-8'), 'text/plain')
+            else:
+                self.send_content(502, f'Upstream error: {error}'.encode('UTF-8'), 'text/plain')
+            return
+        content_type = 'image/png' if name.endswith('.png') else 'text/plain'
+        self.send_content(200, content, content_type)
+
+    def log_message(self, format: str, *arguments) -> None:
+        # One line per request would drown everything else
+        pass
+
+
+class RadarProxy(http.server.ThreadingHTTPServer):
+    '''
+    Serves the BoM radar folders over HTTP from memory, fetching each file
+    from upstream once.
+
+    Parameters:
+    address (tuple): The (host, port) to listen on; port 0 picks a free one.
+    client (DownloadClient): Fetches from upstream; a new one if not given.
+    radar_url (str): The upstream radar folder.
+    background_url (str): The upstream folder of static layers.
+    cache_bytes (int): The memory budget for cached radar images.
+    listing_seconds (float): Seconds a folder listing is served from memory.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+    # Many browsers connect at once when they start together
+    request_queue_size = 256
+
+    def __init__(self, address: tuple = ('', PROXY_PORT), client=None,
+                 radar_url: str = RADAR_URL, background_url: str = BACKGROUND_URL,
+                 cache_bytes: int = PROXY_CACHE_BYTES,
+                 listing_seconds: float = PROXY_LISTING_SECONDS):
+        super().__init__(address, _ProxyHandler)
+        if client is None:
+            from download_util import DownloadClient
+            client = DownloadClient()
+        self.client = client
+        self.upstream_urls = {'radar': radar_url, 'radar_transparencies': background_url}
+        self.cache_bytes = cache_bytes
+        self.listing_seconds = listing_seconds
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._static = {}
+        self._listings = {}
+        self._frames = OrderedDict()
+        self._frame_bytes = 0
+        self.counters = dict.fromkeys(('requests', 'hits', 'coalesced', 'upstream_fetches',
+                                       'upstream_errors', 'upstream_bytes', 'served_bytes'), 0)
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _count(self, **increments) -> None:
+        with self._lock:
+            for name, increment in increments.items():
+                self.counters[name] += increment
+
+    def _cached(self, folder: str, name: str) -> bytes:
+        # Returns the file from memory, or None; call with the lock held
+        if not name:
+            listing = self._listings.get(folder)
+            if listing is not None and time.monotonic() < listing[0]:
+                return listing[1]
+            return None
+        if folder == 'radar_transparencies':
+            return self._static.get(name)
+        content = self._frames.get(name)
+        if content is not None:
+            self._frames.move_to_end(name)
+        return content
+
+    def _keep(self, folder: str, name: str, content: bytes) -> None:
+        # Stores a fetched file in memory; call with the lock held
+        if not name:
+            self._listings[folder] = (time.monotonic() + self.listing_seconds, content)
+        elif folder == 'radar_transparencies':
+            self._static[name] = content
+        else:
+            self._frames[name] = content
+            self._frame_bytes += len(content)
+            while self._frame_bytes > self.cache_bytes and self._frames:
+                _, evicted = self._frames.popitem(last=False)
+                self._frame_bytes -= len(evicted)
+
+    def fetch(self, folder: str, name: str) -> bytes:
+        '''
+        Returns the file *name* of *folder* ("radar" or "radar_transparencies";
+        an empty name for the folder listing), from memory if possible. If
+        the file is already being fetched, waits for that fetch instead of
+        starting another.
+
+        Raises:
+        HTTPError or URLError: As DownloadClient.download_bytes.
+        '''
+        key = (folder, name)
+        with self._lock:
+            self.counters['requests'] += 1
+            content = self._cached(folder, name)
+            if content is not None:
+                self.counters['hits'] += 1
+                self.counters['served_bytes'] += len(content)
+                return content
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            self._count(coalesced=1, served_bytes=len(flight.content))
+            return flight.content
+
+        try:
+            flight.content = self.client.download_bytes(f'{self.upstream_urls[folder]}/{name}')
+            self._count(upstream_fetches=1, upstream_bytes=len(flight.content),
+                        served_bytes=len(flight.content))
+        except BaseException as error:
+            flight.error = error
+            self._count(upstream_errors=1)
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._keep(folder, name, flight.content)
+                del self._flights[key]
+            flight.done.set()
+        return flight.content
+
+    def hit_rate(self) -> float:
+        '''
+        Returns the fraction of requests answered without an upstream fetch
+        of their own.
+        '''
+        with self._lock:
+            requests = self.counters['requests']
+            saved = self.counters['hits'] + self.counters['coalesced']
+        return saved / requests if requests else 0.0
+
+    def metrics_text(self) -> str:
+        '''
+        Returns the counters and cache sizes in Prometheus text format,
+        followed by metrics_util's metrics when they are enabled.
+        '''
+        hit_rate = self.hit_rate()
+        with self._lock:
+            values = [(f'radar_proxy_{name}_total', value) for name, value in self.counters.items()]
+            values += [('radar_proxy_hit_rate', hit_rate),
+                       ('radar_proxy_static_files', len(self._static)),
+                       ('radar_proxy_cached_frames', len(self._frames)),
+                       ('radar_proxy_cached_frame_bytes', self._frame_bytes)]
+        text = ''.join(f'{name} {value}\n' for name, value in values)
+        return text + metrics_util.prometheus_text()
+
+    def start(self) -> 'RadarProxy':
+        '''
+        Serves requests on a background thread until stop is called.
+        '''
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        self.client.close()
+
+    def __enter__(self) -> 'RadarProxy':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
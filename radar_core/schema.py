@@ -0,0 +1,77 @@
+'''
+SQL used with the radar_app database, and the migrations which bring a 
+database made by an older create_db.sql up to date.
+'''
+
+# SQL queries 
+SELECT_RADAR_INFO = "SELECT RadarId, RadarName FROM Radars"
+SELECT_LOG_INFO = "SELECT LogId, EventType, DateTime, Details FROM Log WHERE {conditions} ORDER BY LogId"
+INSERT_LOG_INFO = "INSERT INTO Log (EventType, DateTime, Details) VALUES(?, ?, ?)"
+SELECT_REPORT_WATERMARK = "SELECT LastLogId FROM ReportWatermark WHERE ReportName = ?"
+UPDATE_REPORT_WATERMARK = "INSERT OR REPLACE INTO ReportWatermark (ReportName, LastLogId) VALUES(?, ?)"
+SELECT_REPORT_PAGES = ("SELECT PageNumber, FirstDateTime, LastDateTime, RowCount FROM ReportPages "
+                       "WHERE ReportName = ? ORDER BY PageNumber")
+DELETE_REPORT_PAGES = "DELETE FROM ReportPages WHERE ReportName = ?"
+INSERT_REPORT_PAGE = "INSERT INTO ReportPages VALUES(?, ?, ?, ?, ?)"
+ROLLUP_OLD_LOG = """
+    INSERT INTO LogRollup (Day, EventType, EventCount)
+    SELECT substr(DateTime, 1, 10), EventType, COUNT(*) FROM Log WHERE DateTime < ? 
+    GROUP BY substr(DateTime, 1, 10), EventType
+    ON CONFLICT (Day, EventType) DO UPDATE SET EventCount = EventCount + excluded.EventCount"""
+DELETE_OLD_LOG = "DELETE FROM Log WHERE DateTime < ?"
+# A frame row of status "listed" never overwrites what is known of a frame,
+# and a failed download does not hide a copy fetched before
+RECORD_FRAME = """
+    INSERT INTO Frames (RadarId, Timestamp, Path, Size, Status) VALUES(?, ?, ?, ?, ?)
+    ON CONFLICT (RadarId, Timestamp) DO UPDATE SET 
+        Path = coalesce(excluded.Path, Path), Size = coalesce(excluded.Size, Size),
+        Status = CASE WHEN excluded.Status = 'listed' OR (excluded.Status = 'failed' AND Status = 'fetched')
+                      THEN Status ELSE excluded.Status END"""
+SELECT_FRAMES = ("SELECT RadarId, Timestamp, Path, Size, Status FROM Frames "
+                 "WHERE RadarId = ? AND Timestamp >= ? AND Timestamp < ? ORDER BY Timestamp")
+SELECT_FRAME_PATHS = ("SELECT Timestamp, Path FROM Frames WHERE RadarId = ? AND Timestamp IN ({timestamps}) "
+                      "AND Path IS NOT NULL")
+SELECT_FRAME_SPAN = "SELECT min(Timestamp), max(Timestamp) FROM Frames WHERE RadarId = ?"
+SELECT_FETCHED_FRAMES = ("SELECT RadarId, Timestamp, Path FROM Frames WHERE Status = 'fetched' "
+                         "ORDER BY RadarId, Timestamp")
+INSERT_FRAME_STATS = "INSERT OR REPLACE INTO FrameStats VALUES(?, ?, ?, ?, ?, ?, ?)"
+SELECT_FRAME_STATS = ("SELECT RadarId, Timestamp, CoveragePercent, MaxRate, MeanRate, HeavyAreaKm2 "
+                      "FROM FrameStats WHERE RadarId = ? AND Threshold = ? "
+                      "AND Timestamp >= ? AND Timestamp < ? ORDER BY Timestamp")
+
+# schema migrations: SCHEMA_MIGRATIONS[n] upgrades a database made by an older
+# create_db.sql from schema version n to n + 1
+SCHEMA_MIGRATIONS = [
+    # 1: integer key and indexes for Log, daily rollups and the report watermark
+    """
+    CREATE TABLE LogWithId (LogId INTEGER PRIMARY KEY, EventType TEXT REFERENCES EventTypes (EventType), 
+                            DateTime TEXT, Details TEXT);
+    INSERT INTO LogWithId (EventType, DateTime, Details) SELECT EventType, DateTime, Details FROM Log ORDER BY rowid;
+    DROP TABLE Log;
+    ALTER TABLE LogWithId RENAME TO Log;
+    CREATE INDEX LogDateTime ON Log (DateTime);
+    CREATE INDEX LogEventType ON Log (EventType, DateTime);
+    CREATE TABLE LogRollup (Day TEXT, EventType TEXT, EventCount INTEGER, PRIMARY KEY (Day, EventType));
+    CREATE TABLE ReportWatermark (ReportName TEXT PRIMARY KEY, LastLogId INTEGER)
+    """,
+    # 2: pages of the paged event log report
+    """
+    CREATE TABLE ReportPages (ReportName TEXT, PageNumber INTEGER, FirstDateTime TEXT, LastDateTime TEXT, 
+                              RowCount INTEGER, PRIMARY KEY (ReportName, PageNumber))
+    """,
+    # 3: rain statistics of each radar image
+    """
+    CREATE TABLE FrameStats (RadarId TEXT REFERENCES Radars (RadarId), Timestamp TEXT, 
+                             CoveragePercent REAL, MaxRate REAL, MeanRate REAL, HeavyAreaKm2 REAL,
+                             Threshold REAL, PRIMARY KEY (RadarId, Timestamp, Threshold))
+    """,
+    # 4: every radar image ever listed, where it is kept and whether it was fetched
+    """
+    CREATE TABLE Frames (RadarId TEXT REFERENCES Radars (RadarId), Timestamp TEXT, Path TEXT, 
+                         Size INTEGER, Status TEXT, PRIMARY KEY (RadarId, Timestamp)) WITHOUT ROWID
+    """,
+    # 5: event types of new frames, the frame history and the station mosaic
+    """
+    INSERT OR IGNORE INTO EventTypes (EventType) VALUES ('NewFrames'), ('FrameHistory'), ('StationMosaic')
+    """,
+]
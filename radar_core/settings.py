@@ -0,0 +1,77 @@
+'''
+Settings shared by every front end of the radar browser. The two download 
+links can be overridden with the RAINYDAZE_RADAR_URL and 
+RAINYDAZE_BACKGROUND_URL environment variables, for example to use a local
+mirror, RAINYDAZE_WEBHOOK_URL names an endpoint new radar frames are
+posted to, and RAINYDAZE_KEEP_FRAMES=1 keeps every radar image downloaded
+in the archive.
+'''
+import os
+
+# links and database
+DATABASE_NAME = "radar_app.db"
+RADAR_URL = os.environ.get("RAINYDAZE_RADAR_URL", "ftp://ftp.bom.gov.au/anon/gen/radar/")
+BACKGROUND_URL = os.environ.get("RAINYDAZE_BACKGROUND_URL", 
+                                'ftp://ftp.bom.gov.au/anon/gen/radar_transparencies/')
+
+# file constants 
+INDEX_FILE_NAME = "radar_index.txt"
+RADAR_FILE_NAME = "image_index.txt"
+LOG_FILE_NAME = "event_log.html"
+FILTERED_LOG_FILE_NAME = "event_log_filtered.html"
+
+# downloaded layer cache folder and its size limit in bytes
+CACHE_DIR = "radar_cache"
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# seconds before a downloaded listing is considered out of date
+MAX_SECONDS = 60
+
+# days individual events stay in the Log table before being rolled up into
+# daily counts
+LOG_RETENTION_DAYS = 90
+
+# events on each page of the event log report
+REPORT_PAGE_SIZE = 1000
+
+# offline archive: folder, download threads, connections to each host and 
+# attempts (with the longest wait before the first retry, doubled for each 
+# retry)
+ARCHIVE_DIR = "radar_archive"
+ARCHIVE_WORKERS = 16
+ARCHIVE_CONNECTIONS_PER_HOST = 8
+ARCHIVE_ATTEMPTS = 4
+ARCHIVE_RETRY_SECONDS = 1.0
+# whether the browser also keeps every radar image it downloads in the 
+# archive, so it can still be shown once the listing has moved on. The 
+# archive has no size limit, so this is off unless asked for
+KEEP_FETCHED_FRAMES = os.environ.get("RAINYDAZE_KEEP_FRAMES", "") == "1"
+
+# caching proxy (python -m radar_core proxy): port, memory for radar images
+# and seconds a folder listing is served before it is fetched again. Point 
+# other copies at it with, e.g., 
+#   RAINYDAZE_RADAR_URL=http://proxy-host:8020/radar/
+#   RAINYDAZE_BACKGROUND_URL=http://proxy-host:8020/radar_transparencies/
+PROXY_PORT = 8020
+PROXY_CACHE_BYTES = 256 * 1024 * 1024
+PROXY_LISTING_SECONDS = 30
+
+# files the debug panel exports metrics to
+METRICS_JSON_FILE_NAME = "metrics.json"
+METRICS_TEXT_FILE_NAME = "metrics.prom"
+
+# rain statistics: the rain rate in mm/h counted as heavy rain
+RAIN_THRESHOLD = 10.0
+
+# thumbnail pipeline (python -m radar_core thumbnails, and the browser as
+# it downloads images, for the station mosaic): folder and longest
+# side of thumbnails, zlib level of thumbnails and recompressed archive 
+# copies, and worker processes
+THUMBNAIL_DIR = "radar_thumbnails"
+THUMBNAIL_SIZE = 128
+PNG_COMPRESS_LEVEL = 9
+PIPELINE_WORKERS = os.cpu_count() or 1
+
+# new frame events: an address each batch of new frames is posted to as 
+# JSON, e.g. http://localhost:8030/frames, or None for no webhook
+FRAME_WEBHOOK_URL = os.environ.get("RAINYDAZE_WEBHOOK_URL")
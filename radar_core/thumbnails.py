@@ -0,0 +1,350 @@
+'''
+Bulk processing of downloaded radar images on every core: each image gets
+a small thumbnail, which the station mosaic shows in a tile until the 
+station's latest image is drawn there, and, optionally, a copy for the 
+archive whose image data is compressed again at the highest zlib level.
+Images are decoded and encoded in a process pool, since PNG decoding and
+zlib hold the interpreter; only images whose outputs do not exist yet are
+processed, so the stage can be run after every download: the thumbnails
+command runs it over every image in the Frames table, and a 
+ThumbnailSubscriber runs it on the images the browser downloads as they
+arrive.
+
+Thumbnails are decoded like rain statistics (see analytics) and shrunk by
+keeping every n-th pixel, so palette images keep their exact rain colours
+and stay palette images.
+'''
+import multiprocessing
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from radar_core.catalog import frame_name
+from radar_core.settings import PIPELINE_WORKERS, PNG_COMPRESS_LEVEL, THUMBNAIL_DIR, THUMBNAIL_SIZE
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def thumbnail_path(thumbnail_dir: str, radar_id: str, timestamp: str) -> str:
+    '''
+    Returns where the thumbnail of a radar image is kept, e.g.
+    "radar_thumbnails/IDR023/IDR023.T.202405161124.png".
+    '''
+    return os.path.join(thumbnail_dir, radar_id, frame_name(radar_id, timestamp))
+
+
+def latest_thumbnail(thumbnail_dir: str, radar_id: str) -> str:
+    '''
+    Returns the thumbnail of the newest radar image of a station which has
+    one, or None if none of its images has.
+    '''
+    try:
+        names = [name for name in os.listdir(os.path.join(thumbnail_dir, radar_id))
+                 if name.endswith('.png')]
+    except FileNotFoundError:
+        return None
+    # Image names sort by their timestamps
+    return os.path.join(thumbnail_dir, radar_id, max(names)) if names else None
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def _chunks(content: bytes):
+    # Yields the (kind, data) of each chunk of a PNG
+    if content[:8] != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+    position = 8
+    while position < len(content):
+        length, kind = struct.unpack('>I4s', content[position:position + 8])
+        yield kind, content[position + 8:position + 8 + length]
+        position += length + 12
+
+
+def _deflate(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9)
+    return compressor.compress(data) + compressor.flush()
+
+
+def recompress_png(content: bytes, level: int = PNG_COMPRESS_LEVEL) -> bytes:
+    '''
+    Returns a PNG with the same pixels as *content* whose image data is
+    compressed again at *level* in one IDAT chunk, or *content* itself if
+    that is no smaller. The pixels are not decoded, so the filters and every
+    other chunk are kept as they are.
+    '''
+    before, data, after = [], [], []
+    for kind, chunk in _chunks(content):
+        if kind == b'IDAT':
+            data.append(chunk)
+        else:
+            (after if data else before).append(_chunk(kind, chunk))
+    compressed = _chunk(b'IDAT', _deflate(zlib.decompress(b''.join(data)), level))
+    recompressed = PNG_SIGNATURE + b''.join(before) + compressed + b''.join(after)
+    return recompressed if len(recompressed) < len(content) else content
+
+
+def _write_png(pixels, palette=None, level: int = PNG_COMPRESS_LEVEL) -> bytes:
+    # Encodes palette indices with their RGBA *palette*, or RGBA pixels
+    height, width = pixels.shape[:2]
+    rows = pixels.reshape(height, -1)
+    raw = b''.join(b'\x00' + row.tobytes() for row in rows)
+    if palette is None:
+        header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+        extra = b''
+    else:
+        header = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+        extra = _chunk(b'PLTE', palette[:, :3].tobytes())
+        if (palette[:, 3] < 255).any():
+            extra += _chunk(b'tRNS', palette[:, 3].tobytes())
+    return (PNG_SIGNATURE + _chunk(b'IHDR', header) + extra
+            + _chunk(b'IDAT', _deflate(raw, level)) + _chunk(b'IEND', b''))
+
+
+def make_thumbnail(content: bytes, size: int = THUMBNAIL_SIZE,
+                   level: int = PNG_COMPRESS_LEVEL) -> bytes:
+    '''
+    Returns a PNG of a radar image shrunk by a whole factor so that neither
+    side is more than *size* pixels.
+    '''
+    from radar_core.analytics import decode_png
+
+    indices, colours = decode_png(content)
+    pixels = colours if indices is None else indices
+    step = max(1, -(-max(pixels.shape[:2]) // size))
+    shrunk = pixels[::step, ::step]
+    if indices is None:
+        return _write_png(shrunk, level=level)
+    return _write_png(shrunk, colours, level)
+
+
+def _save(file_name: str, content: bytes) -> None:
+    # Written to a temporary file and renamed, so no partly written output
+    # is ever taken for a finished one
+    os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+    partial_name = f'{file_name}.{os.getpid()}.part'
+    with open(partial_name, 'wb') as output:
+        output.write(content)
+    os.replace(partial_name, file_name)
+
+
+def process_frame(source: str, thumbnail_file: str, archive_file: str, size: int,
+                  level: int) -> tuple:
+    '''
+    Makes the thumbnail and the recompressed archive copy of one radar image,
+    each only if its file name is given. Run in a worker process.
+
+    Returns:
+    tuple: (worker process ID, seconds taken, bytes read, thumbnail bytes,
+        archive copy bytes)
+    '''
+    start = time.perf_counter()
+    with open(source, 'rb') as source_file:
+        content = source_file.read()
+    thumbnail_bytes = archive_bytes = 0
+    if thumbnail_file is not None:
+        thumbnail = make_thumbnail(content, size, level)
+        _save(thumbnail_file, thumbnail)
+        thumbnail_bytes = len(thumbnail)
+    if archive_file is not None:
+        archived = recompress_png(content, level)
+        _save(archive_file, archived)
+        archive_bytes = len(archived)
+    return (os.getpid(), time.perf_counter() - start, len(content), thumbnail_bytes,
+            archive_bytes)
+
+
+class PipelineStats:
+    '''
+    Counts what one pipeline run did, and how much each worker process did.
+    '''
+    def __init__(self):
+        self.processed = 0
+        self.skipped = 0
+        self.failed = []
+        self.bytes_read = 0
+        self.thumbnail_bytes = 0
+        self.archive_bytes = 0
+        self.seconds = 0.0
+        self.workers = {}
+
+    def add(self, result: tuple) -> None:
+        process_id, seconds, bytes_read, thumbnail_bytes, archive_bytes = result
+        self.processed += 1
+        self.bytes_read += bytes_read
+        self.thumbnail_bytes += thumbnail_bytes
+        self.archive_bytes += archive_bytes
+        frames, busy_seconds = self.workers.get(process_id, (0, 0.0))
+        self.workers[process_id] = (frames + 1, busy_seconds + seconds)
+
+    def add_failure(self, image_name: str) -> None:
+        self.failed.append(image_name)
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.processed / self.seconds if self.seconds else 0.0
+
+    def worker_throughput(self) -> list:
+        '''
+        Returns the (images, images per second while busy) of each worker
+        process, busiest first.
+        '''
+        return sorted(((frames, frames / busy_seconds if busy_seconds else 0.0)
+                       for frames, busy_seconds in self.workers.values()), reverse=True)
+
+    def __str__(self) -> str:
+        per_worker = ', '.join(f"{rate:.1f}" for _, rate in self.worker_throughput())
+        return (f"processed {self.processed} frames ({self.bytes_read / 1e6:.1f} MB) in "
+                f"{self.seconds:.1f} s, {self.frames_per_second:.1f} frames/s on "
+                f"{len(self.workers)} workers ({per_worker or '-'} frames/s each); "
+                f"{self.skipped} already done, {len(self.failed)} failed")
+
+
+class FramePipeline:
+    '''
+    Makes thumbnails, and optionally recompressed archive copies, of radar
+    images in a pool of worker processes.
+
+    Parameters:
+    thumbnail_dir (str): The folder thumbnails are kept in.
+    archive_dir (str): If given, a recompressed copy of each image is kept
+        in this archive, where RadarArchiver would put it.
+    size (int): The longest side of a thumbnail in pixels.
+    level (int): The zlib level thumbnails and archive copies are written at.
+    workers (int): Worker processes; one per core by default. With 0, images
+        are processed in the calling thread.
+
+    Each run starts its own worker processes unless start was called, which
+    starts them at once and keeps them for every later run until close.
+    '''
+    def __init__(self, thumbnail_dir: str = THUMBNAIL_DIR, archive_dir: str = None,
+                 size: int = THUMBNAIL_SIZE, level: int = PNG_COMPRESS_LEVEL,
+                 workers: int = PIPELINE_WORKERS):
+        self.thumbnail_dir = thumbnail_dir
+        self.archive_dir = archive_dir
+        self.size = size
+        self.level = level
+        self.workers = workers
+        self._executor = None
+
+    def start(self) -> None:
+        '''
+        Starts the worker processes now and keeps them for later runs, so
+        that a program can fork them before it starts threads or opens 
+        windows, after which forking it is unsafe. Where processes cannot be
+        forked, as on Windows, a new process would run the program again, so
+        images are processed in the calling thread instead.
+        '''
+        if self._executor is not None or not self.workers:
+            return
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            self.workers = 0
+        else:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('fork'))
+            # Every worker is forked on the first submission
+            self._executor.submit(os.getpid).result()
+
+    def close(self) -> None:
+        '''
+        Stops the worker processes started by start once their images are
+        processed.
+        '''
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def pending_jobs(self, frames: list) -> list:
+        '''
+        Returns the (source, thumbnail file, archive file) of every image in
+        *frames*, a list of (radar ID, timestamp, path), with an output still
+        to make. Outputs which already exist are given as None.
+        '''
+        from radar_core.archive import archive_path
+
+        jobs = []
+        for radar_id, timestamp, source in frames:
+            thumbnail_file = thumbnail_path(self.thumbnail_dir, radar_id, timestamp)
+            archive_file = (archive_path(self.archive_dir, radar_id, timestamp)
+                            if self.archive_dir is not None else None)
+            if os.path.exists(thumbnail_file):
+                thumbnail_file = None
+            if archive_file is not None and (os.path.exists(archive_file)
+                                             or os.path.abspath(archive_file) == os.path.abspath(source)):
+                archive_file = None
+            if thumbnail_file is not None or archive_file is not None:
+                jobs.append((source, thumbnail_file, archive_file))
+        return jobs
+
+    def run(self, frames: list, progress=None) -> PipelineStats:
+        '''
+        Processes every image in *frames* which has an output still to make.
+
+        Parameters:
+        frames (list): (radar ID, timestamp, path) of each downloaded image.
+        progress: Called with the PipelineStats after each image, if given.
+
+        Returns:
+        PipelineStats: What was processed, skipped and failed.
+        '''
+        stats = PipelineStats()
+        start = time.perf_counter()
+        jobs = self.pending_jobs(frames)
+        stats.skipped = len(frames) - len(jobs)
+
+        if jobs and not self.workers:
+            for source, thumbnail_file, archive_file in jobs:
+                self._add_result(stats, source, lambda: process_frame(
+                    source, thumbnail_file, archive_file, self.size, self.level), progress)
+        elif jobs and self._executor is not None:
+            self._run_jobs(self._executor, jobs, stats, progress)
+        elif jobs:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as executor:
+                self._run_jobs(executor, jobs, stats, progress)
+
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    def _run_jobs(self, executor: ProcessPoolExecutor, jobs: list, stats: PipelineStats,
+                  progress) -> None:
+        futures = {executor.submit(process_frame, source, thumbnail_file, archive_file,
+                                   self.size, self.level): source
+                   for source, thumbnail_file, archive_file in jobs}
+        for future in as_completed(futures):
+            self._add_result(stats, futures[future], future.result, progress)
+
+    def _add_result(self, stats: PipelineStats, source: str, result, progress) -> None:
+        # Counts what *result* returns, or a failure if it raises
+        try:
+            stats.add(result())
+        except (OSError, ValueError, zlib.error) as error:
+            print(f"Unable to process {source}: {error}")
+            stats.add_failure(source)
+        if progress is not None:
+            progress(stats)
+
+
+class ThumbnailSubscriber:
+    '''
+    A FrameEventBus subscriber for RadarCore.fetch_events, passing each 
+    batch of radar images just downloaded through a FramePipeline, so that
+    their thumbnails are made as they arrive.
+
+    Parameters:
+    pipeline (FramePipeline): Makes the thumbnails.
+    frame_path: Called with a radar ID and timestamp; returns the local file
+        of that image, or None, as RadarCore.frame_path does.
+    '''
+    def __init__(self, pipeline: FramePipeline, frame_path):
+        self.pipeline = pipeline
+        self.frame_path = frame_path
+
+    def __call__(self, new_frames: list) -> None:
+        sources = [(new_frame.radar_id, new_frame.timestamp,
+                    self.frame_path(new_frame.radar_id, new_frame.timestamp))
+                   for new_frame in new_frames]
+        self.pipeline.run([source for source in sources if source[2] is not None])
@@ -0,0 +1,170 @@
+import html
+import os
+
+
+PAGE_HEADER = ("<html>\n"
+               "<head><title>{title} - page {number}</title></head>\n"
+               "<body>\n"
+               "<h1>{title}</h1>\n"
+               "<p><a href='{index}'>Index</a>{previous}</p>\n"
+               "<table border='1'>\n"
+               "<tr><th>Event Type</th><th>Date and Time</th><th>Details</th></tr>\n")
+PAGE_FOOTER = ("</table>\n"
+               "</body>\n"
+               "</html>")
+NEXT_PAGE_FOOTER = ("</table>\n"
+                    "<p><a href='{next}'>Next page</a></p>\n"
+                    "</body>\n"
+                    "</html>")
+ROW = "<tr><td>{}</td><td>{}</td><td>{}</td></tr>\n"
+WRITE_BUFFER_BYTES = 64 * 1024
+
+
+def page_file_name(report_name: str, number: int) -> str:
+    '''
+    Returns the file name of one page of a report, e.g. "event_log_0003.html"
+    for page 3 of "event_log.html".
+    '''
+    stem, extension = os.path.splitext(report_name)
+    return f"{stem}_{number:04d}{extension}"
+
+
+def _reopen_last_page(report_name: str, page: tuple):
+    # Opens the last page positioned just before its closing tags, or returns
+    # None if the file is missing or does not end with them
+    file_name = page_file_name(report_name, page[0])
+    if not os.path.exists(file_name):
+        return None
+    page_file = open(file_name, 'r+b', buffering = WRITE_BUFFER_BYTES)
+    page_file.seek(0, os.SEEK_END)
+    page_file.seek(max(page_file.tell() - len(PAGE_FOOTER), 0))
+    if page_file.read() != PAGE_FOOTER.encode():
+        page_file.close()
+        return None
+    page_file.seek(-len(PAGE_FOOTER), os.SEEK_END)
+    return page_file
+
+
+def can_append(report_name: str, pages: list) -> bool:
+    '''
+    Returns True if the pages of an earlier report are still on disk as they
+    were written, so that write_report_pages can add to them.
+    '''
+    if not pages:
+        return False
+    page_file = _reopen_last_page(report_name, pages[-1])
+    if page_file is None:
+        return False
+    page_file.close()
+    return True
+
+
+def write_report_pages(cursor, report_name: str, title: str, page_size: int = 1000,
+                       pages: list = (), chunk_rows: int = 1000) -> tuple:
+    '''
+    Streams the rows of an executed query into numbered HTML pages of at most
+    *page_size* rows. Rows are fetched *chunk_rows* at a time and written 
+    through a buffered file, so memory use does not depend on the number of
+    rows.
+
+    Parameters:
+    cursor: A cursor on which a query returning (key, event type, date and 
+            time, details) rows, in order, has been executed. The key is not
+            shown; the key of the last row written is returned.
+    report_name (str): The index file name of the report; pages are named 
+            after it by page_file_name.
+    title (str): The heading of every page.
+    page_size (int): The most rows on one page.
+    pages (list): The pages already written by an earlier call, as returned 
+            by it. New rows are appended to the last of these pages until it 
+            is full. Empty to write the report from the start.
+    chunk_rows (int): The number of rows fetched from the cursor at once.
+
+    Returns:
+    tuple: (pages, last key) where pages lists (page number, first date and 
+           time, last date and time, row count) for every page, and last key 
+           is None if the query returned no rows.
+    '''
+    pages = list(pages)
+    page_file = _reopen_last_page(report_name, pages[-1]) if pages else None
+    if pages and page_file is None:
+        # The last page was changed or removed (see can_append)
+        raise FileNotFoundError(page_file_name(report_name, pages[-1][0]))
+
+    last_key = None
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            position = 0
+            while position < len(rows):
+                if not pages or pages[-1][3] >= page_size:
+                    number = pages[-1][0] + 1 if pages else 1
+                    if page_file is not None:
+                        page_file.write(NEXT_PAGE_FOOTER.format(
+                            next = os.path.basename(page_file_name(report_name, number))).encode())
+                        page_file.truncate()
+                        page_file.close()
+                    page_file = open(page_file_name(report_name, number), 'wb', 
+                                     buffering = WRITE_BUFFER_BYTES)
+                    previous = (f" | <a href='{os.path.basename(page_file_name(report_name, number - 1))}'>"
+                                f"Previous page</a>" if number > 1 else "")
+                    page_file.write(PAGE_HEADER.format(
+                        title = title, number = number, previous = previous,
+                        index = os.path.basename(report_name)).encode())
+                    pages.append((number, rows[position][2], rows[position][2], 0))
+
+                # Write as many rows as fit on the current page in one call
+                number, first, _, row_count = pages[-1]
+                page_rows = rows[position:position + page_size - row_count]
+                page_file.write(''.join(
+                    ROW.format(html.escape(str(event_type)), html.escape(str(date_time)), 
+                               html.escape(str(details)))
+                    for _, event_type, date_time, details in page_rows).encode())
+                pages[-1] = (number, first, page_rows[-1][2], row_count + len(page_rows))
+                last_key = page_rows[-1][0]
+                position += len(page_rows)
+    finally:
+        if page_file is not None:
+            page_file.write(PAGE_FOOTER.encode())
+            page_file.truncate()
+            page_file.close()
+
+    # Remove pages left over from a longer report written before
+    number = (pages[-1][0] if pages else 0) + 1
+    while os.path.exists(page_file_name(report_name, number)):
+        os.remove(page_file_name(report_name, number))
+        number += 1
+    return pages, last_key
+
+
+def write_report_index(report_name: str, title: str, pages: list, description: str = "") -> None:
+    '''
+    Writes the index page of a paged report, linking to every page with its
+    date range and row count.
+
+    Parameters:
+    report_name (str): The index file name.
+    title (str): The heading of the index page.
+    pages (list): The pages as returned by write_report_pages.
+    description (str): Optional text shown above the list of pages.
+    '''
+    total_rows = sum(page[3] for page in pages)
+    with open(report_name, 'w', buffering = WRITE_BUFFER_BYTES) as index_file:
+        index_file.write("<html>\n")
+        index_file.write(f"<head><title>{title}</title></head>\n")
+        index_file.write("<body>\n")
+        index_file.write(f"<h1>{title}</h1>\n")
+        if description:
+            index_file.write(f"<p>{html.escape(description)}</p>\n")
+        index_file.write(f"<p>{total_rows} events on {len(pages)} pages</p>\n")
+        index_file.write("<table border='1'>\n")
+        index_file.write("<tr><th>Page</th><th>From</th><th>To</th><th>Events</th></tr>\n")
+        for number, first, last, row_count in pages:
+            link = os.path.basename(page_file_name(report_name, number))
+            index_file.write(f"<tr><td><a href='{link}'>{number}</a></td><td>{first}</td>"
+                             f"<td>{last}</td><td>{row_count}</td></tr>\n")
+        index_file.write("</table>\n")
+        index_file.write("</body>\n")
+        index_file.write("</html>")
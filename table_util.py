@@ -0,0 +1,182 @@
+import bisect
+from tkinter import ttk
+
+
+class VirtualTable:
+    '''
+    Shows a long list of rows in a ttk.Treeview while only the rows in view
+    exist as Treeview items, so filling or replacing the list costs a few
+    dozen Tk calls however many rows it has. The scrollbar and mouse wheel
+    scroll through the whole list; scrolling adds and removes items at the
+    edges of the view. Each item's iid is the key of its row, so selection
+    events and item lookups work as on a plain Treeview.
+
+    When the rows change, only the items whose rows were added, removed or
+    moved into or out of view are touched. The view stays on the row at its
+    top, or at the end of the list if it was showing the end.
+
+    Parameters:
+    tree (ttk.Treeview): The Treeview the rows are shown in. It must not be
+        given a yscrollcommand of its own.
+    scrollbar (ttk.Scrollbar): The vertical scrollbar of the Treeview.
+    row_values: Called with a row key; returns the values shown for that row.
+        Only called for rows coming into view.
+    '''
+    SELECTED_TAG = "selected_row"
+
+    def __init__(self, tree: ttk.Treeview, scrollbar: ttk.Scrollbar, row_values):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values
+        self.keys = []
+        self.first = 0
+        self.rows_in_view = int(tree.cget('height'))
+        self.selected_key = None
+        self._shown = []
+        self._positions = None
+
+        scrollbar.config(command = self.yview)
+        tree.configure(yscrollcommand = '')
+        # The selected row keeps its highlight when it scrolls out of view
+        # and back, since it is then a new item
+        tree.tag_configure(self.SELECTED_TAG, background = 'grey')
+        tree.bind('<<TreeviewSelect>>', self._selected, add = '+')
+        tree.bind('<Configure>', self._resized, add = '+')
+        tree.bind('<MouseWheel>', self._wheel, add = '+')
+        tree.bind('<Button-4>', lambda event: self.yview('scroll', -3, 'units'), add = '+')
+        tree.bind('<Button-5>', lambda event: self.yview('scroll', 3, 'units'), add = '+')
+        tree.bind('<Up>', lambda event: self._step(-1), add = '+')
+        tree.bind('<Down>', lambda event: self._step(1), add = '+')
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_positions()
+
+    def _key_positions(self) -> dict:
+        # Position of each key in the list, built when first needed
+        if self._positions is None:
+            self._positions = {key: position for position, key in enumerate(self.keys)}
+        return self._positions
+
+    def _top_key(self) -> str:
+        # The key of the row at the top of the view, or None when the view
+        # shows the end of the list
+        if self.first + self.rows_in_view >= len(self.keys):
+            return None
+        return self.keys[self.first]
+
+    def set_keys(self, keys: list) -> None:
+        '''
+        Replaces the rows with the rows of *keys*, in order, keeping the row
+        at the top of the view at the top if it is still listed.
+        '''
+        top_key = self._top_key()
+        self.keys = list(keys)
+        self._positions = None
+        if top_key is not None and top_key in self._key_positions():
+            self.first = self._key_positions()[top_key]
+        elif top_key is None and self._shown:
+            self.first = len(self.keys)
+        self._render()
+
+    def add_keys(self, keys: list) -> None:
+        '''
+        Adds the rows of *keys* not already listed. The rows must be sorted,
+        as must the keys already listed, and keep the list sorted.
+        '''
+        positions = self._key_positions()
+        new_keys = [key for key in keys if key not in positions]
+        if not new_keys:
+            return
+        top_key = self._top_key()
+        for key in new_keys:
+            self.keys.insert(bisect.bisect_left(self.keys, key), key)
+        self._positions = None
+        self.first = len(self.keys) if top_key is None else self._key_positions()[top_key]
+        self._render()
+
+    def clear(self) -> None:
+        '''
+        Removes every row.
+        '''
+        self.keys = []
+        self._positions = None
+        self.first = 0
+        self.selected_key = None
+        self._render()
+
+    def see(self, key: str) -> None:
+        '''
+        Scrolls the view so that the row of *key* is in it.
+        '''
+        position = self._key_positions().get(key)
+        if position is None:
+            return
+        if position < self.first:
+            self.first = position
+        elif position >= self.first + self.rows_in_view:
+            self.first = position - self.rows_in_view + 1
+        self._render()
+
+    def yview(self, *arguments) -> None:
+        '''
+        Scrolls the view; the command of the scrollbar.
+        '''
+        if arguments[0] == 'moveto':
+            self.first = round(float(arguments[1]) * len(self.keys))
+        elif arguments[0] == 'scroll':
+            step = self.rows_in_view if arguments[2] == 'pages' else 1
+            self.first += int(arguments[1]) * step
+        self._render()
+
+    def _render(self) -> None:
+        # Bring the items in the Treeview in line with the rows in view
+        self.first = max(0, min(self.first, len(self.keys) - self.rows_in_view))
+        wanted = self.keys[self.first:self.first + self.rows_in_view]
+        wanted_set = set(wanted)
+        leaving = [key for key in self._shown if key not in wanted_set]
+        if leaving:
+            self.tree.delete(*leaving)
+        shown_set = set(self._shown)
+        for index, key in enumerate(wanted):
+            if key not in shown_set:
+                tags = (self.SELECTED_TAG,) if key == self.selected_key else ()
+                self.tree.insert('', index, iid = key, values = self.row_values(key), tags = tags)
+        self._shown = wanted
+
+        if self.keys:
+            self.scrollbar.set(self.first / len(self.keys),
+                               (self.first + len(wanted)) / len(self.keys))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _selected(self, event) -> None:
+        selection = self.tree.selection()
+        if not selection:
+            return
+        if self.selected_key is not None and self.tree.exists(self.selected_key):
+            self.tree.item(self.selected_key, tags = ())
+        self.selected_key = selection[0]
+
+    def _resized(self, event) -> None:
+        # Rows of the height set in the style, rounded down so none is cut off
+        row_height = int(ttk.Style(self.tree).lookup('Treeview', 'rowheight') or 20)
+        rows_in_view = max(1, event.height // row_height - 1)
+        if rows_in_view != self.rows_in_view:
+            self.rows_in_view = rows_in_view
+            self._render()
+
+    def _wheel(self, event) -> None:
+        self.yview('scroll', -3 if event.delta > 0 else 3, 'units')
+
+    def _step(self, direction: int) -> None:
+        # Arrow keys at the edge of the view scroll the next row into it
+        # before the Treeview moves the focus onto it
+        focus = self.tree.focus()
+        if not focus or not self._shown:
+            return
+        edge = self._shown[-1] if direction > 0 else self._shown[0]
+        if focus == edge:
+            self.yview('scroll', direction, 'units')
@@ -0,0 +1,92 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskRunner:
+    '''
+    Runs slow work such as downloads and file reads on a thread pool and 
+    hands each result back to the Tk thread through the after method of 
+    *widget*, so the interface never waits on the network or the disk.
+
+    Every task is submitted under a key. Submitting a new task under a key 
+    makes any older task with the same key stale: it is cancelled if it has 
+    not started, and its result is dropped if it has.
+
+    Parameters:
+    widget: Any Tk widget, used to schedule the result callbacks.
+    max_workers (int): The number of worker threads.
+    poll_ms (int): Milliseconds between checks for finished tasks.
+    '''
+    def __init__(self, widget, max_workers: int = 4, poll_ms: int = 20):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers = max_workers, 
+                                            thread_name_prefix = 'task')
+        self._finished = queue.Queue()
+        self._current = {}
+        self._polling = False
+
+    def submit(self, key: str, function, *arguments, on_done = None, on_error = None) -> None:
+        '''
+        Runs function(*arguments) on a worker thread.
+
+        Parameters:
+        key (str): Identifies what the task is for, e.g. "radar_image".
+        function: The work to run off the Tk thread.
+        on_done: Called on the Tk thread with the result, unless the task 
+            became stale.
+        on_error: Called on the Tk thread with the exception if the task 
+            failed, unless the task became stale.
+        '''
+        self.cancel(key)
+        future = self._executor.submit(function, *arguments)
+        self._current[key] = (future, on_done, on_error)
+        future.add_done_callback(lambda done: self._finished.put((key, done)))
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_ms, self._poll)
+
+    def cancel(self, key: str) -> None:
+        '''
+        Makes the current task for *key*, if any, stale.
+        '''
+        current = self._current.pop(key, None)
+        if current is not None:
+            current[0].cancel()
+
+    def pending(self, key: str) -> bool:
+        '''
+        Returns True while a task for *key* is waiting or running.
+        '''
+        return key in self._current
+
+    def _poll(self) -> None:
+        while not self._finished.empty():
+            key, future = self._finished.get_nowait()
+            current = self._current.get(key)
+            if current is None or current[0] is not future:
+                # Stale or cancelled: nobody wants this result any more
+                continue
+            del self._current[key]
+            _, on_done, on_error = current
+            error = future.exception()
+            if error is None:
+                if on_done is not None:
+                    on_done(future.result())
+            elif on_error is not None:
+                on_error(error)
+            else:
+                print(f"Task {key} failed: {error!r}")
+
+        if self._current or not self._finished.empty():
+            self.widget.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self) -> None:
+        '''
+        Cancels every waiting task and stops the worker threads.
+        '''
+        for key in list(self._current):
+            self.cancel(key)
+        self._executor.shutdown(wait = False, cancel_futures = True)